@@ -1,12 +1,19 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 User = get_user_model()
-from app.models.book import Book, BookDetails, BorrowedBooks
+from app.models.book import Book, BookDetails, BorrowedBooks, Hold, LoanReminder
+from app.models.task import Task
 
-admin.site.register(User)
-admin.site.register(Book)
-admin.site.register(BookDetails)
-admin.site.register(BorrowedBooks)
 
+class BookAdmin(admin.ModelAdmin):
+    # Maintained by the loan trigger, shown but never written
+    readonly_fields = ('current_loan', )
 
 
+admin.site.register(User)
+admin.site.register(Book, BookAdmin)
+admin.site.register(BookDetails)
+admin.site.register(BorrowedBooks)
+admin.site.register(Hold)
+admin.site.register(LoanReminder)
+admin.site.register(Task)
@@ -0,0 +1,190 @@
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from app.api.book import (ListBooks, GetBookById, CurrentlyBorrowedBooks, book_list_version, book_version)
+from app.api.conditional import conditional_response, get_resource_version
+from app.api.pagination import BookKeysetPagination
+from app.api.renderers import FastJSONRenderer
+from app.api.user import GetUserById, user_version
+from app.authentication import StatelessJWTAuthentication
+from app.db import routers
+from app.models.book import Book
+from app.services import cache_services
+from django.contrib.auth import get_user_model
+User = get_user_model()
+
+
+class AsyncAPIView(View):
+    """
+    Base class for async-native read endpoints, served without a thread per
+    request when the project runs under ASGI (e.g. `uvicorn project.asgi:application`).
+
+    DRF 3.14 views are sync only, so this does the parts of `APIView` these
+    endpoints need: JWT authentication, `IsAuthenticated`, DRF's error
+    format and JSON rendering (with orjson under `FAST_SERIALIZATION`).
+    Responses are identical to the sync views. Like `ReplicaReadsMixin`, GET
+    queries go to a read replica. Requests are throttled like the sync
+    views, by the same buckets.
+    """
+    authentication = StatelessJWTAuthentication()
+    renderer = JSONRenderer()
+    fast_renderer = FastJSONRenderer()
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            auth = await self.authentication.aauthenticate(request)
+            if auth is None:
+                raise exceptions.NotAuthenticated()
+            request.user, request.auth = auth
+            # Throttling only talks to the cache, it doesn't have to queue for the thread of the sync views
+            await sync_to_async(self.check_throttles, thread_sensitive=False)(request)
+
+            if request.method == 'GET':
+                await routers.ause_replica(request.user.pk)
+
+            return await super().dispatch(request, *args, **kwargs)
+        except Http404:
+            return self.handle_exception(request, exceptions.NotFound())
+        except exceptions.APIException as exc:
+            return self.handle_exception(request, exc)
+
+    def check_throttles(self, request):
+        waits = [throttle.wait() for throttle in (throttle_class() for throttle_class in self.throttle_classes)
+                 if not throttle.allow_request(request, self)]
+        if waits:
+            raise exceptions.Throttled(max(waits))
+
+    def handle_exception(self, request, exc):
+        # Same body and headers as DRF's exception handler
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {'detail': exc.detail}
+
+        response = self.render(data, status=exc.status_code)
+        if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+            response.headers['WWW-Authenticate'] = self.authentication.authenticate_header(request)
+        if getattr(exc, 'wait', None):
+            response.headers['Retry-After'] = '%d' % exc.wait
+        return response
+
+    def render(self, data, status=status.HTTP_200_OK):
+        renderer = self.fast_renderer if settings.FAST_SERIALIZATION else self.renderer
+        return HttpResponse(renderer.render(data), status=status, content_type=renderer.media_type)
+
+
+class AsyncListBooks(AsyncAPIView):
+    """
+    Async version of `books/list/`, same filters, pagination and cache.
+
+    Permissions: Requires authentication
+    """
+    throttle_scope = ListBooks.throttle_scope
+    get_throttle_cost = ListBooks.get_throttle_cost
+
+    async def get(self, request):
+        return await conditional_response(request, book_list_version, self.list)
+
+    async def list(self, request):
+        url = request.build_absolute_uri()
+        version, _ = get_resource_version(request)
+        data = None if routers.is_pinned() else await sync_to_async(cache_services.get_book_list)(url, version)
+
+        if data is None:
+            data = await self.load(request)
+            if not routers.reads_from_replica():
+                await sync_to_async(cache_services.set_book_list)(url, version, data)
+
+        return self.render(data)
+
+    async def load(self, request):
+        values_serializer = ListBooks.values_serializer
+        paginator = BookKeysetPagination()
+
+        fields = list(values_serializer.paths)
+        fields.extend(field.lstrip('-') for field in paginator.ordering if field.lstrip('-') not in fields)
+        queryset = ListBooks.filter_books(ListBooks.queryset.all(), request.GET)
+
+        if not paginator.is_requested(request):
+            return [values_serializer.to_representation(row) async for row in queryset.values(*fields)]
+
+        queryset = paginator.apply_cursor(queryset, paginator.prepare(request)).values(*fields)
+        rows = paginator.finish([row async for row in queryset[:paginator.page_size + 1]])
+
+        return OrderedDict([
+            ('next', paginator.get_next_link()),
+            ('results', [values_serializer.to_representation(row) for row in rows]),
+        ])
+
+
+class AsyncGetBookById(AsyncAPIView):
+    """
+    Async version of `books/details/<id>/`.
+
+    Permissions: Requires authentication
+    """
+    async def get(self, request, pk):
+        return await conditional_response(request, book_version, self.retrieve, pk)
+
+    async def retrieve(self, request, pk):
+        _, updated_at = get_resource_version(request)
+        data = None if routers.is_pinned() else await sync_to_async(cache_services.get_book_detail)(pk, updated_at)
+
+        if data is None:
+            values_serializer = GetBookById.values_serializer
+            try:
+                row = await GetBookById.queryset.values(*values_serializer.paths).aget(book_id=pk)
+            except Book.DoesNotExist:
+                raise Http404
+
+            data = values_serializer.to_representation(row)
+            if not routers.reads_from_replica():
+                await sync_to_async(cache_services.set_book_detail)(pk, updated_at, data)
+
+        return self.render(data)
+
+
+class AsyncCurrentlyBorrowedBooks(AsyncAPIView):
+    """
+    Async version of `books/currently_borrowed/`.
+
+    Permissions: Requires authentication
+    """
+    throttle_scope = CurrentlyBorrowedBooks.throttle_scope
+    get_throttle_cost = CurrentlyBorrowedBooks.get_throttle_cost
+
+    async def get(self, request):
+        loans = [loan async for loan in CurrentlyBorrowedBooks.queryset.all()]
+        serializer = CurrentlyBorrowedBooks.OutputSerializer(loans, many=True)
+
+        return self.render({
+            "message": "List of currently borrowed books",
+            "data": serializer.data,
+            "code": status.HTTP_200_OK,
+        })
+
+
+class AsyncGetUserById(AsyncAPIView):
+    """
+    Async version of `users/<id>/`.
+
+    Permissions: Requires authentication
+    """
+    async def get(self, request, pk):
+        return await conditional_response(request, user_version, self.retrieve, pk)
+
+    async def retrieve(self, request, pk):
+        values_serializer = GetUserById.values_serializer
+        try:
+            row = await GetUserById.queryset.values(*values_serializer.paths).aget(pk=pk)
+        except User.DoesNotExist:
+            raise Http404
+
+        return self.render(values_serializer.to_representation(row))
@@ -1,20 +1,35 @@
 from rest_framework.generics import CreateAPIView, ListAPIView, RetrieveAPIView, UpdateAPIView
 from rest_framework.views import APIView
 from rest_framework import serializers, permissions, status
-from app.models.book import Book, BookDetails, BorrowedBooks
+from app.models.book import Book, BookDetails, BorrowedBooks, Hold
 from rest_framework.response import Response
+from django.conf import settings
 from django.contrib.auth import get_user_model
 User = get_user_model()
-from app.services.book_services import update_book_details
+from app.services.book_services import (update_book_details, borrow_book, return_book, borrow_books, return_books,
+                                        place_hold, cancel_hold, waiting_holds,
+                                        BookNotFound, BookAlreadyBorrowed, UserNotFound, HoldNotAllowed, HoldNotFound)
+from app.services.import_services import get_file_format, import_books, read_rows
+from app.services import cache_services
+from app.services.search_services import search_books
+from app.api.pagination import BookKeysetPagination, LoanKeysetPagination
+from app.api.conditional import conditional_get, get_resource_version, make_etag
+from app.api.fast import FastSerializationMixin, ValuesSerializer
+from app.api.replicas import ReplicaReadsMixin
+from app.db import routers
+from rest_framework.parsers import MultiPartParser
+import codecs
 
   
 class BookSerializer(serializers.ModelSerializer):
     """
     Serializer for the Book model.
     """
+    is_available = serializers.BooleanField(read_only=True)
+
     class Meta:
         model = Book
-        fields = ('title', 'isbn', 'published_date', 'genre')
+        fields = ('title', 'isbn', 'published_date', 'genre', 'is_available')
 
 class BookDetailsSerializer(serializers.ModelSerializer):
     """
@@ -26,10 +41,15 @@ class BookDetailsSerializer(serializers.ModelSerializer):
             fields = ('number_of_pages', 'publisher', 'language')  
     
     book_details = BookDetailSerializer()
+    is_available = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Book
-        fields = ('title', 'isbn', 'published_date', 'genre', 'book_details')  
+        fields = ('title', 'isbn', 'published_date', 'genre', 'is_available', 'book_details')  
+
+
+# Fast path equivalent of the `is_available` serializer field
+IS_AVAILABLE = ('is_available', 'current_loan', lambda current_loan: current_loan is None)
 
 
 class CreateBook(CreateAPIView):
@@ -42,36 +62,205 @@ class CreateBook(CreateAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
 
-class ListBooks(ListAPIView):
+class BulkImportBooks(APIView):
+    """
+    Endpoint for importing (upserting by isbn) many books and their details
+    from an uploaded CSV or JSON Lines file.
+
+    Permissions: Requires authentication
+    """
+    class InputSerializer(serializers.Serializer):
+        file = serializers.FileField()
+
+    permission_classes = (permissions.IsAuthenticated, )
+    parser_classes = (MultiPartParser, )
+
+    def post(self, request):
+        serializer = self.InputSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        upload = serializer.validated_data['file']
+        file_format = get_file_format(upload.name)
+
+        if file_format is None:
+            return Response({
+                "message": "Unsupported file type, upload a .csv or .jsonl file.",
+                "code": status.HTTP_400_BAD_REQUEST,
+            }, status.HTTP_400_BAD_REQUEST)
+
+        # service for importing books, invalid rows are reported without aborting the import
+        lines = codecs.iterdecode(upload, 'utf-8-sig')
+        result = import_books(read_rows(lines, file_format))
+
+        if result['aborted']:
+            return Response(
+                {
+                    "message": f"Row {result['errors'][-1]['row']} could not be read, the import stopped there. "
+                               f"{result['imported']} books were imported.",
+                    "data": result,
+                    "code": status.HTTP_400_BAD_REQUEST,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(
+            {
+                "message": "Books imported.",
+                "data": result,
+                "code": status.HTTP_200_OK,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+def book_list_version(request):
+    # Changed by every create, update or delete, see get_book_list_version
+    return make_etag(cache_services.get_book_list_version(), request.get_full_path()), None
+
+def book_version(request, pk):
+    updated_at = Book.objects.filter(book_id=pk).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        return None
+    return make_etag(pk, updated_at), updated_at
+
+@conditional_get(book_list_version)
+class ListBooks(ReplicaReadsMixin, FastSerializationMixin, ListAPIView):
     """
     Endpoint for listing all books.
+    Pass `page_size` and/or `cursor` to get keyset-paginated results,
+    and `available=true|false` to only list books that are (not) on loan.
 
     Permissions: Requires authentication
     """
+    class FilterSerializer(serializers.Serializer):
+        available = serializers.BooleanField(allow_null=True, default=None)
+
     permission_classes = (permissions.IsAuthenticated, )
-    queryset = Book.objects.all()
+    queryset = Book.objects.defer('search_vector')
     serializer_class = BookSerializer
+    values_serializer = ValuesSerializer(Book, ('title', 'isbn', 'published_date', 'genre', IS_AVAILABLE))
+    pagination_class = BookKeysetPagination
+    throttle_scope = 'books_list'
+
+    def get_throttle_cost(self, request):
+        # Without pagination the whole table is read
+        return 1 if BookKeysetPagination().is_requested(request) else settings.THROTTLE_FULL_TABLE_COST
+
+    def filter_queryset(self, queryset):
+        return self.filter_books(queryset, self.request.query_params)
+
+    @classmethod
+    def filter_books(cls, queryset, params):
+        serializer = cls.FilterSerializer(data=params)
+        serializer.is_valid(raise_exception=True)
 
-class GetBookById(RetrieveAPIView):
+        available = serializer.validated_data['available']
+        if available is not None:
+            queryset = queryset.filter(current_loan__isnull=available)
+
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        # Pages are cached by their full URL and the list version of their ETag, any book change
+        # invalidates all of them. Users who just wrote read from the primary and refresh the cache.
+        url = request.build_absolute_uri()
+        version, _ = get_resource_version(request)
+        data = None if routers.is_pinned() else cache_services.get_book_list(url, version)
+
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            # A lagging replica may miss changes the version already counts, only cache primary reads
+            if not routers.reads_from_replica():
+                cache_services.set_book_list(url, version, data)
+
+        return Response(data)
+
+@conditional_get(book_version)
+class GetBookById(ReplicaReadsMixin, FastSerializationMixin, RetrieveAPIView):
     """
     Endpoint for retrieving details of a specific book by Book ID.
 
     Permissions: Requires authentication
     """
     permission_classes = (permissions.IsAuthenticated, )
-    queryset = Book.objects.all()
+    queryset = Book.objects.select_related('book_details').defer('search_vector')
     serializer_class = BookDetailsSerializer
+    values_serializer = ValuesSerializer(Book, ('title', 'isbn', 'published_date', 'genre', IS_AVAILABLE, (
+        'book_details', ValuesSerializer(BookDetails, BookDetailsSerializer.BookDetailSerializer.Meta.fields),
+    )))
+
+    def retrieve(self, request, *args, **kwargs):
+        # Cached details are only served for the updated_at of the ETag and Last-Modified headers
+        _, updated_at = get_resource_version(request)
+        data = None if routers.is_pinned() else cache_services.get_book_detail(kwargs['pk'], updated_at)
+
+        if data is None:
+            data = super().retrieve(request, *args, **kwargs).data
+            if not routers.reads_from_replica():
+                cache_services.set_book_detail(kwargs['pk'], updated_at, data)
+
+        return Response(data)
+
+class SearchBooks(APIView):
+    """
+    Endpoint for ranked full-text search over book title and publisher,
+    with isbn, genre, language and published year filters and facet counts.
+
+    Permissions: Requires authentication
+    """
+    class InputSerializer(serializers.Serializer):
+        q = serializers.CharField(required=False, max_length=200)
+        isbn = serializers.CharField(required=False, max_length=20)
+        genre = serializers.CharField(required=False, max_length=100)
+        language = serializers.CharField(required=False, max_length=100)
+        year = serializers.IntegerField(required=False, min_value=1, max_value=9999)
+        limit = serializers.IntegerField(required=False, min_value=1, max_value=100, default=20)
+
+    class OutputSerializer(serializers.ModelSerializer):
+        class Meta:
+            model = Book
+            fields = ('book_id', 'title', 'isbn', 'published_date', 'genre')
+
+    permission_classes = (permissions.IsAuthenticated, )
+    # Ranking and facets read every matching book
+    throttle_scope = 'books_search'
+
+    def get(self, request):
+        serializer = self.InputSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        # service for searching books
+        books, facets = search_books(**serializer.validated_data)
+
+        return Response(
+            {
+                "message": "Search results",
+                "data": {
+                    "results": self.OutputSerializer(books, many=True).data,
+                    "facets": facets,
+                },
+                "code": status.HTTP_200_OK,
+            },
+            status=status.HTTP_200_OK,
+        )
 
 class UpdateBookDetails(APIView):
     """
     Endpoint for assiging or updating details of a specific book by Book ID.
+    PUT replaces every field, PATCH only the fields sent.
     
     Permissions: Requires authentication
     """
     permission_classes = (permissions.IsAuthenticated, )
 
     def put(self, request, pk):
-        book = Book.objects.filter(book_id=pk).first()
+        return self.update(request, pk)
+
+    def patch(self, request, pk):
+        return self.update(request, pk, partial=True)
+
+    def update(self, request, pk, partial=False):
+        # Details are loaded along with the book, the service only writes
+        book = Book.objects.select_related('book_details').filter(book_id=pk).first()
 
         if not book:
             return Response(
@@ -82,19 +271,25 @@ class UpdateBookDetails(APIView):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        book_serializer = BookDetailsSerializer(book, data=request.data)
+        book_serializer = BookDetailsSerializer(book, data=request.data, partial=partial)
 
         book_serializer.is_valid(raise_exception=True)
 
+        book_details = book_serializer.validated_data.get('book_details')
+        missing = set(BookDetailsSerializer.BookDetailSerializer.Meta.fields) - set(book_details or ())
+        if book_details is not None and missing and not hasattr(book, 'book_details'):
+            # New details can't be partial
+            raise serializers.ValidationError({'book_details': {field: ['This field is required.'] for field in sorted(missing)}})
+
         # service for updating book details
         updated_book = update_book_details(book, **book_serializer.validated_data)
 
-        serializers = BookDetailsSerializer(updated_book)
+        serializer = BookDetailsSerializer(updated_book)
         
         return Response(
             {
                 "message": "Book details updated successfully.",
-                "data": serializers.data,
+                "data": serializer.data,
                 "code": status.HTTP_200_OK,
             },
             status=status.HTTP_200_OK,
@@ -117,32 +312,24 @@ class BorrowBook(APIView):
     Permissions: Requires authentication
     """
     def post(self, request, user_id, book_id):
-        # Check if the user and book exists or not
-        try:
-            user = User.objects.get(user_id=user_id)
-            book = Book.objects.get(book_id=book_id)
-        except (User.DoesNotExist, Book.DoesNotExist):
-            return Response({
-                "message": "User or Book not found",
-                "code": status.HTTP_404_NOT_FOUND,
-            }, status.HTTP_404_NOT_FOUND)
-        
         borrowed_book_serializer = self.InputSerializer(data=request.data)
         borrowed_book_serializer.is_valid(raise_exception=True)
 
         borrow_date = borrowed_book_serializer.validated_data['borrow_date']
-        
-        # if the book is currently borrowed then return (the book is borrowed by others)
-        currently_borrowed = BorrowedBooks.currently_borrowed.filter(book=book)
 
-        if currently_borrowed:
+        # service for borrowing the book, fails if the book is currently borrowed by others
+        try:
+            borrow_book(user_id, book_id, borrow_date)
+        except BookNotFound:
+            return Response({
+                "message": "User or Book not found",
+                "code": status.HTTP_404_NOT_FOUND,
+            }, status.HTTP_404_NOT_FOUND)
+        except BookAlreadyBorrowed:
             return Response({
                 "message": "Book is being currently borrowed by others.",
                 "code": status.HTTP_400_BAD_REQUEST,
             }, status.HTTP_400_BAD_REQUEST)
-        
-
-        borrowed_book = BorrowedBooks.objects.create(user=user, book=book, borrow_date=borrow_date)
 
         return Response(
             {
@@ -168,38 +355,128 @@ class ReturnBook(APIView):
     Permissions: Requires authentication
     """
     def put(self, request, book_id):
+        serializer = self.InputSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        return_date = serializer.validated_data['return_date']
+
+        # service for closing the active loan of the book
         try:
-            book = Book.objects.get(book_id=book_id)
-            borrowed_book = BorrowedBooks.currently_borrowed.get(book=book)
-        except (Book.DoesNotExist, BorrowedBooks.DoesNotExist):
+            return_book(book_id, return_date)
+        except BookNotFound:
             return Response({
                 "message": "Book not found or already returned.",
                 "code": status.HTTP_404_NOT_FOUND,
-            }, status.HTTP_404_NOT_FOUND)   
-        
+            }, status.HTTP_404_NOT_FOUND)
+
+        return Response(
+            {
+                "message": "Book returned successfully.",
+                "code": status.HTTP_200_OK,
+            },
+            status=status.HTTP_200_OK,
+        )
+    
+# Largest cart accepted by the bulk borrow/return endpoints
+BULK_LOAN_MAX_BOOKS = 200
+
+
+class BulkBorrowBooks(APIView):
+    class InputSerializer(serializers.Serializer):
+        user_id = serializers.IntegerField()
+        book_ids = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=BULK_LOAN_MAX_BOOKS)
+        borrow_date = serializers.DateField()
+
+    permission_classes = (permissions.IsAuthenticated, )
+
+    """
+    Endpoint for borrowing several books for one user in a single request.
+
+    Returns the outcome of every book: borrowed, already_borrowed or not_found.
+
+    Permissions: Requires authentication
+    """
+    def post(self, request):
         serializer = self.InputSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        return_date = serializer.validated_data['return_date']
+        try:
+            results = borrow_books(**serializer.validated_data)
+        except UserNotFound:
+            return Response({
+                "message": "User not found",
+                "code": status.HTTP_404_NOT_FOUND,
+            }, status.HTTP_404_NOT_FOUND)
 
-        borrowed_book.return_date = return_date
-        borrowed_book.save()
+        return Response(
+            {
+                "message": "Bulk borrow processed.",
+                "data": [{"book_id": book_id, "status": result} for book_id, result in results.items()],
+                "code": status.HTTP_200_OK,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+class BulkReturnBooks(APIView):
+    class InputSerializer(serializers.Serializer):
+        book_ids = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=BULK_LOAN_MAX_BOOKS)
+        return_date = serializers.DateField()
+
+    permission_classes = (permissions.IsAuthenticated, )
+
+    """
+    Endpoint for returning several books in a single request.
+
+    Returns the outcome of every book: returned or not_found.
+
+    Permissions: Requires authentication
+    """
+    def put(self, request):
+        serializer = self.InputSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = return_books(**serializer.validated_data)
 
         return Response(
             {
-                "message": "Book returned successfully.",
+                "message": "Bulk return processed.",
+                "data": [{"book_id": book_id, "status": result} for book_id, result in results.items()],
                 "code": status.HTTP_200_OK,
             },
             status=status.HTTP_200_OK,
         )
-    
-class CurrentlyBorrowedBooks(APIView):
+
+class BookSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Book
+        fields = ('book_id', 'title', 'isbn')
+
+class UserSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ('user_id', 'name', 'email')
+
+class CurrentlyBorrowedBooks(ReplicaReadsMixin, APIView):
     class OutputSerializer(serializers.ModelSerializer):
+        book = BookSummarySerializer()
+        user = UserSummarySerializer()
+
         class Meta:
             model = BorrowedBooks
-            fields = '__all__'
+            fields = ('id', 'borrow_date', 'return_date', 'user', 'book')
 
     permission_classes = (permissions.IsAuthenticated, )
+    # Load the book and user summaries in the same query
+    queryset = BorrowedBooks.currently_borrowed.select_related('book', 'user').only(
+        'id', 'borrow_date', 'return_date',
+        'book__book_id', 'book__title', 'book__isbn',
+        'user__user_id', 'user__name', 'user__email',
+    )
+    throttle_scope = 'currently_borrowed'
+
+    def get_throttle_cost(self, request):
+        # Every open loan, unpaginated
+        return settings.THROTTLE_FULL_TABLE_COST
 
     """
     Endpoint for listing currently borrowed books.
@@ -207,9 +484,7 @@ class CurrentlyBorrowedBooks(APIView):
     Permissions: Requires authentication
     """
     def get(self, request):
-        currently_borrowed = BorrowedBooks.currently_borrowed.all()
-
-        serializer = self.OutputSerializer(currently_borrowed, many=True)
+        serializer = self.OutputSerializer(self.queryset.all(), many=True)
 
         return Response(
             {
@@ -218,4 +493,189 @@ class CurrentlyBorrowedBooks(APIView):
                 "code": status.HTTP_200_OK,
             },
             status=status.HTTP_200_OK,
-        )
\ No newline at end of file
+        )
+
+class LoanHistory(ListAPIView):
+    """
+    Base view for the loan history of one user or one book, most recent
+    loans first, optionally restricted to a borrow date range.
+    """
+    class FilterSerializer(serializers.Serializer):
+        borrowed_after = serializers.DateField(required=False)
+        borrowed_before = serializers.DateField(required=False)
+
+        def validate(self, attrs):
+            if 'borrowed_after' in attrs and 'borrowed_before' in attrs and attrs['borrowed_after'] > attrs['borrowed_before']:
+                raise serializers.ValidationError({
+                    'borrowed_before': 'Must be on or after borrowed_after.'
+                })
+            return attrs
+
+    permission_classes = (permissions.IsAuthenticated, )
+    pagination_class = LoanKeysetPagination
+    # Set by subclasses: the loan foreign key the history is about and its model
+    owner_field = None
+    owner_model = None
+    not_found_message = None
+
+    def get_queryset(self):
+        return BorrowedBooks.objects.filter(**{f'{self.owner_field}_id': self.kwargs['pk']})
+
+    def filter_queryset(self, queryset):
+        serializer = self.FilterSerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        if 'borrowed_after' in serializer.validated_data:
+            queryset = queryset.filter(borrow_date__gte=serializer.validated_data['borrowed_after'])
+        if 'borrowed_before' in serializer.validated_data:
+            queryset = queryset.filter(borrow_date__lte=serializer.validated_data['borrowed_before'])
+
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+
+        # Only an empty history needs to tell an unknown user/book from one without loans
+        if not response.data['results'] and not self.owner_model.objects.filter(pk=kwargs['pk']).exists():
+            return Response({
+                "message": self.not_found_message,
+                "code": status.HTTP_404_NOT_FOUND,
+            }, status.HTTP_404_NOT_FOUND)
+
+        return response
+
+class UserLoans(LoanHistory):
+    """
+    Endpoint for listing the loans of a user, most recent first.
+    Filter with `borrowed_after` and/or `borrowed_before` (inclusive dates),
+    results are keyset-paginated (`page_size`, `cursor`).
+
+    Permissions: Requires authentication
+    """
+    class OutputSerializer(serializers.ModelSerializer):
+        book = BookSummarySerializer()
+
+        class Meta:
+            model = BorrowedBooks
+            fields = ('id', 'borrow_date', 'return_date', 'book')
+
+    serializer_class = OutputSerializer
+    owner_field = 'user'
+    owner_model = User
+    not_found_message = "User not found."
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('book').only(
+            'id', 'borrow_date', 'return_date', 'book__book_id', 'book__title', 'book__isbn',
+        )
+
+class BookLoans(LoanHistory):
+    """
+    Endpoint for listing the loans of a book, most recent first.
+    Filter with `borrowed_after` and/or `borrowed_before` (inclusive dates),
+    results are keyset-paginated (`page_size`, `cursor`).
+
+    Permissions: Requires authentication
+    """
+    class OutputSerializer(serializers.ModelSerializer):
+        user = UserSummarySerializer()
+
+        class Meta:
+            model = BorrowedBooks
+            fields = ('id', 'borrow_date', 'return_date', 'user')
+
+    serializer_class = OutputSerializer
+    owner_field = 'book'
+    owner_model = Book
+    not_found_message = "Book not found."
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('user').only(
+            'id', 'borrow_date', 'return_date', 'user__user_id', 'user__name', 'user__email',
+        )
+
+class HoldBook(APIView):
+    permission_classes = (permissions.IsAuthenticated, )
+
+    """
+    Endpoint for waiting in line for a borrowed book (POST) or leaving the
+    line (DELETE). When the book is returned it is lent to the first user
+    in line, who is emailed, so there is no need to retry borrowing it.
+
+    Permissions: Requires authentication
+    """
+    def post(self, request, user_id, book_id):
+        try:
+            position = place_hold(user_id, book_id)
+        except (UserNotFound, BookNotFound):
+            return Response({
+                "message": "User or Book not found",
+                "code": status.HTTP_404_NOT_FOUND,
+            }, status.HTTP_404_NOT_FOUND)
+        except HoldNotAllowed as exc:
+            return Response({
+                "message": str(exc),
+                "code": status.HTTP_400_BAD_REQUEST,
+            }, status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {
+                "message": "Hold placed successfully.",
+                "data": {"position": position},
+                "code": status.HTTP_201_CREATED,
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+    def delete(self, request, user_id, book_id):
+        try:
+            cancel_hold(user_id, book_id)
+        except HoldNotFound:
+            return Response({
+                "message": "Hold not found.",
+                "code": status.HTTP_404_NOT_FOUND,
+            }, status.HTTP_404_NOT_FOUND)
+
+        return Response(
+            {
+                "message": "Hold cancelled successfully.",
+                "code": status.HTTP_200_OK,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+class UserHolds(APIView):
+    class OutputSerializer(serializers.ModelSerializer):
+        book = BookSummarySerializer()
+        position = serializers.IntegerField()
+
+        class Meta:
+            model = Hold
+            fields = ('id', 'created_at', 'position', 'book')
+
+    permission_classes = (permissions.IsAuthenticated, )
+
+    """
+    Endpoint for listing the books a user waits for, oldest hold first,
+    with the position of the user in the line of each book.
+
+    Permissions: Requires authentication
+    """
+    def get(self, request, pk):
+        holds = list(waiting_holds(pk))
+        if not holds and not User.objects.filter(pk=pk).exists():
+            return Response({
+                "message": "User not found.",
+                "code": status.HTTP_404_NOT_FOUND,
+            }, status.HTTP_404_NOT_FOUND)
+
+        serializer = self.OutputSerializer(holds, many=True)
+
+        return Response(
+            {
+                "message": "List of waiting holds",
+                "data": serializer.data,
+                "code": status.HTTP_200_OK,
+            },
+            status=status.HTTP_200_OK,
+        )
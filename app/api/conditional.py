@@ -0,0 +1,71 @@
+import hashlib
+from calendar import timegm
+
+from asgiref.sync import sync_to_async
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date
+from django.views.decorators.http import condition
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.md5(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def conditional_get(get_version):
+    """
+    Class decorator adding ETag / Last-Modified support to a view's `get`.
+
+    `get_version(request, *args, **kwargs)` is a cheap query returning an
+    `(etag, last_modified)` tuple for the requested resource, or None if it
+    does not exist. When the client already has that version a 304 is
+    returned before the view runs, so nothing is loaded or serialized.
+    """
+    def version(request, *args, **kwargs):
+        # condition() asks for the etag and last modified separately, query only once
+        if not hasattr(request, '_resource_version'):
+            request._resource_version = get_version(request, *args, **kwargs) or (None, None)
+        return request._resource_version
+
+    decorator = condition(
+        etag_func=lambda request, *args, **kwargs: version(request, *args, **kwargs)[0],
+        last_modified_func=lambda request, *args, **kwargs: version(request, *args, **kwargs)[1],
+    )
+    return method_decorator(decorator, name='get')
+
+
+def get_resource_version(request):
+    """
+    The `(etag, last_modified)` found by `conditional_get` or
+    `conditional_response` for the request, so that views cache and serve
+    the version they announced.
+    """
+    return getattr(request, '_resource_version', (None, None))
+
+
+async def conditional_response(request, get_version, get_response, *args, **kwargs):
+    """
+    `conditional_get` for async views, Django's `condition` decorator only
+    wraps sync views.
+
+    `get_version(request, *args, **kwargs)` is the same sync function the
+    sync view uses. `get_response(request, *args, **kwargs)` is awaited
+    only when the client doesn't already have the current version.
+    """
+    request._resource_version = await sync_to_async(get_version)(request, *args, **kwargs) or (None, None)
+    etag, last_modified = request._resource_version
+    timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+
+    response = None
+    if request.method in ('GET', 'HEAD'):
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = await get_response(request, *args, **kwargs)
+
+    if request.method in ('GET', 'HEAD'):
+        if timestamp and not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(timestamp)
+        if etag and not response.has_header('ETag'):
+            response.headers['ETag'] = etag
+
+    return response
@@ -0,0 +1,44 @@
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import serializers, status, permissions
+from app.services.export_services import EXPORTS, export_rows
+from app.services.import_services import FILE_FORMATS
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+@method_decorator(gzip_page, name='get')
+class ExportData(APIView):
+    """
+    Endpoint for streaming a whole table (books, users or loans) as CSV or
+    JSON Lines, pass `output=csv|jsonl`. Compressed with gzip on the fly
+    when the client sends `Accept-Encoding: gzip`.
+
+    Permissions: Requires admin user
+    """
+    class InputSerializer(serializers.Serializer):
+        output = serializers.ChoiceField(choices=FILE_FORMATS, default='csv')
+
+    permission_classes = (permissions.IsAdminUser, )
+
+    def get(self, request, name):
+        if name not in EXPORTS:
+            return Response({
+                "message": f"Unknown export, choose one of: {', '.join(EXPORTS)}.",
+                "code": status.HTTP_404_NOT_FOUND,
+            }, status.HTTP_404_NOT_FOUND)
+
+        serializer = self.InputSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        file_format = serializer.validated_data['output']
+
+        response = StreamingHttpResponse(export_rows(name, file_format), content_type=CONTENT_TYPES[file_format])
+        response['Content-Disposition'] = f'attachment; filename="{name}.{file_format}"'
+        return response
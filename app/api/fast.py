@@ -0,0 +1,124 @@
+from django.conf import settings
+from django.db import models
+from django.http import Http404
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from app.api.renderers import FastJSONRenderer
+
+
+def _get_field(model, path):
+    *relations, name = path.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.get_field(name)
+
+
+def _get_converter(field):
+    # Same representation as the matching DRF serializer field
+    if isinstance(field, models.DateTimeField):
+        return serializers.DateTimeField().to_representation
+    if isinstance(field, models.DateField):
+        return lambda value: value.isoformat()
+    return None
+
+
+class ValuesSerializer:
+    """
+    Builds the same dicts as a (nested) ModelSerializer straight from
+    `queryset.values()` rows, without instantiating models or serializer
+    fields per row.
+
+    `fields` are model field names, `(relation, ValuesSerializer)` pairs
+    for nested objects or `(name, source, converter)` triples for values
+    computed from another field, in output order. The mapping from ORM paths to
+    output keys and converters is compiled once, when the class is defined.
+    """
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = []
+        self.paths = []
+
+        for field in fields:
+            if isinstance(field, tuple) and len(field) == 3:
+                name, source, converter = field
+                self.fields.append((name, None, None, source, converter))
+                self.paths.append(source)
+            elif isinstance(field, tuple):
+                name, nested = field
+                self.fields.append((name, None, nested, None, None))
+                self.paths.extend(f'{name}__{path}' for path in nested.paths)
+            else:
+                self.fields.append((field, _get_converter(model._meta.get_field(field)), None, None, None))
+                self.paths.append(field)
+
+    def to_representation(self, row, prefix=''):
+        data = {}
+        for name, converter, nested, source, compute in self.fields:
+            if nested is not None:
+                nested_prefix = f'{prefix}{name}__'
+                # a missing related object comes back as all NULL columns
+                if all(row[nested_prefix + path] is None for path in nested.paths):
+                    data[name] = None
+                else:
+                    data[name] = nested.to_representation(row, nested_prefix)
+                continue
+
+            if compute is not None:
+                data[name] = compute(row[prefix + source])
+                continue
+
+            value = row[prefix + name]
+            if converter is not None and value is not None:
+                value = converter(value)
+            data[name] = value
+
+        return data
+
+
+class FastSerializationMixin:
+    """
+    When `FAST_SERIALIZATION` is enabled, list and retrieve responses are
+    built by `values_serializer` from `.values()` rows instead of going
+    through `serializer_class`, and rendered by `FastJSONRenderer`. The
+    output is identical.
+    """
+    values_serializer = None
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if not settings.FAST_SERIALIZATION:
+            return renderers
+        # Only these responses, whose values all come from model fields, are rendered with orjson
+        return [FastJSONRenderer() if type(renderer) is JSONRenderer else renderer for renderer in renderers]
+
+    def list(self, request, *args, **kwargs):
+        if not settings.FAST_SERIALIZATION:
+            return super().list(request, *args, **kwargs)
+
+        fields = list(self.values_serializer.paths)
+        # keyset pagination reads its cursor from the ordering fields
+        ordering = [field.lstrip('-') for field in getattr(self.paginator, 'ordering', ())]
+        fields.extend(field for field in ordering if field not in fields)
+
+        queryset = self.filter_queryset(self.get_queryset()).values(*fields)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response([self.values_serializer.to_representation(row) for row in page])
+
+        return Response([self.values_serializer.to_representation(row) for row in queryset])
+
+    def retrieve(self, request, *args, **kwargs):
+        if not settings.FAST_SERIALIZATION:
+            return super().retrieve(request, *args, **kwargs)
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        row = queryset.filter(**{self.lookup_field: kwargs[lookup_url_kwarg]}).values(*self.values_serializer.paths).first()
+
+        if row is None:
+            raise Http404
+
+        return Response(self.values_serializer.to_representation(row))
@@ -0,0 +1,170 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Field, Func, Value
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over a fixed, unique ordering, whose fields
+    are all descending or all ascending.
+
+    Each page is fetched with a `WHERE (a, b) < (x, y) ... LIMIT n` style
+    filter instead of an OFFSET, so page N costs the same as page 1 as long
+    as `ordering` is backed by an index. Cursors are opaque base64 tokens
+    holding the ordering values of the last row on the previous page.
+
+    Pagination is opt-in: it only kicks in when the client sends either the
+    `cursor` or the `page_size` query parameter, so existing clients keep
+    receiving the plain list.
+    """
+    # Field names, prefixed with '-' for descending. The last one must be unique.
+    ordering = ()
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def is_requested(self, request):
+        params = request.query_params if hasattr(request, 'query_params') else request.GET
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, params):
+        try:
+            return _positive_int(params[self.page_size_query_param], strict=True, cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def encode_cursor(self, values):
+        # Keep full microsecond precision, DjangoJSONEncoder would truncate datetimes.
+        data = json.dumps(values, default=lambda value: value.isoformat(), separators=(',', ':'))
+        return b64encode(data.encode('utf-8'), altchars=b'-_').decode('ascii')
+
+    def decode_cursor(self, params):
+        encoded = params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            values = json.loads(b64decode(encoded.encode('ascii'), altchars=b'-_', validate=True))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        return values
+
+    def get_position(self, item):
+        fields = [field.lstrip('-') for field in self.ordering]
+        if isinstance(item, dict):
+            return [item[field] for field in fields]
+        return [getattr(item, field) for field in fields]
+
+    def apply_cursor(self, queryset, position):
+        """
+        Order the queryset by `ordering` and, if a position is given, only
+        keep rows that come strictly after it.
+        """
+        queryset = queryset.order_by(*self.ordering)
+        if position is None:
+            return queryset
+
+        names = [field.lstrip('-') for field in self.ordering]
+        values = self.parse_position(queryset.model, names, position)
+        lookup = 'lt' if self.ordering[0].startswith('-') else 'gt'
+
+        if len(names) == 1:
+            return queryset.filter(**{f'{names[0]}__{lookup}': values[0]})
+
+        # Every field is ordered the same way, so "after" is one row comparison,
+        # (a, b) < (x, y), which PostgreSQL turns into an index range condition
+        row = Func(*[F(name) for name in names], function='ROW', output_field=Field())
+        after = Func(*[Value(value) for value in values], function='ROW', output_field=Field())
+        return queryset.alias(_keyset_position=row).filter(**{f'_keyset_position__{lookup}': after})
+
+    def parse_position(self, model, names, position):
+        # Cursors come from clients, a value that doesn't fit its field is an invalid cursor
+        try:
+            values = [model._meta.get_field(name).to_python(value) for name, value in zip(names, position)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in values:
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def prepare(self, request):
+        """
+        Read the page size and cursor from the request and return the
+        position to continue from.
+        """
+        params = request.query_params if hasattr(request, 'query_params') else request.GET
+        self.request = request
+        self.page_size = self.get_page_size(params)
+        return self.decode_cursor(params)
+
+    def finish(self, rows):
+        # One extra row is fetched to find out whether a next page exists.
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_position = self.get_position(rows[-1]) if self.has_next else None
+        return rows
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+
+        position = self.prepare(request)
+        queryset = self.apply_cursor(queryset, position)
+        return self.finish(list(queryset[:self.page_size + 1]))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                },
+                'results': schema,
+            },
+        }
+
+
+class BookKeysetPagination(KeysetPagination):
+    ordering = ('-created_at', '-book_id')
+
+
+class UserKeysetPagination(KeysetPagination):
+    ordering = ('user_id', )
+
+
+class LoanKeysetPagination(KeysetPagination):
+    """
+    Loan histories can be arbitrarily long, so they are always paginated.
+    """
+    ordering = ('-borrow_date', '-id')
+
+    def is_requested(self, request):
+        return True
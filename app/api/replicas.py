@@ -0,0 +1,13 @@
+from app.db import routers
+
+
+class ReplicaReadsMixin:
+    """
+    Sends the queries of GET requests to a read replica (see
+    `app.db.routers`), unless the user wrote recently. Authentication,
+    which checks the token version, still reads from the primary.
+    """
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method == 'GET':
+            routers.use_replica(request.user.pk)
@@ -0,0 +1,115 @@
+from datetime import date, timedelta
+
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import serializers, status, permissions
+from app.services.report_services import active_borrowers_per_month, loans_per_genre_per_month, most_borrowed_books
+
+
+class ReportInputSerializer(serializers.Serializer):
+    """
+    Inclusive date range of a report, the last 365 days by default.
+    """
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        attrs.setdefault('end', date.today())
+        attrs.setdefault('start', attrs['end'] - timedelta(days=365))
+
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError({
+                'end': 'Must be on or after start.'
+            })
+
+        return attrs
+
+
+class MostBorrowedBooks(APIView):
+    """
+    Endpoint for the most borrowed books over a date range.
+
+    Permissions: Requires admin user
+    """
+    class InputSerializer(ReportInputSerializer):
+        limit = serializers.IntegerField(required=False, min_value=1, max_value=100, default=10)
+
+    class OutputSerializer(serializers.Serializer):
+        book_id = serializers.IntegerField()
+        title = serializers.CharField()
+        isbn = serializers.CharField()
+        loans = serializers.IntegerField()
+
+    permission_classes = (permissions.IsAdminUser, )
+
+    def get(self, request):
+        serializer = self.InputSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        books = most_borrowed_books(**serializer.validated_data)
+
+        return Response(
+            {
+                "message": "Most borrowed books",
+                "data": self.OutputSerializer(books, many=True).data,
+                "code": status.HTTP_200_OK,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+class GenreLoans(APIView):
+    """
+    Endpoint for the number of loans and returns per genre per month.
+
+    Permissions: Requires admin user
+    """
+    class OutputSerializer(serializers.Serializer):
+        month = serializers.DateField()
+        genre = serializers.CharField()
+        loans = serializers.IntegerField()
+        returns = serializers.IntegerField()
+
+    permission_classes = (permissions.IsAdminUser, )
+
+    def get(self, request):
+        serializer = ReportInputSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        rows = loans_per_genre_per_month(**serializer.validated_data)
+
+        return Response(
+            {
+                "message": "Loans per genre per month",
+                "data": self.OutputSerializer(rows, many=True).data,
+                "code": status.HTTP_200_OK,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+class ActiveBorrowers(APIView):
+    """
+    Endpoint for the number of distinct borrowers and their loans per month.
+
+    Permissions: Requires admin user
+    """
+    class OutputSerializer(serializers.Serializer):
+        month = serializers.DateField()
+        borrowers = serializers.IntegerField()
+        loans = serializers.IntegerField()
+
+    permission_classes = (permissions.IsAdminUser, )
+
+    def get(self, request):
+        serializer = ReportInputSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        rows = active_borrowers_per_month(**serializer.validated_data)
+
+        return Response(
+            {
+                "message": "Active borrowers per month",
+                "data": self.OutputSerializer(rows, many=True).data,
+                "code": status.HTTP_200_OK,
+            },
+            status=status.HTTP_200_OK,
+        )
@@ -0,0 +1,44 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status, permissions
+from app.api import throttling
+from app.services import cache_services
+
+
+class CacheStats(APIView):
+    """
+    Endpoint for the cache hit/miss counters of this process.
+
+    Permissions: Requires admin user
+    """
+    permission_classes = (permissions.IsAdminUser, )
+
+    def get(self, request):
+        return Response(
+            {
+                "message": "Cache statistics",
+                "data": cache_services.stats.snapshot(),
+                "code": status.HTTP_200_OK,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class ThrottleStats(APIView):
+    """
+    Endpoint for the allowed/rejected request counters of this process,
+    per throttle scope.
+
+    Permissions: Requires admin user
+    """
+    permission_classes = (permissions.IsAdminUser, )
+
+    def get(self, request):
+        return Response(
+            {
+                "message": "Throttle statistics",
+                "data": throttling.stats.snapshot(),
+                "code": status.HTTP_200_OK,
+            },
+            status=status.HTTP_200_OK,
+        )
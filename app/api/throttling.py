@@ -0,0 +1,129 @@
+import math
+import threading
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import ScopedRateThrottle, UserRateThrottle
+
+
+class ThrottleStats:
+    """
+    Per-process allowed/rejected request counters, per throttle scope.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def record(self, scope, allowed):
+        with self._lock:
+            counter = self._counters.setdefault(scope, {'allowed': 0, 'rejected': 0})
+            counter['allowed' if allowed else 'rejected'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = {scope: dict(counter) for scope, counter in self._counters.items()}
+
+        for counter in stats.values():
+            counter['rejection_rate'] = counter['rejected'] / (counter['allowed'] + counter['rejected'])
+
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+stats = ThrottleStats()
+
+# Serialize the read-modify-write of a bucket within the process. Buckets are
+# spread over a fixed set of locks, so only requests of the same client (or
+# clients sharing a lock) wait for each other.
+_locks = [threading.Lock() for _ in range(64)]
+
+
+def _lock_for(key):
+    return _locks[hash(key) % len(_locks)]
+
+
+def get_cost(request, view):
+    """
+    Tokens a request takes from every bucket: `view.get_throttle_cost(request)`,
+    1 for views without one.
+    """
+    get_throttle_cost = getattr(view, 'get_throttle_cost', None)
+    return get_throttle_cost(request) if get_throttle_cost is not None else 1
+
+
+class TokenBucketMixin:
+    """
+    Token bucket version of DRF's rate throttles, for the same
+    'number/period' rates: a bucket holds up to `number` tokens and refills
+    at `number` per period, each request takes its cost in tokens
+    (see `get_cost`) and is rejected when the bucket has too few left.
+    Bursts up to the rate are allowed, then requests are spread evenly
+    instead of being rejected until the whole period has passed.
+
+    A bucket is one (tokens, timestamp) cache entry, so with a shared cache
+    (e.g. Redis) the limits apply across processes. The update is not
+    atomic across processes, concurrent requests from one client may
+    occasionally both be let through.
+    """
+    def get_rate(self):
+        # Read the rates on every request rather than once at import, like the other settings
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError:
+            return None
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        # Requests costing more than a full bucket would never go through
+        self.cost = min(get_cost(request, view), self.num_requests)
+        refill_rate = self.num_requests / self.duration
+
+        with _lock_for(self.key):
+            self.now = self.timer()
+            tokens, updated_at = self.cache.get(self.key, (self.num_requests, self.now))
+            self.tokens = min(self.num_requests, tokens + (self.now - updated_at) * refill_rate)
+
+            allowed = self.tokens >= self.cost
+            if allowed:
+                self.tokens -= self.cost
+            # An expired bucket is a full one
+            self.cache.set(self.key, (self.tokens, self.now), math.ceil(self.duration))
+
+        stats.record(self.scope, allowed)
+        return allowed
+
+    def wait(self):
+        # Seconds until the bucket holds enough tokens again
+        return (self.cost - self.tokens) * self.duration / self.num_requests
+
+
+class UserTokenBucketThrottle(TokenBucketMixin, UserRateThrottle):
+    """
+    Limits every request of a user (or IP address, when anonymous) at the
+    'user' rate.
+    """
+    pass
+
+
+class EndpointTokenBucketThrottle(TokenBucketMixin, ScopedRateThrottle):
+    """
+    Limits the requests of a user to the views with a `throttle_scope`, at
+    the rate of that scope, e.g. `books_list`.
+    """
+    def allow_request(self, request, view):
+        # Like ScopedRateThrottle, the rate is only known once called by the view
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
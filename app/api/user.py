@@ -3,8 +3,13 @@ from rest_framework.response import Response
 from rest_framework import status, serializers, permissions
 from django.contrib.auth import get_user_model
 User = get_user_model()
-from app.services.user_services import create_user_account
+from app.services.user_services import create_user_account, revoke_user_tokens
+from rest_framework_simplejwt import serializers as jwt_serializers
 from rest_framework.generics import ListAPIView, RetrieveAPIView
+from app.api.pagination import UserKeysetPagination
+from app.api.conditional import conditional_get, make_etag
+from app.api.fast import FastSerializationMixin, ValuesSerializer
+from app.api.replicas import ReplicaReadsMixin
 
 class RegisterUser(APIView):
     """
@@ -59,16 +64,27 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ('user_id', 'name', 'email', 'membership_date')
 
-class GetAllUsers(ListAPIView):
+class GetAllUsers(ReplicaReadsMixin, FastSerializationMixin, ListAPIView):
     """
     API endpoint to retrieve a list of all regular users.
     - Requires the user to be authenticated.
+    - Pass `page_size` and/or `cursor` to get keyset-paginated results.
     """
     permission_classes = (permissions.IsAuthenticated, )
     queryset = User.objects.filter(is_superuser=False)
     serializer_class = UserSerializer
+    values_serializer = ValuesSerializer(User, UserSerializer.Meta.fields)
+    pagination_class = UserKeysetPagination
 
-class GetUserById(RetrieveAPIView):
+def user_version(request, pk):
+    # Users have no updated_at, the etag is derived from the serialized columns instead
+    values = User.objects.filter(user_id=pk, is_superuser=False).values_list('name', 'email', 'membership_date').first()
+    if values is None:
+        return None
+    return make_etag(pk, *values), None
+
+@conditional_get(user_version)
+class GetUserById(ReplicaReadsMixin, FastSerializationMixin, RetrieveAPIView):
     """
     API endpoint to retrieve details of a specific regular user by user ID.
     - Requires the user to be authenticated.
@@ -76,3 +92,33 @@ class GetUserById(RetrieveAPIView):
     permission_classes = (permissions.IsAuthenticated, )
     queryset = User.objects.filter(is_superuser=False)
     serializer_class = UserSerializer
+    values_serializer = ValuesSerializer(User, UserSerializer.Meta.fields)
+
+
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    """
+    Login serializer embedding the claims `StatelessJWTAuthentication` trusts
+    instead of loading the user on every request.
+    """
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        token['token_version'] = user.token_version
+        return token
+
+class RevokeTokens(APIView):
+    """
+    API endpoint to revoke all access and refresh tokens of the current user (log out everywhere).
+    - Requires the user to be authenticated.
+    """
+    permission_classes = (permissions.IsAuthenticated, )
+
+    def post(self, request):
+        revoke_user_tokens(request.user.pk)
+
+        return Response({
+            'message': 'All tokens revoked.',
+            'status': status.HTTP_200_OK,
+        }, status=status.HTTP_200_OK)
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        from django.core import checks
+        from django.db.backends.signals import connection_created
+        from app import signals, tasks  # noqa: F401
+        from app.db.routers import check_pin_cache
+        from app.middleware import install_query_recorder
+
+        connection_created.connect(install_query_recorder)
+        checks.register(check_pin_cache, checks.Tags.database)
@@ -0,0 +1,129 @@
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+User = get_user_model()
+
+
+class TokenVersionCache:
+    """
+    Small in-process TTL cache of user_id -> (token_version, is_active,
+    is_staff, is_superuser).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def _cached(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry
+        return None
+
+    def _query(self, user_id):
+        return User.objects.filter(pk=user_id).values_list('token_version', 'is_active', 'is_staff', 'is_superuser')
+
+    def get(self, user_id):
+        entry = self._cached(user_id)
+        if entry is not None:
+            return entry[1]
+
+        return self._store(user_id, self._query(user_id).first())
+
+    async def aget(self, user_id):
+        # Cache hits don't leave the event loop
+        entry = self._cached(user_id)
+        if entry is not None:
+            return entry[1]
+
+        return self._store(user_id, await self._query(user_id).afirst())
+
+    def _store(self, user_id, state):
+        with self._lock:
+            if len(self._entries) >= settings.AUTH_TOKEN_VERSION_CACHE_SIZE:
+                # Drop expired entries first, then the oldest ones
+                now = time.monotonic()
+                self._entries = {key: value for key, value in self._entries.items() if value[0] > now}
+                while len(self._entries) >= settings.AUTH_TOKEN_VERSION_CACHE_SIZE:
+                    del self._entries[next(iter(self._entries))]
+            self._entries[user_id] = (time.monotonic() + settings.AUTH_TOKEN_VERSION_TTL, state)
+
+        return state
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_versions = TokenVersionCache()
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    JWT authentication that trusts the signed claims of the token instead of
+    loading the User row on every request.
+
+    `request.user` is a `TokenUser` built from the claims added at login
+    (`user_id`, `is_staff`, `is_superuser`, `token_version`). Revocation,
+    deactivation and privilege changes are checked against the user's
+    `token_version`, `is_active`, `is_staff` and `is_superuser`, cached
+    in-process for AUTH_TOKEN_VERSION_TTL seconds, so most requests make no
+    auth query at all.
+
+    Tokens issued before `token_version` existed fall back to the regular
+    User lookup.
+    """
+    def get_user(self, validated_token):
+        if 'token_version' not in validated_token:
+            return JWTAuthentication.get_user(self, validated_token)
+
+        user = super().get_user(validated_token)
+        self.check_state(validated_token, token_versions.get(user.pk))
+        return user
+
+    async def aauthenticate(self, request):
+        """
+        Async `authenticate()` for async views. Token validation is pure CPU
+        and the token version usually comes from the cache, so most requests
+        never leave the event loop.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+
+        if 'token_version' not in validated_token:
+            user = await sync_to_async(JWTAuthentication.get_user)(self, validated_token)
+        else:
+            user = super().get_user(validated_token)
+            self.check_state(validated_token, await token_versions.aget(user.pk))
+
+        return user, validated_token
+
+    def check_state(self, validated_token, state):
+        if state is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+
+        token_version, is_active, is_staff, is_superuser = state
+        if not is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        if token_version != validated_token['token_version']:
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+        # Tokens issued before a privilege change carry stale claims, the user has to log in again
+        if (is_staff, is_superuser) != (validated_token['is_staff'], validated_token['is_superuser']):
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+
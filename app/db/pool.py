@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of open DB-API connections, shared by every thread of
+    the process.
+
+    `getconn()` hands out the most recently returned idle connection, opens
+    a new one while fewer than `max_size` exist, and otherwise waits up to
+    `timeout` seconds for one to be returned. Connections idle for longer
+    than `max_idle` seconds are closed instead of being reused.
+    """
+    def __init__(self, max_size=20, timeout=10.0, max_idle=300.0):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+
+        self._condition = threading.Condition()
+        # (connection, returned at), newest last
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+
+        # Counters for benchmarks and monitoring
+        self.opened = 0
+        self.reused = 0
+        self.waited = 0
+
+    def getconn(self, connect, check=None):
+        """
+        Return a connection from the pool, or a new one opened by `connect()`.
+        `check(connection)` is called on reused connections and should return
+        False if it is no longer usable.
+        """
+        deadline = time.monotonic() + self.timeout
+
+        while True:
+            connection = self._checkout(deadline)
+            if connection is None:
+                break
+            if check is None or check(connection):
+                return connection
+            self.putconn(connection, discard=True)
+
+        try:
+            connection = connect()
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            self.opened += 1
+        return connection
+
+    def _checkout(self, deadline):
+        # An idle connection, or None after reserving a slot for a new one
+        with self._condition:
+            while True:
+                self._close_expired()
+                if self._idle:
+                    self.reused += 1
+                    return self._idle.pop()[0]
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None
+
+                self.waited += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    raise PoolTimeout(f'No connection available within {self.timeout}s ({self.max_size} in use)')
+
+    def _close_expired(self):
+        expired = time.monotonic() - self.max_idle
+        while self._idle and self._idle[0][1] < expired:
+            self._discard(self._idle.popleft()[0])
+
+    def _discard(self, connection):
+        self._size -= 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def putconn(self, connection, discard=False):
+        with self._condition:
+            if discard or self._closed or connection.closed:
+                self._discard(connection)
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def close(self):
+        """
+        Close the idle connections. Connections in use are closed when returned.
+        """
+        with self._condition:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.popleft()[0])
+
+    def stats(self):
+        with self._condition:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'max_size': self.max_size,
+                'opened': self.opened,
+                'reused': self.reused,
+                'waited': self.waited,
+            }
@@ -0,0 +1,113 @@
+import threading
+from functools import partial
+
+from django.db.backends.postgresql import base, creation
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+from app.db.pool import ConnectionPool, PoolTimeout
+
+# connection.info.transaction_status values, the same in psycopg2 and psycopg 3
+TRANSACTION_STATUS_IDLE = 0
+TRANSACTION_STATUS_ACTIVE = 1
+TRANSACTION_STATUS_UNKNOWN = 4
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, conn_params, options):
+    # The test runner connects the same alias to other databases, keep one pool per target
+    key = (alias, conn_params.get('dbname'), repr(sorted(conn_params.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(**options)
+        return pool
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats():
+    with _pools_lock:
+        return {f'{alias}:{dbname}': pool.stats() for (alias, dbname, _), pool in _pools.items()}
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections would keep the test database in use
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL backend taking its connections from a per-process
+    `ConnectionPool` instead of opening a new one each time.
+
+    Closing the connection (at the end of every request, with CONN_MAX_AGE
+    set to 0) rolls back anything left open and hands it back to the pool,
+    so the next request skips the connection handshake. Unlike persistent
+    connections, which belong to a thread, pooled connections are shared by
+    all threads, including the short-lived ones ASGI runs each request in.
+
+    The pool is configured with `OPTIONS['pool']`: `max_size`, `timeout`
+    and `max_idle` (see `ConnectionPool`). With CONN_HEALTH_CHECKS on,
+    reused connections are checked with `SELECT 1` first.
+    """
+    creation_class = DatabaseCreation
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('pool', None)
+        return conn_params
+
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict['OPTIONS']
+        self.pool = get_pool(self.alias, conn_params, options.get('pool', {}))
+
+        check = self.check_connection if self.settings_dict['CONN_HEALTH_CHECKS'] else None
+        try:
+            connection = self.pool.getconn(partial(super().get_new_connection, conn_params), check)
+        except PoolTimeout as exc:
+            # Surfaces as django.db.OperationalError, like failing to connect
+            raise self.Database.OperationalError(str(exc))
+
+        # Normally set while connecting, reused connections keep their isolation level
+        self.isolation_level = IsolationLevel(options.get('isolation_level', IsolationLevel.READ_COMMITTED))
+        return connection
+
+    def check_connection(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            connection.rollback()
+        except self.Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        if self.connection is None:
+            return
+
+        connection = self.connection
+        # Closed inside an atomic block, the wrapper keeps a reference to it
+        discard = self.in_atomic_block
+
+        if not discard:
+            try:
+                status = connection.info.transaction_status
+                if status in (TRANSACTION_STATUS_ACTIVE, TRANSACTION_STATUS_UNKNOWN):
+                    discard = True
+                elif status != TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            except self.Database.Error:
+                discard = True
+
+        self.pool.putconn(connection, discard=discard)
@@ -0,0 +1,115 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+
+from app.services.cache_services import cache_is_shared
+
+PINNED_KEY = 'db_pinned:{}'
+
+# Routing state of the request being served, set by ReplicaRoutingMiddleware
+_state = ContextVar('db_routing_state', default=None)
+
+
+class RoutingState:
+    def __init__(self):
+        self.use_replica = False
+        self.pinned = False
+
+
+def start_request():
+    """
+    Give the current request its own routing state, reads go to the
+    primary until `use_replica()` is called. Returns a token for `end_request()`.
+    """
+    return _state.set(RoutingState())
+
+
+def end_request(token):
+    _state.reset(token)
+
+
+def pin_to_primary(user_id):
+    """
+    Send the user's reads to the primary for POSTGRES_REPLICA_STICKY_SECONDS,
+    so they see their own writes whatever the replication lag.
+    """
+    cache.set(PINNED_KEY.format(user_id), True, settings.POSTGRES_REPLICA_STICKY_SECONDS)
+
+
+def use_replica(user_id):
+    """
+    Send the rest of the current request's reads to a replica, unless the
+    user wrote recently.
+    """
+    state = _state.get()
+    if state is None or not settings.DATABASE_REPLICAS:
+        return
+
+    state.pinned = cache.get(PINNED_KEY.format(user_id)) is not None
+    state.use_replica = not state.pinned
+
+
+async def ause_replica(user_id):
+    state = _state.get()
+    if state is None or not settings.DATABASE_REPLICAS:
+        return
+
+    state.pinned = await cache.aget(PINNED_KEY.format(user_id)) is not None
+    state.use_replica = not state.pinned
+
+
+def reads_from_replica():
+    """
+    Whether the current request's reads go to a replica, which may lag behind the primary.
+    """
+    state = _state.get()
+    return state is not None and state.use_replica
+
+
+def is_pinned():
+    """
+    Whether the current request reads from the primary because the user wrote recently.
+    """
+    state = _state.get()
+    return state is not None and state.pinned
+
+
+def check_pin_cache(app_configs, **kwargs):
+    """
+    System check: pins live in the default cache, every worker must see
+    them or users may not read their own writes.
+    """
+    if settings.DATABASE_REPLICAS and not cache_is_shared():
+        return [checks.Error(
+            'POSTGRES_REPLICA_HOSTS requires a cache shared by all workers (CACHE_BACKEND).',
+            hint='Users are pinned to the primary after a write in the default cache, '
+                 'a per-process cache only pins them on the worker that served the write.',
+            id='app.E001',
+        )]
+    return []
+
+
+class ReplicaRouter:
+    """
+    Sends reads to a random replica (DATABASE_REPLICAS) once the request
+    opted in with `use_replica()`, everything else goes to the primary:
+    writes, reads of other requests, management commands and migrations.
+    """
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is not None and state.use_replica:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,58 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+# Password hashing, the bulk of the CPU time of registering and logging in.
+# Hashes are computed on a pool of PASSWORD_HASHING_THREADS threads: hashlib
+# and argon2-cffi release the GIL, so hashes run on every core while other
+# requests go on, and a login spike queues for the pool instead of
+# oversubscribing the CPUs (and memory, scrypt and Argon2 take several MB
+# per hash).
+
+_pool = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+
+def _run(func, *args, **kwargs):
+    global _pool
+    # Hashers call each other (verify() calls encode()), only the outermost call is queued
+    if getattr(_local, 'in_pool', False):
+        return func(*args, **kwargs)
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASHING_THREADS,
+                                           thread_name_prefix='password-hasher', initializer=_mark_pool_thread)
+    return _pool.submit(func, *args, **kwargs).result()
+
+
+def _mark_pool_thread():
+    _local.in_pool = True
+
+
+class PooledHasherMixin:
+    """
+    Computes the hashes of a Django password hasher on the hashing pool.
+    The algorithm and encoded format are unchanged.
+    """
+    def encode(self, *args, **kwargs):
+        return _run(super().encode, *args, **kwargs)
+
+    def verify(self, password, encoded):
+        return _run(super().verify, password, encoded)
+
+
+class PBKDF2PasswordHasher(PooledHasherMixin, hashers.PBKDF2PasswordHasher):
+    pass
+
+
+class ScryptPasswordHasher(PooledHasherMixin, hashers.ScryptPasswordHasher):
+    pass
+
+
+class Argon2PasswordHasher(PooledHasherMixin, hashers.Argon2PasswordHasher):
+    pass
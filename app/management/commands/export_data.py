@@ -0,0 +1,40 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from app.services.export_services import CHUNK_SIZE, EXPORTS, export_rows
+from app.services.import_services import FILE_FORMATS
+
+
+class Command(BaseCommand):
+    help = 'Export books (with their details), users or loans as CSV or JSON Lines, streaming row by row.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=list(EXPORTS), help='What to export.')
+        parser.add_argument('--format', choices=FILE_FORMATS, default='csv', dest='file_format',
+                            help='File format, csv by default.')
+        parser.add_argument('--output', help='File to write to. Written to stdout by default.')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Rows fetched from the database per round trip.')
+
+    def open_output(self, path, compress):
+        if compress:
+            # gzip.open leaves stdout open when it is closed
+            return gzip.open(path or sys.stdout.buffer, 'wt', encoding='utf-8', newline='')
+        return open(path, 'w', encoding='utf-8', newline='')
+
+    def handle(self, *args, **options):
+        chunks = export_rows(options['name'], options['file_format'], chunk_size=options['chunk_size'])
+
+        if options['output'] is None and not options['gzip']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        try:
+            with self.open_output(options['output'], options['gzip']) as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        except OSError as e:
+            raise CommandError(e)
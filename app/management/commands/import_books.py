@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from app.services.import_services import FILE_FORMATS, get_file_format, import_books, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import (upsert by isbn) books and their details from a CSV or JSON Lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON Lines file to import.')
+        parser.add_argument('--format', choices=FILE_FORMATS, dest='file_format',
+                            help='File format. Guessed from the file extension by default.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of rows validated and written per batch.')
+
+    def handle(self, *args, **options):
+        file_format = options['file_format'] or get_file_format(options['path'])
+        if file_format is None:
+            raise CommandError('Cannot guess the file format, pass --format.')
+
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as f:
+                result = import_books(read_rows(f, file_format), batch_size=options['batch_size'])
+        except OSError as e:
+            raise CommandError(e)
+
+        for error in result['errors']:
+            self.stderr.write(f"Row {error['row']}: {dict(error['errors'])}")
+
+        if result['aborted']:
+            raise CommandError(f"Row {result['errors'][-1]['row']} could not be read, the import stopped there. "
+                               f"{result['imported']} books were imported.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['imported']} books, {len(result['errors'])} rows failed."
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from app.services.report_services import rebuild_loan_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the monthly book and user and the daily genre circulation rollups from the loan ledger.'
+
+    def handle(self, *args, **options):
+        rebuild_loan_stats()
+
+        self.stdout.write(self.style.SUCCESS("Loan statistics rebuilt."))
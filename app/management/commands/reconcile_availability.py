@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from app.services.book_services import reconcile_availability
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the availability (current loan) of every book from the open loans.'
+
+    def handle(self, *args, **options):
+        fixed = reconcile_availability()
+
+        self.stdout.write(self.style.SUCCESS(f"Fixed the availability of {len(fixed)} books."))
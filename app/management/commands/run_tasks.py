@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from app.services.task_services import purge_finished_tasks, requeue_stale_tasks, run_pending_tasks, start_workers
+
+# Seconds between two checks for lost tasks and old finished ones
+MAINTENANCE_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = ('Run the queued background tasks with a pool of worker threads until interrupted. '
+            'Start several processes for more CPU-bound throughput.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, help='Worker threads (default TASK_WORKER_THREADS).')
+        parser.add_argument('--poll-interval', type=float,
+                            help='Seconds a worker waits when the queue is empty (default TASK_POLL_INTERVAL).')
+        parser.add_argument('--once', action='store_true', help='Run the tasks that are due, then exit.')
+
+    def handle(self, *args, **options):
+        requeue_stale_tasks()
+
+        if options['once']:
+            count = run_pending_tasks()
+            self.stdout.write(self.style.SUCCESS(f"Ran {count} tasks."))
+            return
+
+        threads = options['threads'] or settings.TASK_WORKER_THREADS
+        stop, workers = start_workers(threads, options['poll_interval'] or settings.TASK_POLL_INTERVAL)
+        self.stdout.write(f"Running tasks with {threads} threads, press Ctrl+C to stop.")
+
+        try:
+            while True:
+                time.sleep(MAINTENANCE_INTERVAL)
+                requeue_stale_tasks()
+                purge_finished_tasks()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # Let running tasks finish
+            stop.set()
+            for worker in workers:
+                worker.join()
+
+        self.stdout.write(self.style.SUCCESS("Stopped."))
@@ -0,0 +1,25 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from app.services.book_services import sweep_overdue_loans
+
+
+class Command(BaseCommand):
+    help = ('Flag the open loans past their due date as overdue and queue a reminder for each. '
+            'Run it from cron, or with --interval as a long-running worker.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Loans flagged per statement (default OVERDUE_SWEEP_BATCH_SIZE).')
+        parser.add_argument('--interval', type=int,
+                            help='Sweep again every INTERVAL seconds instead of exiting after one sweep.')
+
+    def handle(self, *args, **options):
+        while True:
+            flagged = sweep_overdue_loans(date.today(), options['batch_size'])
+
+            self.stdout.write(self.style.SUCCESS(f"Flagged {flagged} overdue loans."))
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
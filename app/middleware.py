@@ -0,0 +1,202 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from app.db import routers
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+logger = logging.getLogger('app.performance')
+
+
+class QueryRecorder:
+    """
+    Counts and times the queries of one request, see `record_query`.
+    """
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+
+# Recorder of the current request. Context variables follow the request into
+# the sync_to_async threads where, under ASGI, its queries actually run.
+_recorder = ContextVar('query_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    # Execute wrapper of every connection, records the query for the current request if any
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # connection_created receiver (see AppConfig.ready), connections are per thread
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class PerformanceMiddleware:
+    """
+    Records per-request query count, DB time, view time (Python time spent
+    in the view outside the database, which is where DRF serializes),
+    render time (JSON encoding) and response size.
+
+    The numbers are logged as one JSON line on the `app.performance` logger,
+    and sent back as a `Server-Timing` header when PERFORMANCE_SERVER_TIMING
+    is on. A warning is logged when the same SQL runs at least
+    PERFORMANCE_N_PLUS_ONE_THRESHOLD times in one request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        recorder = QueryRecorder()
+        request._performance_render = [0.0, 0.0]
+
+        start = time.perf_counter()
+        token = _recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+
+        return self.finish(request, response, recorder, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        # Under ASGI, async views run here without being moved to a thread
+        recorder = QueryRecorder()
+        request._performance_render = [0.0, 0.0]
+
+        start = time.perf_counter()
+        token = _recorder.set(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _recorder.reset(token)
+
+        return self.finish(request, response, recorder, time.perf_counter() - start)
+
+    def finish(self, request, response, recorder, total):
+        render_start, render_end = request._performance_render
+        render = render_end - render_start
+        view = max(0.0, total - recorder.duration - render)
+
+        metrics = {
+            'method': request.method,
+            'path': request.path,
+            'view': request.resolver_match.view_name if request.resolver_match else None,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'db_ms': round(recorder.duration * 1000, 2),
+            'view_ms': round(view * 1000, 2),
+            'render_ms': round(render * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'response_bytes': None if response.streaming else len(response.content),
+        }
+        logger.info(json.dumps(metrics))
+
+        if recorder.statements:
+            sql, repeated = recorder.statements.most_common(1)[0]
+            if repeated >= settings.PERFORMANCE_N_PLUS_ONE_THRESHOLD:
+                logger.warning(json.dumps({
+                    'warning': 'possible N+1 queries',
+                    'view': metrics['view'],
+                    'path': request.path,
+                    'repeated': repeated,
+                    'sql': sql,
+                }))
+
+        if settings.PERFORMANCE_SERVER_TIMING:
+            response.headers['Server-Timing'] = ', '.join([
+                f'db;dur={metrics["db_ms"]};desc="{recorder.count} queries"',
+                f'view;dur={metrics["view_ms"]}',
+                f'render;dur={metrics["render_ms"]}',
+                f'total;dur={metrics["total_ms"]}',
+            ])
+
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook returns
+        timings = request._performance_render
+        timings[0] = time.perf_counter()
+
+        def rendered(response):
+            timings[1] = time.perf_counter()
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Gives every request its own database routing state (see
+    `app.db.routers`), and pins users to the primary after a successful
+    write (any non-GET request) so their next reads see it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = routers.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.end_request(token)
+
+        self.pin_if_wrote(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = routers.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            routers.end_request(token)
+
+        if request.method not in SAFE_METHODS:
+            # request.user may still be the lazy session user, which queries the database
+            await sync_to_async(self.pin_if_wrote)(request, response)
+        return response
+
+    def pin_if_wrote(self, request, response):
+        if not settings.DATABASE_REPLICAS or request.method in SAFE_METHODS or response.status_code >= 400:
+            return
+
+        # DRF sets request.user on the Django request once it authenticated it
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            routers.pin_to_primary(user.pk)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_alter_bookdetails_book'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['created_at', 'book_id'], name='book_created_at_id_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_book_created_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='borrowedbooks',
+            constraint=models.UniqueConstraint(condition=models.Q(('return_date__isnull', True)), fields=('book',), name='unique_active_loan_per_book'),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 4.2 on 2026-10-18 17:46
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+# Book.search_vector is kept up to date by triggers so that every write path
+# (ORM saves, bulk_create upserts, raw SQL) maintains it without extra queries.
+SEARCH_TRIGGERS_SQL = """
+CREATE FUNCTION app_book_search_document(title text, publisher text) RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+           setweight(to_tsvector('english', coalesce(publisher, '')), 'B')
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE FUNCTION app_book_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := app_book_search_document(
+        NEW.title,
+        (SELECT publisher FROM app_bookdetails WHERE book_id = NEW.book_id)
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER app_book_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title ON app_book
+    FOR EACH ROW EXECUTE FUNCTION app_book_search_vector_update();
+
+CREATE FUNCTION app_bookdetails_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE app_book SET search_vector = app_book_search_document(title, NULL)
+        WHERE book_id = OLD.book_id;
+        RETURN OLD;
+    END IF;
+
+    UPDATE app_book SET search_vector = app_book_search_document(title, NEW.publisher)
+    WHERE book_id = NEW.book_id;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER app_bookdetails_search_vector_trigger
+    AFTER INSERT OR UPDATE OF publisher OR DELETE ON app_bookdetails
+    FOR EACH ROW EXECUTE FUNCTION app_bookdetails_search_vector_update();
+
+UPDATE app_book SET search_vector = app_book_search_document(
+    app_book.title,
+    (SELECT publisher FROM app_bookdetails WHERE book_id = app_book.book_id)
+);
+"""
+
+DROP_SEARCH_TRIGGERS_SQL = """
+DROP TRIGGER app_bookdetails_search_vector_trigger ON app_bookdetails;
+DROP FUNCTION app_bookdetails_search_vector_update();
+DROP TRIGGER app_book_search_vector_trigger ON app_book;
+DROP FUNCTION app_book_search_vector_update();
+DROP FUNCTION app_book_search_document(text, text);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_unique_active_loan_per_book'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_TRIGGERS_SQL, DROP_SEARCH_TRIGGERS_SQL),
+        migrations.AddIndex(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='book_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['genre'], name='book_genre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['published_date'], name='book_published_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookdetails',
+            index=models.Index(fields=['language'], name='bookdetails_language_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2 on 2026-10-18 17:47
+
+from django.db import migrations
+
+
+# BookDetails changes are part of a book's representation, so they also bump
+# app_book.updated_at (used for ETag / Last-Modified) from the same trigger
+# that keeps the search vector up to date.
+BOOKDETAILS_TRIGGER_SQL = """
+DROP TRIGGER app_bookdetails_search_vector_trigger ON app_bookdetails;
+DROP FUNCTION app_bookdetails_search_vector_update();
+
+CREATE FUNCTION app_bookdetails_update_book() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE app_book SET search_vector = app_book_search_document(title, NULL), updated_at = now()
+        WHERE book_id = OLD.book_id;
+        RETURN OLD;
+    END IF;
+
+    UPDATE app_book SET search_vector = app_book_search_document(title, NEW.publisher), updated_at = now()
+    WHERE book_id = NEW.book_id;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER app_bookdetails_update_book_trigger
+    AFTER INSERT OR UPDATE OR DELETE ON app_bookdetails
+    FOR EACH ROW EXECUTE FUNCTION app_bookdetails_update_book();
+"""
+
+REVERSE_BOOKDETAILS_TRIGGER_SQL = """
+DROP TRIGGER app_bookdetails_update_book_trigger ON app_bookdetails;
+DROP FUNCTION app_bookdetails_update_book();
+
+CREATE FUNCTION app_bookdetails_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE app_book SET search_vector = app_book_search_document(title, NULL)
+        WHERE book_id = OLD.book_id;
+        RETURN OLD;
+    END IF;
+
+    UPDATE app_book SET search_vector = app_book_search_document(title, NEW.publisher)
+    WHERE book_id = NEW.book_id;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER app_bookdetails_search_vector_trigger
+    AFTER INSERT OR UPDATE OF publisher OR DELETE ON app_bookdetails
+    FOR EACH ROW EXECUTE FUNCTION app_bookdetails_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_book_search'),
+    ]
+
+    operations = [
+        migrations.RunSQL(BOOKDETAILS_TRIGGER_SQL, REVERSE_BOOKDETAILS_TRIGGER_SQL),
+    ]
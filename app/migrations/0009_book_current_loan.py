@@ -0,0 +1,67 @@
+# Generated by Django 4.2 on 2026-10-18 17:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Every loan insert, return, book change or delete updates the book's
+# current_loan in the same transaction, and bumps app_book.updated_at since
+# availability is part of the book's representation (ETag / Last-Modified).
+BORROWEDBOOKS_TRIGGER_SQL = """
+CREATE FUNCTION app_borrowedbooks_update_book() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE app_book SET current_loan_id = NULL, updated_at = now()
+        WHERE current_loan_id = OLD.id;
+        RETURN OLD;
+    END IF;
+
+    IF TG_OP = 'UPDATE' AND OLD.return_date IS NULL
+            AND (NEW.return_date IS NOT NULL OR NEW.book_id <> OLD.book_id) THEN
+        UPDATE app_book SET current_loan_id = NULL, updated_at = now()
+        WHERE current_loan_id = OLD.id;
+    END IF;
+
+    IF NEW.return_date IS NULL
+            AND (TG_OP = 'INSERT' OR OLD.return_date IS NOT NULL OR NEW.book_id <> OLD.book_id) THEN
+        UPDATE app_book SET current_loan_id = NEW.id, updated_at = now()
+        WHERE book_id = NEW.book_id;
+    END IF;
+
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER app_borrowedbooks_update_book_trigger
+    AFTER INSERT OR UPDATE OF return_date, book_id OR DELETE ON app_borrowedbooks
+    FOR EACH ROW EXECUTE FUNCTION app_borrowedbooks_update_book();
+
+UPDATE app_book b SET current_loan_id = l.id
+FROM app_borrowedbooks l
+WHERE l.book_id = b.book_id AND l.return_date IS NULL;
+"""
+
+REVERSE_BORROWEDBOOKS_TRIGGER_SQL = """
+DROP TRIGGER app_borrowedbooks_update_book_trigger ON app_borrowedbooks;
+DROP FUNCTION app_borrowedbooks_update_book();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_user_token_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='current_loan',
+            field=models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='app.borrowedbooks'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('current_loan__isnull', True)), fields=['created_at', 'book_id'], name='book_available_created_at_idx'),
+        ),
+        migrations.RunSQL(BORROWEDBOOKS_TRIGGER_SQL, REVERSE_BORROWEDBOOKS_TRIGGER_SQL),
+    ]
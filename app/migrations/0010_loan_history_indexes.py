@@ -0,0 +1,47 @@
+# Generated by Django 4.2 on 2026-10-18 18:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_book_current_loan'),
+    ]
+
+    operations = [
+        # Create the composite indexes before dropping the plain foreign key indexes they replace
+        migrations.AddIndex(
+            model_name='borrowedbooks',
+            index=models.Index(fields=['user', 'borrow_date', 'id'], name='loan_user_borrow_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowedbooks',
+            index=models.Index(fields=['book', 'borrow_date', 'id'], name='loan_book_borrow_date_idx'),
+        ),
+        # AlterField(db_index=False) would also drop the unique_active_loan_per_book
+        # partial index on book_id, so only the plain foreign key indexes are dropped here
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'DROP INDEX app_borrowedbooks_book_id_9cc4c490; DROP INDEX app_borrowedbooks_user_id_2f093a81;',
+                    'CREATE INDEX app_borrowedbooks_book_id_9cc4c490 ON app_borrowedbooks (book_id); '
+                    'CREATE INDEX app_borrowedbooks_user_id_2f093a81 ON app_borrowedbooks (user_id);',
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='borrowedbooks',
+                    name='book',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='app.book'),
+                ),
+                migrations.AlterField(
+                    model_name='borrowedbooks',
+                    name='user',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+    ]
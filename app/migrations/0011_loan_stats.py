@@ -0,0 +1,184 @@
+# Generated by Django 4.2 on 2026-10-18 18:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Every loan insert, return, change or delete adds its delta to the monthly
+# book and user rollups and the daily genre rollup in the same transaction.
+# Loans count on their borrow date, returns on their return date. Counts are
+# only ever removed with UPDATE, so deleting a book or user (whose rollup rows
+# may already be gone) never recreates a row. Genre rollups use the book's
+# genre at the time of the change, `rebuild_loan_stats` recomputes everything
+# from the ledger.
+LOAN_STATS_TRIGGER_SQL = """
+CREATE FUNCTION app_loan_stats_add(p_user_id bigint, p_book_id bigint, p_day date, p_loans integer, p_returns integer)
+RETURNS void AS $$
+BEGIN
+    IF p_loans + p_returns > 0 THEN
+        INSERT INTO app_bookmonthlystats (book_id, month, loans, returns)
+        VALUES (p_book_id, date_trunc('month', p_day)::date, p_loans, p_returns)
+        ON CONFLICT (book_id, month) DO UPDATE
+        SET loans = app_bookmonthlystats.loans + EXCLUDED.loans, returns = app_bookmonthlystats.returns + EXCLUDED.returns;
+
+        INSERT INTO app_genredailystats (genre, day, loans, returns)
+        SELECT genre, p_day, p_loans, p_returns FROM app_book WHERE book_id = p_book_id
+        ON CONFLICT (genre, day) DO UPDATE
+        SET loans = app_genredailystats.loans + EXCLUDED.loans, returns = app_genredailystats.returns + EXCLUDED.returns;
+
+        INSERT INTO app_usermonthlystats (user_id, month, loans, returns)
+        VALUES (p_user_id, date_trunc('month', p_day)::date, p_loans, p_returns)
+        ON CONFLICT (user_id, month) DO UPDATE
+        SET loans = app_usermonthlystats.loans + EXCLUDED.loans, returns = app_usermonthlystats.returns + EXCLUDED.returns;
+    ELSE
+        UPDATE app_bookmonthlystats SET loans = loans + p_loans, returns = returns + p_returns
+        WHERE book_id = p_book_id AND month = date_trunc('month', p_day)::date;
+
+        UPDATE app_genredailystats SET loans = loans + p_loans, returns = returns + p_returns
+        WHERE genre = (SELECT genre FROM app_book WHERE book_id = p_book_id) AND day = p_day;
+
+        UPDATE app_usermonthlystats SET loans = loans + p_loans, returns = returns + p_returns
+        WHERE user_id = p_user_id AND month = date_trunc('month', p_day)::date;
+    END IF;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION app_borrowedbooks_update_stats() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.user_id = OLD.user_id AND NEW.book_id = OLD.book_id AND NEW.borrow_date = OLD.borrow_date THEN
+        -- The usual case, a return: only the return date moved
+        IF OLD.return_date IS DISTINCT FROM NEW.return_date THEN
+            IF OLD.return_date IS NOT NULL THEN
+                PERFORM app_loan_stats_add(OLD.user_id, OLD.book_id, OLD.return_date, 0, -1);
+            END IF;
+            IF NEW.return_date IS NOT NULL THEN
+                PERFORM app_loan_stats_add(NEW.user_id, NEW.book_id, NEW.return_date, 0, 1);
+            END IF;
+        END IF;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM app_loan_stats_add(OLD.user_id, OLD.book_id, OLD.borrow_date, -1, 0);
+        IF OLD.return_date IS NOT NULL THEN
+            PERFORM app_loan_stats_add(OLD.user_id, OLD.book_id, OLD.return_date, 0, -1);
+        END IF;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM app_loan_stats_add(NEW.user_id, NEW.book_id, NEW.borrow_date, 1, 0);
+        IF NEW.return_date IS NOT NULL THEN
+            PERFORM app_loan_stats_add(NEW.user_id, NEW.book_id, NEW.return_date, 0, 1);
+        END IF;
+    END IF;
+
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER app_borrowedbooks_update_stats_trigger
+    AFTER INSERT OR UPDATE OF user_id, book_id, borrow_date, return_date OR DELETE ON app_borrowedbooks
+    FOR EACH ROW EXECUTE FUNCTION app_borrowedbooks_update_stats();
+"""
+
+BACKFILL_LOAN_STATS_SQL = """
+WITH events AS (
+    SELECT user_id, book_id, borrow_date AS day, 1 AS loans, 0 AS returns FROM app_borrowedbooks
+    UNION ALL
+    SELECT user_id, book_id, return_date, 0, 1 FROM app_borrowedbooks WHERE return_date IS NOT NULL
+), book_stats AS (
+    INSERT INTO app_bookmonthlystats (book_id, month, loans, returns)
+    SELECT book_id, date_trunc('month', day)::date, SUM(loans), SUM(returns) FROM events GROUP BY 1, 2
+), user_stats AS (
+    INSERT INTO app_usermonthlystats (user_id, month, loans, returns)
+    SELECT user_id, date_trunc('month', day)::date, SUM(loans), SUM(returns) FROM events GROUP BY 1, 2
+)
+INSERT INTO app_genredailystats (genre, day, loans, returns)
+SELECT b.genre, e.day, SUM(e.loans), SUM(e.returns) FROM events e JOIN app_book b ON b.book_id = e.book_id
+GROUP BY b.genre, e.day;
+"""
+
+REVERSE_LOAN_STATS_TRIGGER_SQL = """
+DROP TRIGGER app_borrowedbooks_update_stats_trigger ON app_borrowedbooks;
+DROP FUNCTION app_borrowedbooks_update_stats();
+DROP FUNCTION app_loan_stats_add(bigint, bigint, date, integer, integer);
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_loan_history_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookMonthlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('loans', models.IntegerField(default=0)),
+                ('returns', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'bookmonthlystats',
+            },
+        ),
+        migrations.CreateModel(
+            name='GenreDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('genre', models.CharField(max_length=100)),
+                ('day', models.DateField()),
+                ('loans', models.IntegerField(default=0)),
+                ('returns', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'genredailystats',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserMonthlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('loans', models.IntegerField(default=0)),
+                ('returns', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'usermonthlystats',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='genredailystats',
+            index=models.Index(fields=['day', 'genre'], name='genredailystats_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='genredailystats',
+            constraint=models.UniqueConstraint(fields=('genre', 'day'), name='unique_genre_day_stats'),
+        ),
+        migrations.AddField(
+            model_name='bookmonthlystats',
+            name='book',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='app.book'),
+        ),
+        migrations.AddIndex(
+            model_name='usermonthlystats',
+            index=models.Index(fields=['month', 'user'], include=('loans',), name='usermonthlystats_month_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='usermonthlystats',
+            constraint=models.UniqueConstraint(fields=('user', 'month'), name='unique_user_month_stats'),
+        ),
+        migrations.AddIndex(
+            model_name='bookmonthlystats',
+            index=models.Index(fields=['month', 'book'], include=('loans',), name='bookmonthlystats_month_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookmonthlystats',
+            constraint=models.UniqueConstraint(fields=('book', 'month'), name='unique_book_month_stats'),
+        ),
+        migrations.RunSQL(LOAN_STATS_TRIGGER_SQL, REVERSE_LOAN_STATS_TRIGGER_SQL),
+        migrations.RunSQL(BACKFILL_LOAN_STATS_SQL, migrations.RunSQL.noop),
+    ]
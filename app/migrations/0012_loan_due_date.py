@@ -0,0 +1,59 @@
+# Generated by Django 4.2 on 2026-10-18 18:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Existing loans are due LOAN_PERIOD_DAYS after their borrow date. Neither
+# loan trigger fires on due_date or overdue, so the backfill leaves the
+# availability pointers and circulation rollups alone.
+BACKFILL_DUE_DATE_SQL = "UPDATE app_borrowedbooks SET due_date = borrow_date + %s"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_loan_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrowedbooks',
+            name='due_date',
+            field=models.DateField(null=True, blank=True),
+        ),
+        migrations.RunSQL([(BACKFILL_DUE_DATE_SQL, [settings.LOAN_PERIOD_DAYS])], migrations.RunSQL.noop),
+        migrations.AlterField(
+            model_name='borrowedbooks',
+            name='due_date',
+            field=models.DateField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='borrowedbooks',
+            name='overdue',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='borrowedbooks',
+            index=models.Index(condition=models.Q(('overdue', False), ('return_date__isnull', True)), fields=['due_date', 'id'], name='loan_open_due_date_idx'),
+        ),
+        migrations.CreateModel(
+            name='LoanReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('overdue', 'Overdue')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('loan', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='app.borrowedbooks')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='loanreminder',
+            constraint=models.UniqueConstraint(fields=('loan', 'kind'), name='unique_loan_reminder_kind'),
+        ),
+        migrations.AddIndex(
+            model_name='loanreminder',
+            index=models.Index(condition=models.Q(('sent_at__isnull', True)), fields=['created_at'], name='loanreminder_unsent_idx'),
+        ),
+    ]
@@ -0,0 +1,144 @@
+# Generated by Django 4.2 on 2026-10-18 21:40
+
+from importlib import import_module
+
+from django.db import migrations
+
+loan_stats = import_module('app.migrations.0011_loan_stats')
+
+
+# The rollups are now maintained once per statement instead of once per loan
+# row. The loan changes of a statement are summed per rollup row first, then
+# applied in key order (book rollups, then genre, then user, each sorted), so
+# concurrent statements, e.g. two bulk borrows whose books share genres in a
+# different order, always lock the rollup rows in the same order and cannot
+# deadlock on them. A bulk borrow of 50 books also makes three upserts
+# instead of 150.
+#
+# Transition tables can't be combined with `UPDATE OF` column lists, so the
+# UPDATE trigger fires on every loan update, but does nothing unless a loan's
+# user, book, borrow or return date changed (e.g. not for the overdue sweep).
+# The old and new versions of unchanged loans cancel out.
+# As before, counts are only removed from rollup rows that still exist, so
+# deleting a book or user never recreates a row.
+LOAN_STATS_STATEMENT_TRIGGER_SQL = """
+DROP TRIGGER app_borrowedbooks_update_stats_trigger ON app_borrowedbooks;
+DROP FUNCTION app_borrowedbooks_update_stats();
+DROP FUNCTION app_loan_stats_add(bigint, bigint, date, integer, integer);
+
+CREATE TYPE app_loan_stats_delta AS (user_id bigint, book_id bigint, day date, loans integer, returns integer);
+
+CREATE FUNCTION app_loan_stats_apply(p_deltas app_loan_stats_delta[]) RETURNS void AS $$
+BEGIN
+    INSERT INTO app_bookmonthlystats (book_id, month, loans, returns)
+    SELECT t.book_id, t.month, t.loans, t.returns
+    FROM (
+        SELECT book_id, date_trunc('month', day)::date AS month, SUM(loans) AS loans, SUM(returns) AS returns
+        FROM unnest(p_deltas) GROUP BY 1, 2
+    ) t
+    WHERE (t.loans <> 0 OR t.returns <> 0)
+      AND (t.loans > 0 OR t.returns > 0
+           OR EXISTS (SELECT FROM app_bookmonthlystats s WHERE s.book_id = t.book_id AND s.month = t.month))
+    ORDER BY t.book_id, t.month
+    ON CONFLICT (book_id, month) DO UPDATE
+    SET loans = app_bookmonthlystats.loans + EXCLUDED.loans, returns = app_bookmonthlystats.returns + EXCLUDED.returns;
+
+    INSERT INTO app_genredailystats (genre, day, loans, returns)
+    SELECT t.genre, t.day, t.loans, t.returns
+    FROM (
+        SELECT b.genre, d.day, SUM(d.loans) AS loans, SUM(d.returns) AS returns
+        FROM unnest(p_deltas) d JOIN app_book b ON b.book_id = d.book_id GROUP BY 1, 2
+    ) t
+    WHERE (t.loans <> 0 OR t.returns <> 0)
+      AND (t.loans > 0 OR t.returns > 0
+           OR EXISTS (SELECT FROM app_genredailystats s WHERE s.genre = t.genre AND s.day = t.day))
+    ORDER BY t.genre, t.day
+    ON CONFLICT (genre, day) DO UPDATE
+    SET loans = app_genredailystats.loans + EXCLUDED.loans, returns = app_genredailystats.returns + EXCLUDED.returns;
+
+    INSERT INTO app_usermonthlystats (user_id, month, loans, returns)
+    SELECT t.user_id, t.month, t.loans, t.returns
+    FROM (
+        SELECT user_id, date_trunc('month', day)::date AS month, SUM(loans) AS loans, SUM(returns) AS returns
+        FROM unnest(p_deltas) GROUP BY 1, 2
+    ) t
+    WHERE (t.loans <> 0 OR t.returns <> 0)
+      AND (t.loans > 0 OR t.returns > 0
+           OR EXISTS (SELECT FROM app_usermonthlystats s WHERE s.user_id = t.user_id AND s.month = t.month))
+    ORDER BY t.user_id, t.month
+    ON CONFLICT (user_id, month) DO UPDATE
+    SET loans = app_usermonthlystats.loans + EXCLUDED.loans, returns = app_usermonthlystats.returns + EXCLUDED.returns;
+END
+$$ LANGUAGE plpgsql;
+
+-- A loan adds 1 to `loans` on its borrow date and 1 to `returns` on its
+-- return date, the rows of old_loans are subtracted
+CREATE FUNCTION app_borrowedbooks_update_stats() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM app_loan_stats_apply(ARRAY(
+            SELECT (l.user_id, l.book_id, e.day, e.loans, e.returns)::app_loan_stats_delta
+            FROM new_loans l
+            CROSS JOIN LATERAL (VALUES (l.borrow_date, 1, 0), (l.return_date, 0, 1)) e(day, loans, returns)
+            WHERE e.day IS NOT NULL
+        ));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM app_loan_stats_apply(ARRAY(
+            SELECT (l.user_id, l.book_id, e.day, -e.loans, -e.returns)::app_loan_stats_delta
+            FROM old_loans l
+            CROSS JOIN LATERAL (VALUES (l.borrow_date, 1, 0), (l.return_date, 0, 1)) e(day, loans, returns)
+            WHERE e.day IS NOT NULL
+        ));
+    ELSIF EXISTS (
+        SELECT FROM old_loans o JOIN new_loans n ON n.id = o.id
+        WHERE (o.user_id, o.book_id, o.borrow_date, o.return_date) IS DISTINCT FROM (n.user_id, n.book_id, n.borrow_date, n.return_date)
+    ) THEN
+        -- A return only moves `returns`: the borrow date deltas of old and new rows cancel out
+        PERFORM app_loan_stats_apply(ARRAY(
+            SELECT (l.user_id, l.book_id, e.day, l.sign * e.loans, l.sign * e.returns)::app_loan_stats_delta
+            FROM (
+                SELECT user_id, book_id, borrow_date, return_date, 1 AS sign FROM new_loans
+                UNION ALL
+                SELECT user_id, book_id, borrow_date, return_date, -1 FROM old_loans
+            ) l
+            CROSS JOIN LATERAL (VALUES (l.borrow_date, 1, 0), (l.return_date, 0, 1)) e(day, loans, returns)
+            WHERE e.day IS NOT NULL
+        ));
+    END IF;
+
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER app_borrowedbooks_insert_stats_trigger
+    AFTER INSERT ON app_borrowedbooks REFERENCING NEW TABLE AS new_loans
+    FOR EACH STATEMENT EXECUTE FUNCTION app_borrowedbooks_update_stats();
+
+CREATE TRIGGER app_borrowedbooks_update_stats_trigger
+    AFTER UPDATE ON app_borrowedbooks REFERENCING OLD TABLE AS old_loans NEW TABLE AS new_loans
+    FOR EACH STATEMENT EXECUTE FUNCTION app_borrowedbooks_update_stats();
+
+CREATE TRIGGER app_borrowedbooks_delete_stats_trigger
+    AFTER DELETE ON app_borrowedbooks REFERENCING OLD TABLE AS old_loans
+    FOR EACH STATEMENT EXECUTE FUNCTION app_borrowedbooks_update_stats();
+"""
+
+REVERSE_LOAN_STATS_STATEMENT_TRIGGER_SQL = """
+DROP TRIGGER app_borrowedbooks_insert_stats_trigger ON app_borrowedbooks;
+DROP TRIGGER app_borrowedbooks_update_stats_trigger ON app_borrowedbooks;
+DROP TRIGGER app_borrowedbooks_delete_stats_trigger ON app_borrowedbooks;
+DROP FUNCTION app_borrowedbooks_update_stats();
+DROP FUNCTION app_loan_stats_apply(app_loan_stats_delta[]);
+DROP TYPE app_loan_stats_delta;
+""" + loan_stats.LOAN_STATS_TRIGGER_SQL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_holds'),
+    ]
+
+    operations = [
+        migrations.RunSQL(LOAN_STATS_STATEMENT_TRIGGER_SQL, REVERSE_LOAN_STATS_STATEMENT_TRIGGER_SQL),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-19 09:20
+
+from django.db import migrations
+
+
+# Version of the book list for workers that don't share a cache (see
+# cache_services.get_book_list_version): every statement writing books,
+# including the availability and updated_at bumps of the loan and book
+# details triggers, takes a new value. A sequence rather than a counter row,
+# so concurrent writes never wait for each other on it.
+BOOK_LIST_VERSION_SQL = """
+CREATE SEQUENCE app_book_list_version;
+
+CREATE FUNCTION app_book_bump_list_version() RETURNS trigger AS $$
+BEGIN
+    PERFORM nextval('app_book_list_version');
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER app_book_list_version_trigger
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON app_book
+    FOR EACH STATEMENT EXECUTE FUNCTION app_book_bump_list_version();
+"""
+
+REVERSE_BOOK_LIST_VERSION_SQL = """
+DROP TRIGGER app_book_list_version_trigger ON app_book;
+DROP FUNCTION app_book_bump_list_version();
+DROP SEQUENCE app_book_list_version;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_loan_stats_statement_trigger'),
+    ]
+
+    operations = [
+        migrations.RunSQL(BOOK_LIST_VERSION_SQL, REVERSE_BOOK_LIST_VERSION_SQL),
+    ]
@@ -1,2 +1,4 @@
 from app.models.user import User
-from app.models.book import Book, BookDetails, BorrowedBooks
\ No newline at end of file
+from app.models.book import Book, BookDetails, BorrowedBooks, Hold, LoanReminder
+from app.models.stats import BookMonthlyStats, GenreDailyStats, UserMonthlyStats
+from app.models.task import Task
\ No newline at end of file
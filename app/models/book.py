@@ -1,6 +1,10 @@
+from datetime import timedelta
+
 from django.db import models
 from django.conf import settings
 from django.db.models.query import QuerySet
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 
 class Book(models.Model):
     book_id = models.BigAutoField(primary_key=True)
@@ -10,12 +14,44 @@ class Book(models.Model):
     genre = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Weighted title + publisher document, maintained by database triggers (see migrations 0006 and 0007)
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Open loan of the book (NULL when available), maintained by a database trigger (see migration 0009)
+    current_loan = models.OneToOneField('BorrowedBooks', null=True, blank=True, editable=False,
+                                        on_delete=models.SET_NULL, related_name='+')
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Backs keyset pagination on (created_at, book_id)
+            models.Index(fields=['created_at', 'book_id'], name='book_created_at_id_idx'),
+            GinIndex(fields=['search_vector'], name='book_search_vector_idx'),
+            models.Index(fields=['genre'], name='book_genre_idx'),
+            models.Index(fields=['published_date'], name='book_published_date_idx'),
+            # Backs keyset pagination of /books/list/?available=true
+            models.Index(fields=['created_at', 'book_id'], condition=models.Q(current_loan__isnull=True),
+                         name='book_available_created_at_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        # The trigger maintained fields are never written by the ORM: the values loaded with the book
+        # may be stale by now (e.g. a loan made since), an update would silently put them back
+        if not self._state.adding and not force_insert:
+            if update_fields is None:
+                deferred = self.get_deferred_fields()
+                update_fields = [field.name for field in self._meta.concrete_fields
+                                 if not field.primary_key and field.attname not in deferred]
+            update_fields = [name for name in update_fields
+                             if name not in ('search_vector', 'current_loan', 'current_loan_id')]
+
+        super().save(force_insert=force_insert, force_update=force_update, using=using, update_fields=update_fields)
+
+    @property
+    def is_available(self):
+        return self.current_loan_id is None
     
 
 class BookDetails(models.Model):
@@ -27,6 +63,9 @@ class BookDetails(models.Model):
 
     class Meta:
         verbose_name_plural = "bookdetails"
+        indexes = [
+            models.Index(fields=['language'], name='bookdetails_language_idx'),
+        ]
 
     def __str__(self):
         return f"Details: {self.book.title}"
@@ -37,16 +76,91 @@ class CurrentlyBorrowedBooks(models.Manager):
         return super().get_queryset().filter(return_date__isnull=True)
 
 class BorrowedBooks(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    book = models.ForeignKey(Book, on_delete=models.CASCADE)
+    # Indexed by the (user, borrow_date, id) and (book, borrow_date, id) indexes below
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, db_index=False)
     borrow_date = models.DateField()
+    # borrow_date + LOAN_PERIOD_DAYS unless given
+    due_date = models.DateField(blank=True)
     return_date = models.DateField(null=True, blank=True)
+    # Set once the loan is found overdue and a reminder queued (see sweep_overdue_loans)
+    overdue = models.BooleanField(default=False)
 
     objects = models.Manager()  # Default manager
     currently_borrowed = CurrentlyBorrowedBooks()   # Custom manager for displaying currently borrowed books
 
     class Meta:
         verbose_name_plural = "borrowedbooks"
+        constraints = [
+            # A book can only be on one active loan at a time
+            models.UniqueConstraint(fields=['book'], condition=models.Q(return_date__isnull=True),
+                                    name='unique_active_loan_per_book'),
+        ]
+        indexes = [
+            # Back the keyset-paginated loan histories of a user and of a book
+            models.Index(fields=['user', 'borrow_date', 'id'], name='loan_user_borrow_date_idx'),
+            models.Index(fields=['book', 'borrow_date', 'id'], name='loan_book_borrow_date_idx'),
+            # Open loans not flagged overdue yet, by due date: the overdue sweep scans a range of it
+            models.Index(fields=['due_date', 'id'], condition=models.Q(return_date__isnull=True, overdue=False),
+                         name='loan_open_due_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.book.title}"
+
+    def save(self, *args, **kwargs):
+        if self.due_date is None:
+            self.due_date = self.borrow_date + timedelta(days=settings.LOAN_PERIOD_DAYS)
+        super().save(*args, **kwargs)
+
+
+class Hold(models.Model):
+    """
+    A user waiting for a book that is on loan. When the book is returned it
+    is lent to the user of the oldest waiting hold, which is then fulfilled.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='holds', on_delete=models.CASCADE)
+    book = models.ForeignKey(Book, related_name='holds', on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    fulfilled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'book'], condition=models.Q(fulfilled_at__isnull=True),
+                                    name='unique_waiting_hold'),
+        ]
+        indexes = [
+            # The queue of each book in order: its head, and the position of a hold (an index-only count)
+            models.Index(fields=['book', 'id'], condition=models.Q(fulfilled_at__isnull=True),
+                         name='hold_waiting_book_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} waiting for {self.book.title}"
+
+
+class LoanReminder(models.Model):
+    """
+    Reminder to send to the borrower of a loan, queued by the overdue sweep.
+    Unsent reminders have no `sent_at`.
+    """
+    OVERDUE = 'overdue'
+    KIND_CHOICES = [(OVERDUE, 'Overdue')]
+
+    loan = models.ForeignKey(BorrowedBooks, related_name='reminders', on_delete=models.CASCADE, db_index=False)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # One reminder of each kind per loan, even if two sweeps race
+            models.UniqueConstraint(fields=['loan', 'kind'], name='unique_loan_reminder_kind'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], condition=models.Q(sent_at__isnull=True),
+                         name='loanreminder_unsent_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.user.email} - {self.book.title}"
\ No newline at end of file
+        return f"{self.kind} reminder: {self.loan}"
\ No newline at end of file
@@ -0,0 +1,59 @@
+from django.db import models
+from django.conf import settings
+from app.models.book import Book
+
+
+# Circulation rollups, maintained by a database trigger on BorrowedBooks (see
+# migrations 0011 and 0015). A loan counts in `loans` on its borrow date and in
+# `returns` on its return date. Book and user rollups are per calendar month
+# (`month` is its first day): daily, they would hold about one row per loan
+# and be no smaller than the ledger itself.
+
+class BookMonthlyStats(models.Model):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, db_index=False)
+    month = models.DateField()
+    loans = models.IntegerField(default=0)
+    returns = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "bookmonthlystats"
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'month'], name='unique_book_month_stats'),
+        ]
+        indexes = [
+            # Covers the most borrowed books report with an index-only scan
+            models.Index(fields=['month', 'book'], include=['loans'], name='bookmonthlystats_month_idx'),
+        ]
+
+
+class GenreDailyStats(models.Model):
+    genre = models.CharField(max_length=100)
+    day = models.DateField()
+    loans = models.IntegerField(default=0)
+    returns = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "genredailystats"
+        constraints = [
+            models.UniqueConstraint(fields=['genre', 'day'], name='unique_genre_day_stats'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'genre'], name='genredailystats_day_idx'),
+        ]
+
+
+class UserMonthlyStats(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
+    month = models.DateField()
+    loans = models.IntegerField(default=0)
+    returns = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "usermonthlystats"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month'], name='unique_user_month_stats'),
+        ]
+        indexes = [
+            # Covers the active borrowers report with an index-only scan
+            models.Index(fields=['month', 'user'], include=['loans'], name='usermonthlystats_month_idx'),
+        ]
@@ -0,0 +1,40 @@
+from django.db import models
+from django.utils import timezone
+
+
+# Background tasks, queued in the database by app.services.task_services and
+# run by the `run_tasks` worker command. Queueing is part of the caller's
+# transaction: a task enqueued in a transaction that rolls back never runs.
+
+class Task(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=200)
+    kwargs = models.JSONField(default=dict)
+    # Enqueueing again with the same key is a no-op, as long as the first task is kept
+    idempotency_key = models.CharField(max_length=200, null=True, blank=True, unique=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField()
+    # Not run before this time, pushed back after every failed attempt
+    run_at = models.DateTimeField(default=timezone.now)
+    # When a worker claimed it, running tasks claimed longer than TASK_TIMEOUT ago are requeued
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim the queued tasks due first
+            models.Index(fields=['run_at', 'id'], condition=models.Q(status='queued'), name='task_queued_run_at_idx'),
+            models.Index(fields=['started_at'], condition=models.Q(status='running'), name='task_running_started_at_idx'),
+            models.Index(fields=['finished_at'], condition=models.Q(status='done'), name='task_done_finished_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
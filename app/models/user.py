@@ -36,6 +36,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     membership_date = models.DateField()
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Embedded in issued JWTs, bumping it revokes all of the user's tokens
+    token_version = models.PositiveIntegerField(default=0)
 
     objects = UserAccountManager()
 
@@ -1,24 +1,381 @@
-from app.models.book import Book, BookDetails
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Count, OuterRef, Subquery
+from app.models.book import Book, BookDetails, BorrowedBooks, Hold, LoanReminder
+from app.services.cache_services import invalidate_books_on_commit
+from app.services.task_services import enqueue
+from app.tasks import send_hold_ready_email, send_loan_reminders
+User = get_user_model()
+
+
+class BookNotFound(Exception):
+    pass
+
+class BookAlreadyBorrowed(Exception):
+    pass
+
+class UserNotFound(Exception):
+    pass
+
+class HoldNotAllowed(Exception):
+    pass
+
+class HoldNotFound(Exception):
+    pass
+
+
+def _changed_fields(instance, values):
+    # Assign the new values and return the names of the fields that changed
+    changed = []
+    for field, value in values.items():
+        if getattr(instance, field) != value:
+            setattr(instance, field, value)
+            changed.append(field)
+    return changed
+
 
 def update_book_details(book, **kwargs):
-    # Update Book
-    book.title = kwargs['title']
-    book.isbn = kwargs['isbn']
-    book.published_date = kwargs['published_date']
-    book.genre = kwargs['genre']
-    book.save()
-
-    # If there is no Book details, then create it
-    # If there is then update it
-    book_details = BookDetails.objects.filter(book=book).first()
-    if not book_details:
-        BookDetails.objects.create(book=book, number_of_pages=kwargs['book_details']['number_of_pages'],
-                                    publisher = kwargs['book_details']['publisher'],
-                                    language = kwargs['book_details']['language'])
-    else:
-        book_details.number_of_pages = kwargs['book_details']['number_of_pages']
-        book_details.publisher = kwargs['book_details']['publisher']
-        book_details.language = kwargs['book_details']['language']
-        book_details.save()
-    
-    return book
\ No newline at end of file
+    """
+    Update the given fields of a book and create or update its details, in
+    one transaction and at most two queries.
+
+    Only the fields passed in (all of them for PUT, some for PATCH) are
+    compared and only changed columns are written, nothing at all if nothing
+    changed. Details changes bump the book's `updated_at` through the
+    app_bookdetails trigger. Load the book with `select_related('book_details')`
+    to spare the query looking up its details.
+    """
+    details = kwargs.pop('book_details', None)
+
+    with transaction.atomic():
+        changed = _changed_fields(book, kwargs)
+        if changed:
+            book.save(update_fields=[*changed, 'updated_at'])
+
+        if details is not None:
+            try:
+                current_details = book.book_details
+            except BookDetails.DoesNotExist:
+                current_details = None
+
+            if current_details is None:
+                # Upsert in case a concurrent request created them, bulk_create does not send post_save
+                book.book_details = BookDetails(book=book, **details)
+                BookDetails.objects.bulk_create([book.book_details], update_conflicts=True,
+                                                unique_fields=['book'], update_fields=list(details))
+                invalidate_books_on_commit([book.pk])
+            else:
+                changed_details = _changed_fields(current_details, details)
+                if changed_details:
+                    current_details.save(update_fields=changed_details)
+
+    return book
+
+
+def _insert_loans(user_id, book_ids, borrow_date):
+    """
+    Create loans of the given books for the user in one INSERT ... SELECT
+    and return the ids of the books that were actually lent.
+
+    The partial unique index on BorrowedBooks(book) WHERE return_date IS NULL
+    makes the insert a no-op for books already on loan, so two concurrent
+    borrows of the same book can never both succeed. Book.current_loan is
+    set by the app_borrowedbooks trigger in the same statement.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {BorrowedBooks._meta.db_table} (user_id, book_id, borrow_date, due_date, overdue)
+            SELECT u.user_id, b.book_id, %s, %s, false
+            FROM {User._meta.db_table} u, {Book._meta.db_table} b
+            WHERE u.user_id = %s AND b.book_id = ANY(%s)
+            ON CONFLICT (book_id) WHERE return_date IS NULL DO NOTHING
+            RETURNING book_id
+            """,
+            [borrow_date, borrow_date + timedelta(days=settings.LOAN_PERIOD_DAYS), user_id, list(book_ids)],
+        )
+        borrowed = {row[0] for row in cursor.fetchall()}
+
+    # Rejected borrows change nothing, retries of a popular book must not empty the list cache
+    if borrowed:
+        invalidate_books_on_commit(borrowed)
+    return borrowed
+
+
+def borrow_book(user_id, book_id, borrow_date):
+    """
+    Create a loan of the book for the user in a single query.
+    """
+    if not _insert_loans(user_id, [book_id], borrow_date):
+        # Nothing was inserted, find out why (only on the failure path)
+        if BorrowedBooks.currently_borrowed.filter(book_id=book_id).exists():
+            raise BookAlreadyBorrowed
+        raise BookNotFound
+
+
+def return_book(book_id, return_date):
+    """
+    Close the active loan of the book, and lend it to the head of its hold
+    queue if anyone is waiting, in one transaction.
+    """
+    with transaction.atomic():
+        # At most one loan per book can be open, so this closes exactly one row or none
+        returned = BorrowedBooks.currently_borrowed.filter(book_id=book_id).update(return_date=return_date)
+
+        if not returned:
+            raise BookNotFound
+
+        _hand_over([book_id], return_date)
+
+    invalidate_books_on_commit([book_id])
+
+
+def borrow_books(user_id, book_ids, borrow_date):
+    """
+    Lend several books to the user at once.
+
+    All loans are created by one INSERT, a second query only runs when some
+    books could not be lent. Returns a {book_id: status} dict in the order
+    of `book_ids`, status being 'borrowed', 'already_borrowed' or 'not_found'.
+    """
+    book_ids = list(dict.fromkeys(book_ids))
+    borrowed = _insert_loans(user_id, book_ids, borrow_date)
+
+    rest = [book_id for book_id in book_ids if book_id not in borrowed]
+    existing = set()
+    if rest:
+        if not borrowed and not User.objects.filter(user_id=user_id).exists():
+            raise UserNotFound
+        existing = set(Book.objects.filter(book_id__in=rest).values_list('book_id', flat=True))
+
+    return {
+        book_id: 'borrowed' if book_id in borrowed else 'already_borrowed' if book_id in existing else 'not_found'
+        for book_id in book_ids
+    }
+
+
+def return_books(book_ids, return_date):
+    """
+    Close the active loans of several books in one transaction.
+
+    Returns a {book_id: status} dict in the order of `book_ids`, status being
+    'returned', or 'not_found' when the book does not exist or is not on loan.
+    """
+    book_ids = list(dict.fromkeys(book_ids))
+
+    with transaction.atomic():
+        # Lock the open loans so a concurrent return cannot report the same books as returned
+        loans = dict(
+            BorrowedBooks.currently_borrowed.select_for_update()
+            .filter(book_id__in=book_ids)
+            .values_list('book_id', 'id')
+        )
+        if loans:
+            BorrowedBooks.objects.filter(id__in=loans.values()).update(return_date=return_date)
+            _hand_over(list(loans), return_date)
+            invalidate_books_on_commit(list(loans))
+
+    return {book_id: 'returned' if book_id in loans else 'not_found' for book_id in book_ids}
+
+
+def _hand_over(book_ids, handover_date):
+    """
+    Lend each of the just returned books to the user of its oldest waiting
+    hold and fulfil that hold, in one statement, then queue the emails
+    telling them. Returns the ids of the books handed over.
+
+    Must run in the transaction closing the loans: their rows stay locked
+    until it commits, and placing or cancelling a hold locks the book's open
+    loan first, so the queue cannot change between the return and the
+    handover.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH head AS (
+                SELECT DISTINCT ON (book_id) id, user_id, book_id FROM {Hold._meta.db_table}
+                WHERE book_id = ANY(%s) AND fulfilled_at IS NULL
+                ORDER BY book_id, id
+            ), fulfilled AS (
+                UPDATE {Hold._meta.db_table} h SET fulfilled_at = now()
+                FROM head WHERE h.id = head.id
+                RETURNING h.id, h.user_id, h.book_id
+            ), lent AS (
+                INSERT INTO {BorrowedBooks._meta.db_table} (user_id, book_id, borrow_date, due_date, overdue)
+                SELECT user_id, book_id, %s, %s, false FROM fulfilled
+                RETURNING book_id
+            )
+            SELECT fulfilled.id, fulfilled.book_id FROM fulfilled JOIN lent USING (book_id)
+            """,
+            [list(book_ids), handover_date, handover_date + timedelta(days=settings.LOAN_PERIOD_DAYS)],
+        )
+        handed = cursor.fetchall()
+
+    for hold_id, _ in handed:
+        enqueue(send_hold_ready_email, hold_id=hold_id)
+    return [book_id for _, book_id in handed]
+
+
+def place_hold(user_id, book_id):
+    """
+    Queue the user for a book on loan. Returns the position of the new hold
+    in the book's queue, 1 being next in line.
+
+    The hold is inserted by one INSERT ... SELECT locking the open loan of
+    the book, so holds on a book are placed one after the other and a
+    return in progress is waited for, then refuses the hold as the book was
+    handed over or is available again. Holding a book the user is
+    borrowing, or already waits for, is refused too.
+    """
+    for _ in range(2):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {Hold._meta.db_table} (user_id, book_id, created_at)
+                SELECT u.user_id, l.book_id, now()
+                FROM {User._meta.db_table} u, {BorrowedBooks._meta.db_table} l
+                WHERE u.user_id = %s AND l.book_id = %s AND l.return_date IS NULL AND l.user_id <> u.user_id
+                FOR NO KEY UPDATE OF l
+                ON CONFLICT (user_id, book_id) WHERE fulfilled_at IS NULL DO NOTHING
+                RETURNING id
+                """,
+                [user_id, book_id],
+            )
+            row = cursor.fetchone()
+        if row is not None:
+            # A later statement, which sees the holds placed before this one, counted from the index
+            return Hold.objects.filter(book_id=book_id, fulfilled_at__isnull=True, id__lte=row[0]).count()
+
+        # Nothing was inserted, find out why (only on the failure path)
+        borrower = BorrowedBooks.currently_borrowed.filter(book_id=book_id).values_list('user_id', flat=True).first()
+        if not User.objects.filter(user_id=user_id).exists():
+            raise UserNotFound
+        if borrower is None:
+            if not Book.objects.filter(book_id=book_id).exists():
+                raise BookNotFound
+            raise HoldNotAllowed('Book is available, borrow it instead.')
+        if borrower == user_id:
+            raise HoldNotAllowed('User is already borrowing this book.')
+        if Hold.objects.filter(user_id=user_id, book_id=book_id, fulfilled_at__isnull=True).exists():
+            raise HoldNotAllowed('User is already waiting for this book.')
+        # The book was just handed over to the next user in line, try again on the new loan
+
+    raise HoldNotAllowed('Book is being handed over, try again.')
+
+
+def cancel_hold(user_id, book_id):
+    """
+    Cancel the user's waiting hold on the book. Raises HoldNotFound if
+    there is none, e.g. because the book was just lent to the user.
+    """
+    with transaction.atomic():
+        # Wait for a return of the book in progress, which may be handing it over to this very hold
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id FROM {BorrowedBooks._meta.db_table} WHERE book_id = %s AND return_date IS NULL "
+                f"FOR NO KEY UPDATE",
+                [book_id],
+            )
+        deleted, _ = Hold.objects.filter(user_id=user_id, book_id=book_id, fulfilled_at__isnull=True).delete()
+
+    if not deleted:
+        raise HoldNotFound
+
+
+def waiting_holds(user_id):
+    """
+    The user's waiting holds, oldest first, with their `position` in the
+    queue of their book, each counted from hold_waiting_book_id_idx.
+    """
+    ahead = (
+        Hold.objects.filter(book=OuterRef('book'), fulfilled_at__isnull=True, id__lte=OuterRef('id'))
+        .order_by().values('book').annotate(count=Count('id')).values('count')
+    )
+    return (
+        Hold.objects.filter(user_id=user_id, fulfilled_at__isnull=True)
+        .select_related('book').annotate(position=Subquery(ahead)).order_by('id')
+    )
+
+
+def reconcile_availability():
+    """
+    Rebuild Book.current_loan from the open loans in one statement, fixing
+    books whose pointer drifted (e.g. loans written while the trigger was
+    disabled). Returns the ids of the books that were fixed.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {Book._meta.db_table} b SET current_loan_id = l.id, updated_at = now()
+            FROM {Book._meta.db_table} b2
+            LEFT JOIN {BorrowedBooks._meta.db_table} l ON l.book_id = b2.book_id AND l.return_date IS NULL
+            WHERE b2.book_id = b.book_id AND b.current_loan_id IS DISTINCT FROM l.id
+            RETURNING b.book_id
+            """
+        )
+        fixed = [row[0] for row in cursor.fetchall()]
+
+    if fixed:
+        invalidate_books_on_commit(fixed)
+    return fixed
+
+
+def _flag_overdue_batch(today, batch_size):
+    """
+    Flag up to `batch_size` open loans due before `today` as overdue and
+    queue a reminder for each, in one statement. Returns how many were flagged.
+
+    The loans are read from the loan_open_due_date_idx range (open, not yet
+    flagged, by due date), which they leave once flagged, so every batch
+    starts at the front of the index with nothing to skip. Rows locked by
+    a concurrent sweep are skipped rather than waited for.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH due AS (
+                SELECT id FROM {BorrowedBooks._meta.db_table}
+                WHERE return_date IS NULL AND NOT overdue AND due_date < %s
+                ORDER BY due_date, id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            ), flagged AS (
+                UPDATE {BorrowedBooks._meta.db_table} l SET overdue = true
+                FROM due WHERE l.id = due.id
+                RETURNING l.id
+            ), queued AS (
+                INSERT INTO {LoanReminder._meta.db_table} (loan_id, kind, created_at)
+                SELECT id, %s, now() FROM flagged
+                ON CONFLICT (loan_id, kind) DO NOTHING
+            )
+            SELECT count(*) FROM flagged
+            """,
+            [today, batch_size, LoanReminder.OVERDUE],
+        )
+        return cursor.fetchone()[0]
+
+
+def sweep_overdue_loans(today, batch_size=None):
+    """
+    Flag every open loan due before `today` as overdue and queue its
+    reminder, `batch_size` loans (OVERDUE_SWEEP_BATCH_SIZE) per statement
+    and transaction, so memory and lock time stay bounded however many
+    loans are open. The reminders are then emailed by a background task.
+    Returns the number of loans flagged.
+    """
+    batch_size = batch_size or settings.OVERDUE_SWEEP_BATCH_SIZE
+    total = 0
+
+    while True:
+        with transaction.atomic():
+            flagged = _flag_overdue_batch(today, batch_size)
+        total += flagged
+        if flagged < batch_size:
+            break
+
+    if total:
+        enqueue(send_loan_reminders)
+    return total
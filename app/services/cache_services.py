@@ -0,0 +1,140 @@
+import hashlib
+import threading
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, transaction
+
+BOOK_DETAIL = 'book_detail'
+BOOK_LIST = 'book_list'
+
+BOOK_LIST_VERSION_KEY = 'book_list:version'
+# Bumped by a trigger on every book write, see migration 0016
+BOOK_LIST_VERSION_SEQUENCE = 'app_book_list_version'
+
+
+class CacheStats:
+    """
+    Per-process hit/miss counters, per cached resource.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def record(self, name, hit):
+        with self._lock:
+            counter = self._counters.setdefault(name, {'hits': 0, 'misses': 0})
+            counter['hits' if hit else 'misses'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = {name: dict(counter) for name, counter in self._counters.items()}
+
+        for counter in stats.values():
+            total = counter['hits'] + counter['misses']
+            counter['hit_rate'] = counter['hits'] / total if total else None
+
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+stats = CacheStats()
+
+
+def _get(name, key):
+    data = cache.get(key)
+    stats.record(name, hit=data is not None)
+    return data
+
+
+def _book_detail_key(book_id):
+    return f'{BOOK_DETAIL}:{book_id}'
+
+
+def cache_is_shared():
+    # A LocMem (or dummy) cache lives in a single process, it never sees the writes of the other workers
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def get_book_list_version():
+    """
+    Version of the book list, changed by every book create, update or
+    delete, also usable as (part of) its ETag.
+
+    Kept in the cache, so it costs no query, when the cache is shared by
+    every worker. Otherwise it is read from a database sequence, which every
+    worker sees bumped.
+    """
+    if cache_is_shared():
+        return cache.get_or_set(BOOK_LIST_VERSION_KEY, time.time_ns, timeout=None)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT last_value FROM {BOOK_LIST_VERSION_SEQUENCE}')
+        return cursor.fetchone()[0]
+
+
+def _book_list_key(url, version):
+    # Every book change changes the version, which orphans all cached list pages at once
+    digest = hashlib.md5(url.encode('utf-8')).hexdigest()
+    return f'{BOOK_LIST}:{version}:{digest}'
+
+
+def get_book_detail(book_id, updated_at):
+    # Entries of an older (or newer) version of the book than the caller's are not used
+    entry = _get(BOOK_DETAIL, _book_detail_key(book_id))
+    if entry is None or entry[0] != updated_at:
+        return None
+    return entry[1]
+
+
+def set_book_detail(book_id, updated_at, data):
+    cache.set(_book_detail_key(book_id), (updated_at, data))
+
+
+def get_book_list(url, version):
+    """
+    Cached page of the book list at `url`, for `version` of the list (see
+    `get_book_list_version`).
+    """
+    return _get(BOOK_LIST, _book_list_key(url, version))
+
+
+def set_book_list(url, version, data):
+    cache.set(_book_list_key(url, version), data)
+
+
+def _invalidate_cache(book_ids):
+    cache.delete_many([_book_detail_key(book_id) for book_id in book_ids])
+
+    if cache_is_shared():
+        try:
+            cache.incr(BOOK_LIST_VERSION_KEY)
+        except ValueError:
+            # the version key was evicted, any new value orphans the old pages
+            cache.set(BOOK_LIST_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_books(book_ids):
+    """
+    Drop the cached details of `book_ids` and change the book list version.
+    Call it once the write is committed.
+    """
+    _invalidate_cache(book_ids)
+
+    if not cache_is_shared():
+        # The trigger already bumped the sequence, but before the commit: a read in between
+        # may have cached the old pages under the new version
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT nextval('{BOOK_LIST_VERSION_SEQUENCE}')")
+
+
+def invalidate_books_on_commit(book_ids):
+    # Invalidate right away, and again once the transaction commits so a read
+    # racing the write cannot put the old data back in the cache.
+    _invalidate_cache(book_ids)
+    transaction.on_commit(lambda: invalidate_books(book_ids))
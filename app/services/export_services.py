@@ -0,0 +1,91 @@
+import csv
+import io
+import json
+
+from django.contrib.auth import get_user_model
+
+from app.models.book import Book, BorrowedBooks
+
+User = get_user_model()
+
+# Rows fetched per round trip of the server-side cursor, and written per output chunk
+CHUNK_SIZE = 2000
+
+# name -> (queryset factory, [(column, ORM path)]). Book exports have the
+# columns of the import format, so an export can be imported back as is.
+EXPORTS = {
+    'books': (lambda: Book.objects.order_by('book_id'), [
+        ('book_id', 'book_id'),
+        ('title', 'title'),
+        ('isbn', 'isbn'),
+        ('published_date', 'published_date'),
+        ('genre', 'genre'),
+        ('number_of_pages', 'book_details__number_of_pages'),
+        ('publisher', 'book_details__publisher'),
+        ('language', 'book_details__language'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    ]),
+    'users': (lambda: User.objects.filter(is_superuser=False).order_by('user_id'), [
+        ('user_id', 'user_id'),
+        ('name', 'name'),
+        ('email', 'email'),
+        ('membership_date', 'membership_date'),
+        ('is_active', 'is_active'),
+    ]),
+    'loans': (lambda: BorrowedBooks.objects.order_by('id'), [
+        ('id', 'id'),
+        ('user_id', 'user_id'),
+        ('book_id', 'book_id'),
+        ('borrow_date', 'borrow_date'),
+        ('return_date', 'return_date'),
+    ]),
+}
+
+
+def _convert(value):
+    # Dates and datetimes keep their full precision
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _csv_chunks(columns, rows, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+
+    for i, row in enumerate(rows, start=1):
+        writer.writerow([_convert(value) for value in row])
+        if i % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def _jsonl_chunks(columns, rows, chunk_size):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({column: _convert(value) for column, value in zip(columns, row)}) + '\n')
+        if len(lines) == chunk_size:
+            yield ''.join(lines)
+            lines = []
+
+    yield ''.join(lines)
+
+
+def export_rows(name, file_format, chunk_size=CHUNK_SIZE):
+    """
+    Yield the `name` table as text chunks of `chunk_size` CSV or JSON Lines rows.
+
+    Rows are read through a server-side cursor (`.iterator()`) as tuples,
+    so memory stays flat regardless of the table size.
+    """
+    get_queryset, fields = EXPORTS[name]
+    columns = [column for column, _ in fields]
+    rows = get_queryset().values_list(*[path for _, path in fields]).iterator(chunk_size=chunk_size)
+
+    if file_format == 'csv':
+        return _csv_chunks(columns, rows, chunk_size)
+    return _jsonl_chunks(columns, rows, chunk_size)
+
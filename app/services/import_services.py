@@ -0,0 +1,175 @@
+import csv
+import json
+
+from django.db import DatabaseError, transaction
+from rest_framework import serializers
+
+from app.models.book import Book, BookDetails
+from app.services.cache_services import invalidate_books
+
+BOOK_FIELDS = ('title', 'isbn', 'published_date', 'genre')
+DETAIL_FIELDS = ('number_of_pages', 'publisher', 'language')
+FILE_FORMATS = ('csv', 'jsonl')
+
+
+class BookImportSerializer(serializers.Serializer):
+    """
+    Validates one flat Book + BookDetails row of an import file.
+
+    Plain Serializer on purpose: a ModelSerializer would add a unique
+    validator on `isbn` (one query per row) and reject existing books,
+    while the import upserts them.
+    """
+    title = serializers.CharField(max_length=200)
+    isbn = serializers.CharField(max_length=20)
+    published_date = serializers.DateField()
+    genre = serializers.CharField(max_length=100)
+    # PositiveIntegerField range, larger values would fail the whole batch's INSERT
+    number_of_pages = serializers.IntegerField(min_value=0, max_value=2147483647, required=False, allow_null=True)
+    publisher = serializers.CharField(max_length=100, required=False, allow_null=True)
+    language = serializers.CharField(max_length=100, required=False, allow_null=True)
+
+    def validate(self, attrs):
+        # Book details are optional, but if any of them is given all of them are required
+        given = [field for field in DETAIL_FIELDS if attrs.get(field) is not None]
+        if given and len(given) != len(DETAIL_FIELDS):
+            raise serializers.ValidationError({
+                field: 'This field is required when book details are given.'
+                for field in DETAIL_FIELDS if field not in given
+            })
+
+        return attrs
+
+
+def get_file_format(filename):
+    extension = filename.rsplit('.', 1)[-1].lower()
+    if extension == 'csv':
+        return 'csv'
+    if extension in ('jsonl', 'ndjson', 'json'):
+        return 'jsonl'
+    return None
+
+
+class UnreadableFile(Exception):
+    """
+    Raised by `read_rows` when the file can't be read any further, e.g. it
+    is not UTF-8 or not valid CSV, from row `row` on.
+    """
+    def __init__(self, row, error):
+        super().__init__(f'Unreadable file: {error}')
+        self.row = row
+
+
+def read_rows(lines, file_format):
+    """
+    Yield (row_number, row, error) for each row of a CSV or JSON Lines file.
+    `lines` is any iterable of text lines, e.g. an open file.
+    """
+    row_number = 0
+    try:
+        if file_format == 'csv':
+            reader = csv.DictReader(lines)
+            # the header is row 1 (read here), so data rows start at 2
+            reader.fieldnames
+            row_number = 1
+            for row_number, row in enumerate(reader, start=2):
+                yield row_number, {key: value if value != '' else None for key, value in row.items()}, None
+            return
+
+        for row_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield row_number, None, {'non_field_errors': [f'Invalid JSON: {e}']}
+                continue
+            if not isinstance(row, dict):
+                yield row_number, None, {'non_field_errors': ['Expected a JSON object.']}
+                continue
+            yield row_number, row, None
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise UnreadableFile(row_number + 1, e)
+
+
+def _write_batch(batch):
+    """
+    Upsert a batch of validated rows, keyed by isbn, with two bulk statements.
+    """
+    books = [Book(**{field: data[field] for field in BOOK_FIELDS}) for _, data in batch.values()]
+
+    with transaction.atomic():
+        Book.objects.bulk_create(books, update_conflicts=True, unique_fields=['isbn'],
+                                 update_fields=['title', 'published_date', 'genre', 'updated_at'])
+
+        # bulk_create does not return the ids of upserted rows
+        book_ids = dict(Book.objects.filter(isbn__in=list(batch)).values_list('isbn', 'book_id'))
+
+        details = [
+            BookDetails(book_id=book_ids[isbn], **{field: data[field] for field in DETAIL_FIELDS})
+            for isbn, (_, data) in batch.items() if data.get('number_of_pages') is not None
+        ]
+        BookDetails.objects.bulk_create(details, update_conflicts=True, unique_fields=['book'],
+                                        update_fields=list(DETAIL_FIELDS))
+
+    # bulk_create does not send post_save signals
+    invalidate_books(book_ids.values())
+
+
+def import_books(rows, batch_size=1000):
+    """
+    Validate and upsert Book + BookDetails rows produced by `read_rows`.
+
+    Rows are validated and written `batch_size` at a time so memory stays
+    bounded. Invalid rows are reported and skipped, they never abort the
+    rest of the import. Within a batch, the last row for an isbn wins.
+
+    A file that can't be read any further (see `UnreadableFile`) ends the
+    import: the error is reported for the row that couldn't be read,
+    `aborted` is set, and the rows read before it are still imported.
+    """
+    result = {'imported': 0, 'errors': [], 'aborted': False}
+    batch = {}
+
+    def flush():
+        if not batch:
+            return
+        try:
+            _write_batch(batch)
+        except DatabaseError:
+            # Rare, find the rows the database rejects: write them one at a time, each in its own
+            # transaction (a savepoint within an outer one), and only report those
+            for isbn, (row_number, data) in batch.items():
+                try:
+                    _write_batch({isbn: (row_number, data)})
+                except DatabaseError as e:
+                    result['errors'].append({'row': row_number, 'errors': {'non_field_errors': [str(e)]}})
+                else:
+                    result['imported'] += 1
+        else:
+            result['imported'] += len(batch)
+        batch.clear()
+
+    try:
+        for row_number, row, error in rows:
+            if error is None:
+                serializer = BookImportSerializer(data=row)
+                if serializer.is_valid():
+                    data = serializer.validated_data
+                    batch.pop(data['isbn'], None)
+                    batch[data['isbn']] = (row_number, data)
+                else:
+                    error = serializer.errors
+
+            if error is not None:
+                result['errors'].append({'row': row_number, 'errors': error})
+
+            if len(batch) >= batch_size:
+                flush()
+    except UnreadableFile as e:
+        result['errors'].append({'row': e.row, 'errors': {'non_field_errors': [str(e)]}})
+        result['aborted'] = True
+
+    flush()
+
+    return result
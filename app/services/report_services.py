@@ -0,0 +1,97 @@
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+from app.models.book import Book, BorrowedBooks
+from app.models.stats import BookMonthlyStats, GenreDailyStats, UserMonthlyStats
+
+
+def _months(start, end):
+    # Book and user rollups are monthly, so the range is widened to whole months
+    return start.replace(day=1), end
+
+
+def most_borrowed_books(start, end, limit=10):
+    """
+    Books with the most loans over the months from `start` to `end`.
+    """
+    # Aggregate on book_id alone, then only look up the titles of the top books
+    top = list(
+        BookMonthlyStats.objects.filter(month__range=_months(start, end))
+        .values('book_id')
+        .annotate(loans=Sum('loans'))
+        .filter(loans__gt=0)
+        .order_by('-loans', 'book_id')[:limit]
+    )
+    books = Book.objects.in_bulk([row['book_id'] for row in top])
+
+    return [
+        {**row, 'title': books[row['book_id']].title, 'isbn': books[row['book_id']].isbn}
+        for row in top if row['book_id'] in books
+    ]
+
+
+def loans_per_genre_per_month(start, end):
+    """
+    Loans and returns per genre and calendar month between `start` and `end`.
+    """
+    return list(
+        GenreDailyStats.objects.filter(day__range=(start, end))
+        .annotate(month=TruncMonth('day'))
+        .values('month', 'genre')
+        .annotate(loans=Sum('loans'), returns=Sum('returns'))
+        .order_by('month', '-loans', 'genre')
+    )
+
+
+def active_borrowers_per_month(start, end):
+    """
+    Number of users who borrowed at least one book, and their loans, per
+    calendar month from `start` to `end`.
+    """
+    # One row per user and month, so counting rows counts distinct borrowers
+    return list(
+        UserMonthlyStats.objects.filter(month__range=_months(start, end), loans__gt=0)
+        .values('month')
+        .annotate(borrowers=Count('id'), loans=Sum('loans'))
+        .order_by('month')
+    )
+
+
+def rebuild_loan_stats():
+    """
+    Recompute the monthly book and user rollups and the daily genre rollup
+    from the loan ledger, in one statement.
+
+    Loan writes are blocked while the rebuild runs, so no loan is counted
+    twice or missed.
+    """
+    loans = BorrowedBooks._meta.db_table
+    books = Book._meta.db_table
+    book_stats = BookMonthlyStats._meta.db_table
+    genre_stats = GenreDailyStats._meta.db_table
+    user_stats = UserMonthlyStats._meta.db_table
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {loans} IN SHARE MODE')
+        # DELETE rather than TRUNCATE, which fails inside a transaction with deferred constraint checks pending
+        for table in (book_stats, genre_stats, user_stats):
+            cursor.execute(f'DELETE FROM {table}')
+        cursor.execute(
+            f"""
+            WITH events AS (
+                SELECT user_id, book_id, borrow_date AS day, 1 AS loans, 0 AS returns FROM {loans}
+                UNION ALL
+                SELECT user_id, book_id, return_date, 0, 1 FROM {loans} WHERE return_date IS NOT NULL
+            ), book_stats AS (
+                INSERT INTO {book_stats} (book_id, month, loans, returns)
+                SELECT book_id, date_trunc('month', day)::date, SUM(loans), SUM(returns) FROM events GROUP BY 1, 2
+            ), user_stats AS (
+                INSERT INTO {user_stats} (user_id, month, loans, returns)
+                SELECT user_id, date_trunc('month', day)::date, SUM(loans), SUM(returns) FROM events GROUP BY 1, 2
+            )
+            INSERT INTO {genre_stats} (genre, day, loans, returns)
+            SELECT b.genre, e.day, SUM(e.loans), SUM(e.returns) FROM events e JOIN {books} b ON b.book_id = e.book_id
+            GROUP BY b.genre, e.day
+            """
+        )
@@ -0,0 +1,54 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import Count, F
+from django.db.models.functions import ExtractYear
+
+from app.models.book import Book
+
+FACET_LIMIT = 20
+
+
+def _facet(queryset, field):
+    rows = (queryset.order_by().values(field)
+            .annotate(count=Count('book_id'))
+            .order_by('-count', field)[:FACET_LIMIT])
+    return [{'value': row[field], 'count': row['count']} for row in rows]
+
+
+def search_books(q=None, isbn=None, genre=None, language=None, year=None, limit=20):
+    """
+    Ranked full-text search over title (weight A) and publisher (weight B),
+    with exact isbn / genre / language / published year filters.
+
+    Returns the top `limit` books and genre, language and published year
+    facet counts over all the matching books. Facets are None without `q`
+    or a filter, they would count the whole table.
+    """
+    queryset = Book.objects.all()
+
+    if isbn:
+        queryset = queryset.filter(isbn=isbn)
+    if genre:
+        queryset = queryset.filter(genre=genre)
+    if language:
+        queryset = queryset.filter(book_details__language=language)
+    if year:
+        queryset = queryset.filter(published_date__year=year)
+
+    results = queryset.defer('search_vector')
+    if q:
+        query = SearchQuery(q, config='english', search_type='websearch')
+        queryset = queryset.filter(search_vector=query)
+        results = (queryset.defer('search_vector')
+                   .annotate(rank=SearchRank(F('search_vector'), query))
+                   .order_by('-rank', '-book_id'))
+
+    if not any((q, isbn, genre, language, year)):
+        return list(results[:limit]), None
+
+    facets = {
+        'genre': _facet(queryset, 'genre'),
+        'language': _facet(queryset.filter(book_details__isnull=False), 'book_details__language'),
+        'published_year': _facet(queryset.annotate(published_year=ExtractYear('published_date')), 'published_year'),
+    }
+
+    return list(results[:limit]), facets
@@ -0,0 +1,177 @@
+import json
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections
+from django.utils import timezone
+from app.models.task import Task
+
+logger = logging.getLogger('app.tasks')
+
+# Task name -> function, filled by the @task decorator (see app/tasks.py)
+registry = {}
+
+
+def task(func=None, *, max_attempts=None):
+    """
+    Register `func` as a background task, to be queued with `enqueue()`.
+
+    Tasks run at least once: a task failing, or whose worker dies, is run
+    again, up to `max_attempts` (TASK_MAX_ATTEMPTS) times, so it should be
+    safe to repeat.
+    """
+    def register(func):
+        func.task_name = f'{func.__module__}.{func.__name__}'
+        func.max_attempts = max_attempts
+        registry[func.task_name] = func
+        return func
+
+    return register(func) if func is not None else register
+
+
+def enqueue(func, idempotency_key=None, run_at=None, **kwargs):
+    """
+    Queue `func(**kwargs)` for a worker, in one INSERT that is part of the
+    current transaction. `kwargs` must be JSON serializable.
+
+    Returns False, queueing nothing, when a task with the same
+    `idempotency_key` was already queued (and not yet purged).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {Task._meta.db_table}
+                (name, kwargs, idempotency_key, status, attempts, max_attempts, run_at, last_error, created_at)
+            VALUES (%s, %s, %s, %s, 0, %s, COALESCE(%s, statement_timestamp()), '', now())
+            ON CONFLICT (idempotency_key) DO NOTHING
+            RETURNING id
+            """,
+            [func.task_name, json.dumps(kwargs), idempotency_key, Task.QUEUED,
+             func.max_attempts or settings.TASK_MAX_ATTEMPTS, run_at],
+        )
+        return cursor.fetchone() is not None
+
+
+def _claim_task():
+    # Mark the queued task due first as running, skipping tasks other workers are claiming
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {Task._meta.db_table} t SET status = %s, attempts = t.attempts + 1, started_at = statement_timestamp()
+            FROM (
+                SELECT id FROM {Task._meta.db_table}
+                WHERE status = %s AND run_at <= statement_timestamp()
+                ORDER BY run_at, id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            ) due
+            WHERE t.id = due.id
+            RETURNING t.id, t.name, t.kwargs, t.attempts, t.max_attempts
+            """,
+            [Task.RUNNING, Task.QUEUED],
+        )
+        return cursor.fetchone()
+
+
+def run_next_task():
+    """
+    Claim and run the queued task due first. Returns False if there was none.
+    """
+    claimed = _claim_task()
+    if claimed is None:
+        return False
+
+    task_id, name, kwargs, attempts, max_attempts = claimed
+    tasks = Task.objects.filter(id=task_id)
+
+    try:
+        func = registry.get(name)
+        if func is None:
+            raise LookupError(f'Unknown task {name}')
+        func(**json.loads(kwargs))
+    except Exception:
+        error = traceback.format_exc()
+        if attempts < max_attempts:
+            # Exponential backoff: TASK_RETRY_DELAY, then twice as long after every failure
+            delay = timedelta(seconds=settings.TASK_RETRY_DELAY * 2 ** (attempts - 1))
+            tasks.update(status=Task.QUEUED, run_at=timezone.now() + delay, started_at=None, last_error=error)
+            logger.warning('Task %s (%s) failed, attempt %s of %s, retrying in %s', task_id, name, attempts,
+                           max_attempts, delay, exc_info=True)
+        else:
+            tasks.update(status=Task.FAILED, finished_at=timezone.now(), last_error=error)
+            logger.error('Task %s (%s) failed after %s attempts', task_id, name, attempts, exc_info=True)
+    else:
+        tasks.update(status=Task.DONE, finished_at=timezone.now())
+
+    return True
+
+
+def run_pending_tasks():
+    """
+    Run the queued tasks that are due, one after the other, until none is
+    left. Returns how many were run.
+    """
+    count = 0
+    while run_next_task():
+        count += 1
+    return count
+
+
+def requeue_stale_tasks():
+    """
+    Requeue the tasks claimed more than TASK_TIMEOUT seconds ago, whose
+    worker most likely died, or fail them if they have no attempts left.
+    """
+    timeout = timezone.now() - timedelta(seconds=settings.TASK_TIMEOUT)
+    stale = Task.objects.filter(status=Task.RUNNING, started_at__lt=timeout)
+
+    failed = [task_id for task_id, attempts, max_attempts in stale.values_list('id', 'attempts', 'max_attempts')
+              if attempts >= max_attempts]
+    stale.filter(id__in=failed).update(status=Task.FAILED, finished_at=timezone.now(), last_error='Timed out')
+    return stale.exclude(id__in=failed).update(status=Task.QUEUED, started_at=None)
+
+
+def purge_finished_tasks():
+    """
+    Delete the tasks done more than TASK_RETENTION_DAYS ago. Their
+    idempotency keys can be used again afterwards. Failed tasks are kept.
+    """
+    finished = timezone.now() - timedelta(days=settings.TASK_RETENTION_DAYS)
+    deleted, _ = Task.objects.filter(status=Task.DONE, finished_at__lt=finished).delete()
+    return deleted
+
+
+def work(stop, poll_interval):
+    """
+    Worker loop: run tasks until the `stop` event is set, waiting
+    `poll_interval` seconds whenever the queue is empty.
+    """
+    try:
+        while not stop.is_set():
+            # Like a request, so a broken or expired connection is replaced between tasks
+            close_old_connections()
+            try:
+                ran = run_next_task()
+            except Exception:
+                # e.g. the database is unreachable, try again later
+                logger.exception('Could not claim a task')
+                ran = False
+            if not ran:
+                stop.wait(poll_interval)
+    finally:
+        connections.close_all()
+
+
+def start_workers(threads, poll_interval):
+    """
+    Start `threads` worker threads, stopped by setting the returned event.
+    """
+    stop = threading.Event()
+    workers = [threading.Thread(target=work, args=(stop, poll_interval), name=f'task-worker-{i}', daemon=True)
+               for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    return stop, workers
@@ -1,8 +1,22 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from app.authentication import token_versions
+from app.services.task_services import enqueue
+from app.tasks import send_welcome_email
 User = get_user_model()
 
 def create_user_account(name, email, membership_date, password):
-    user = User.objects.create_user(name=name, email=email, membership_date=membership_date, password=password)
+    with transaction.atomic():
+        user = User.objects.create_user(name=name, email=email, membership_date=membership_date, password=password)
+
+        # Sent by a worker, the request doesn't wait for the mail server
+        enqueue(send_welcome_email, idempotency_key=f'welcome_email:{user.pk}', user_id=user.pk)
 
     return user
-    
\ No newline at end of file
+
+
+def revoke_user_tokens(user_id):
+    # Other processes notice the new version once their cached one expires (AUTH_TOKEN_VERSION_TTL)
+    User.objects.filter(user_id=user_id).update(token_version=F('token_version') + 1)
+    token_versions.invalidate(user_id)
@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from app.authentication import token_versions
+from app.models.book import Book, BookDetails, BorrowedBooks
+from app.models.user import User
+from app.services.cache_services import invalidate_books_on_commit
+
+
+@receiver([post_save, post_delete], sender=Book)
+def invalidate_book_cache(sender, instance, **kwargs):
+    invalidate_books_on_commit([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=BookDetails)
+def invalidate_book_details_cache(sender, instance, **kwargs):
+    invalidate_books_on_commit([instance.book_id])
+
+
+@receiver([post_save, post_delete], sender=BorrowedBooks)
+def invalidate_book_availability_cache(sender, instance, **kwargs):
+    # Loans saved through the ORM (e.g. the admin) change the book's availability
+    invalidate_books_on_commit([instance.book_id])
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_token_version(sender, instance, **kwargs):
+    # e.g. a user deactivated or demoted from the admin, other processes catch up after AUTH_TOKEN_VERSION_TTL
+    token_versions.invalidate(instance.pk)
@@ -0,0 +1,70 @@
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mail, send_mass_mail
+from django.db import transaction
+from django.utils import timezone
+from app.models.book import Hold, LoanReminder
+from app.services.task_services import task
+User = get_user_model()
+
+
+# Background tasks, see app.services.task_services. Imported by AppConfig.ready
+# so that workers know every task.
+
+@task
+def send_welcome_email(user_id):
+    user = User.objects.filter(user_id=user_id).first()
+    if user is None:
+        return
+
+    send_mail(
+        'Welcome to the library',
+        f'Hi {user.name},\n\nYour library account is ready, you can now log in with {user.email}.',
+        None,
+        [user.email],
+    )
+
+
+@task
+def send_loan_reminders(batch_size=100):
+    """
+    Email the unsent loan reminders, `batch_size` at a time. A batch is
+    marked sent in the transaction that locks it, so concurrent runs never
+    pick the same reminders.
+    """
+    while True:
+        with transaction.atomic():
+            reminders = list(
+                LoanReminder.objects.select_for_update(skip_locked=True, of=('self', ))
+                .filter(sent_at__isnull=True)
+                .select_related('loan__user', 'loan__book')
+                .order_by('created_at')[:batch_size]
+            )
+            if not reminders:
+                return
+
+            send_mass_mail([
+                (
+                    f'Overdue: {reminder.loan.book.title}',
+                    f'Hi {reminder.loan.user.name},\n\n"{reminder.loan.book.title}" was due back on '
+                    f'{reminder.loan.due_date}, please return it as soon as possible.',
+                    None,
+                    [reminder.loan.user.email],
+                )
+                for reminder in reminders
+            ])
+            LoanReminder.objects.filter(id__in=[reminder.id for reminder in reminders]).update(sent_at=timezone.now())
+
+
+@task
+def send_hold_ready_email(hold_id):
+    hold = Hold.objects.filter(id=hold_id).select_related('user', 'book').first()
+    if hold is None:
+        return
+
+    send_mail(
+        f'Ready for you: {hold.book.title}',
+        f'Hi {hold.user.name},\n\n"{hold.book.title}" was returned and is now lent to you, as you were first '
+        f'in line for it.',
+        None,
+        [hold.user.email],
+    )
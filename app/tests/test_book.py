@@ -1,10 +1,40 @@
 from rest_framework.test import APITestCase
+from django.test import TransactionTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.db import connection, DataError, OperationalError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command, CommandError
+from django.core.cache import cache
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock
+from asgiref.sync import sync_to_async
+import tempfile
+import gzip
+import json
+from django.conf import settings
 from django.contrib.auth import get_user_model
 User = get_user_model()
 from django.urls import reverse
 from rest_framework import status
-from datetime import date
-from app.models.book import Book, BorrowedBooks, BookDetails
+from rest_framework.renderers import JSONRenderer
+from datetime import date, timedelta
+from app.models.book import Book, BorrowedBooks, BookDetails, Hold, LoanReminder
+from app.models.stats import BookMonthlyStats, GenreDailyStats, UserMonthlyStats
+from django.utils import timezone
+from django.utils.http import http_date
+from app.api.user import TokenObtainPairSerializer
+from app.api import throttling
+from app.api.pagination import BookKeysetPagination
+from app.api.conditional import make_etag
+from app.api.renderers import FastJSONRenderer
+from app.db.postgresql_pool.base import DatabaseWrapper as PooledDatabaseWrapper
+from app.db.routers import ReplicaRouter, check_pin_cache
+from app.services.task_services import run_pending_tasks
+from app.services import import_services
+from django.core import mail
+from app.services.book_services import borrow_book, borrow_books, return_books, place_hold, BookAlreadyBorrowed
 
 class BookAPITestCase(APITestCase):
     def setUp(self):
@@ -18,6 +48,8 @@ class BookAPITestCase(APITestCase):
 
         # Authenticate the user for all test cases
         self.client.force_authenticate(user=self.user)
+
+        cache.clear()
         
     def test_create_book(self):
         url = reverse('create_book')
@@ -50,6 +82,36 @@ class BookAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)
 
+    def test_list_books_keyset_pagination(self):
+        for i in range(4):
+            Book.objects.create(title=f'Book {i}', isbn=f'isbn-{i}', published_date=date.today(), genre='Fiction')
+
+        url = reverse('list_books')
+
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([book['title'] for book in response.data['results']], ['Book 3', 'Book 2'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([book['title'] for book in response.data['results']], ['Book 1', 'Book 0'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([book['title'] for book in response.data['results']], ['Test Book'])
+        self.assertIsNone(response.data['next'])
+
+    def test_list_books_invalid_cursor(self):
+        url = reverse('list_books')
+
+        response = self.client.get(url, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # well-formed cursors holding values that don't fit the ordering fields
+        paginator = BookKeysetPagination()
+        for values in (['garbage', 1], ['2026-01-01T00:00:00+00:00', 'abc'], ['2026-01-01T00:00:00+00:00', None]):
+            response = self.client.get(url, {'cursor': paginator.encode_cursor(values)})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_get_book_by_id(self):
         url = reverse('book_details', args={self.book.book_id})
 
@@ -58,6 +120,383 @@ class BookAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['title'], 'Test Book')
     
+    def test_get_book_by_id_is_cached(self):
+        url = reverse('book_details', args={self.book.book_id})
+
+        self.client.get(url)
+
+        # only the conditional GET version check hits the database
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response.data['title'], 'Test Book')
+
+        # saving the book invalidates its cached details
+        self.book.title = 'Updated Title'
+        self.book.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['title'], 'Updated Title')
+
+        # a write from another worker doesn't reach this worker's cache, the entry of an older version is not served
+        Book.objects.filter(book_id=self.book.book_id).update(title='Newest Title', updated_at=timezone.now())
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['title'], 'Newest Title')
+        self.assertEqual(response['ETag'], make_etag(self.book.book_id, Book.objects.get().updated_at))
+
+    def test_list_books_is_cached(self):
+        url = reverse('list_books')
+
+        self.client.get(url)
+
+        # served from the cache, only the list version is read from the database
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data), 1)
+
+        # creating a book invalidates the cached pages
+        self.client.post(reverse('create_book'), {'title': 'New Book', 'isbn': '987654321', 'published_date': date.today(), 'genre': 'Non-Fiction'})
+
+        response = self.client.get(url)
+        self.assertEqual(len(response.data), 2)
+
+    @mock.patch('app.services.cache_services.cache_is_shared', return_value=True)
+    def test_list_books_version_from_shared_cache(self, cache_is_shared):
+        url = reverse('list_books')
+
+        etag = self.client.get(url)['ETag']
+
+        # every worker sees the version in a shared cache, a 304 needs no query
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.delete()
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_get_book_by_id_not_modified(self):
+        url = reverse('book_details', args={self.book.book_id})
+
+        response = self.client.get(url)
+        etag = response['ETag']
+
+        # only the updated_at lookup runs, nothing is loaded or serialized
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # adding book details changes the etag
+        BookDetails.objects.create(book=self.book, number_of_pages=20, publisher='publisher1', language='en')
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_books_not_modified(self):
+        url = reverse('list_books')
+
+        response = self.client.get(url)
+        etag = response['ETag']
+
+        # only the list version is read, nothing is loaded or serialized
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # a write from another worker, whose cache invalidation doesn't reach this worker
+        Book.objects.filter(book_id=self.book.book_id).update(title='Renamed')
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['title'], 'Renamed')
+        etag = response['ETag']
+
+        self.book.delete()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 0)
+
+    def test_fast_serialization_is_identical(self):
+        BookDetails.objects.create(book=self.book, number_of_pages=20, publisher='Publisher \u2028 ü', language='en')
+        Book.objects.create(title='No Details', isbn='987654321', published_date=date(2020, 2, 29), genre='Non-Fiction')
+
+        urls = [
+            reverse('list_books'),
+            reverse('list_books') + '?page_size=1',
+            reverse('book_details', args={self.book.book_id}),
+            reverse('book_details', args={self.book.book_id + 1}),
+            reverse('book_details', args={404}),
+        ]
+
+        for url in urls:
+            cache.clear()
+            with override_settings(FAST_SERIALIZATION=False):
+                expected = self.client.get(url)
+
+            cache.clear()
+            with override_settings(FAST_SERIALIZATION=True):
+                response = self.client.get(url)
+
+            self.assertEqual(response.status_code, expected.status_code)
+            self.assertEqual(response.content, expected.content)
+
+    def test_only_fast_serialization_renders_with_orjson(self):
+        for fast in (False, True):
+            with override_settings(FAST_SERIALIZATION=fast):
+                response = self.client.get(reverse('list_books'))
+                self.assertIs(type(response.accepted_renderer), FastJSONRenderer if fast else JSONRenderer)
+
+                # other endpoints keep DRF's encoder, e.g. for integers orjson can't encode
+                response = self.client.get(reverse('search_books'))
+                self.assertIs(type(response.accepted_renderer), JSONRenderer)
+
+    def test_async_views_are_identical(self):
+        BookDetails.objects.create(book=self.book, number_of_pages=20, publisher='Publisher \u2028 ü', language='en')
+        other = Book.objects.create(title='No Details', isbn='987654321', published_date=date(2020, 2, 29), genre='Non-Fiction')
+        BorrowedBooks.objects.create(user=self.user, book=other, borrow_date=date.today())
+
+        # async views authenticate with a real token, they don't go through DRF
+        token = TokenObtainPairSerializer.get_token(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        urls = [
+            ('list_books', (), ''),
+            ('list_books', (), '?page_size=1'),
+            ('list_books', (), '?available=false'),
+            ('list_books', (), '?available=maybe'),
+            ('list_books', (), '?cursor=not-a-cursor'),
+            ('book_details', (self.book.book_id, ), ''),
+            ('book_details', (404, ), ''),
+            ('currently_borrowed_books', (), ''),
+        ]
+
+        for name, args, query in urls:
+            cache.clear()
+            expected = self.client.get(reverse(name, args=args) + query)
+
+            cache.clear()
+            response = self.client.get(reverse(f'async_{name}', args=args) + query)
+
+            self.assertEqual(response.status_code, expected.status_code)
+            # next links point at the async route
+            self.assertEqual(response.content.replace(b'/async', b''), expected.content)
+
+    def test_async_views_conditional_get(self):
+        token = TokenObtainPairSerializer.get_token(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        url = reverse('async_book_details', args={self.book.book_id})
+
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertEqual(response['Last-Modified'], http_date(self.book.updated_at.timestamp()))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.book.title = 'Updated Title'
+        self.book.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['title'], 'Updated Title')
+
+    def test_async_views_require_authentication(self):
+        # force_authenticate only applies to DRF views
+        response = self.client.get(reverse('async_list_books'))
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        response = self.client.get(reverse('async_list_books'))
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(json.loads(response.content)['code'], 'token_not_valid')
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'user': '3/min'}})
+    def test_requests_are_throttled_per_user(self):
+        throttling.stats.reset()
+        url = reverse('book_details', args=[self.book.book_id])
+
+        for _ in range(3):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # one token is back in 20 seconds
+        self.assertIn(response['Retry-After'], ('19', '20'))
+        self.assertEqual(throttling.stats.snapshot()['user'], {'allowed': 3, 'rejected': 1, 'rejection_rate': 0.25})
+
+        # other users have their own bucket
+        other = User.objects.create_user(name='other', email='other@gmail.com', membership_date=date.today(),
+                                         password='testpassword')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'user': '50/hour'}})
+    def test_concurrent_requests_share_the_bucket(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+
+        def allow(_):
+            return throttling.UserTokenBucketThrottle().allow_request(request, None)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(allow, range(200)))
+
+        self.assertEqual(results.count(True), 50)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK,
+                                       'DEFAULT_THROTTLE_RATES': {'books_list': '20/min', 'currently_borrowed': '20/min'}},
+                       THROTTLE_FULL_TABLE_COST=10)
+    def test_full_table_requests_cost_more(self):
+        url = reverse('list_books')
+
+        # 20 paginated pages, or 2 whole lists, per minute
+        for _ in range(2):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        # endpoints have separate buckets
+        self.assertEqual(self.client.get(reverse('currently_borrowed_books')).status_code, status.HTTP_200_OK)
+
+        # a single paginated page only needs one token
+        self.client.force_authenticate(user=User.objects.create_user(
+            name='other', email='other@gmail.com', membership_date=date.today(), password='testpassword'))
+        self.client.get(url)
+        self.assertEqual(self.client.get(url, {'page_size': 10}).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'books_search': '2/min'}})
+    def test_search_has_its_own_throttle(self):
+        url = reverse('search_books')
+
+        for _ in range(2):
+            self.assertEqual(self.client.get(url, {'q': 'test'}).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url, {'q': 'test'}).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        # other endpoints have separate buckets
+        self.assertEqual(self.client.get(reverse('list_books')).status_code, status.HTTP_200_OK)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'currently_borrowed': '20/min'}},
+                       THROTTLE_FULL_TABLE_COST=10)
+    def test_async_views_share_the_throttles(self):
+        token = TokenObtainPairSerializer.get_token(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        self.assertEqual(self.client.get(reverse('currently_borrowed_books')).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(reverse('async_currently_borrowed_books')).status_code, status.HTTP_200_OK)
+
+        response = self.client.get(reverse('async_currently_borrowed_books'))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+    @override_settings(DATABASE_REPLICAS=['replica_1'])
+    def test_reads_go_to_replica_until_own_write(self):
+        # Replicas aren't configured in tests, record the choice and read from the primary
+        with mock.patch('app.db.routers.random.choice', return_value='default') as choice:
+            self.client.get(reverse('list_books'))
+            self.assertTrue(choice.called)
+
+            # writes go to the primary
+            choice.reset_mock()
+            url = reverse('borrow_book', kwargs={'user_id': self.user.user_id,
+                                                 'book_id': self.book.book_id})
+            response = self.client.post(url, {'borrow_date': date.today()})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertFalse(choice.called)
+
+            # the borrower reads their own write from the primary
+            response = self.client.get(reverse('book_details', args={self.book.book_id}))
+            self.assertFalse(json.loads(response.content)['is_available'])
+            self.assertFalse(choice.called)
+
+            # other users still read from replicas
+            other = User.objects.create_user(name='other', email='other@gmail.com',
+                                             membership_date=date.today(), password='testpassword')
+            self.client.force_authenticate(user=other)
+            self.client.get(reverse('book_details', args={self.book.book_id}))
+            self.assertTrue(choice.called)
+
+            # async views follow the same routing
+            choice.reset_mock()
+            token = TokenObtainPairSerializer.get_token(other).access_token
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            response = self.client.get(reverse('async_book_details', args={self.book.book_id}))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(choice.called)
+
+    @override_settings(DATABASE_REPLICAS=['replica_1'])
+    def test_replica_reads_are_not_cached(self):
+        with mock.patch('app.db.routers.random.choice', return_value='default') as choice:
+            for name, args in (('list_books', None), ('book_details', [self.book.book_id])):
+                for _ in range(2):
+                    choice.reset_mock()
+                    self.assertEqual(self.client.get(reverse(name, args=args)).status_code, status.HTTP_200_OK)
+                    # the second read missed the cache and went to a replica again
+                    self.assertTrue(choice.called)
+
+    @override_settings(DATABASE_REPLICAS=['replica_1'])
+    def test_replicas_require_a_shared_cache(self):
+        self.assertEqual([error.id for error in check_pin_cache(None)], ['app.E001'])
+
+        with mock.patch('app.db.routers.cache_is_shared', return_value=True):
+            self.assertEqual(check_pin_cache(None), [])
+
+    @override_settings(DATABASE_REPLICAS=['replica_1'])
+    def test_replica_router_defaults_to_primary(self):
+        router = ReplicaRouter()
+
+        # outside a request, e.g. management commands
+        self.assertEqual(router.db_for_read(Book), 'default')
+        self.assertEqual(router.db_for_write(Book), 'default')
+        self.assertFalse(router.allow_migrate('replica_1', 'app'))
+
+        with mock.patch('app.db.routers.random.choice', return_value='default') as choice:
+            self.client.get(reverse('book_loans', args={self.book.book_id}))
+            self.assertFalse(choice.called)
+
+    @override_settings(PERFORMANCE_SERVER_TIMING=True)
+    def test_server_timing_header(self):
+        url = reverse('book_details', args={self.book.book_id})
+
+        with self.assertLogs('app.performance', level='INFO') as logs:
+            response = self.client.get(url)
+
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+        self.assertIn('"view": "book_details"', logs.output[0])
+
+    @override_settings(PERFORMANCE_SERVER_TIMING=True)
+    async def test_server_timing_counts_queries_under_asgi(self):
+        # Under ASGI the middleware runs on the event loop and the queries in sync_to_async threads
+        token = TokenObtainPairSerializer.get_token(self.user).access_token
+        headers = {'Authorization': f'Bearer {token}'}
+
+        for name in ('book_details', 'async_book_details'):
+            await sync_to_async(cache.clear)()
+            response = await self.async_client.get(reverse(name, args=[self.book.book_id]), headers=headers)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('desc="0 queries"', response['Server-Timing'])
+
+    @override_settings(PERFORMANCE_N_PLUS_ONE_THRESHOLD=3)
+    def test_repeated_queries_are_flagged(self):
+        from app.middleware import PerformanceMiddleware
+
+        def view(request):
+            for _ in range(3):
+                list(Book.objects.filter(book_id=self.book.book_id))
+            return HttpResponse()
+
+        with self.assertLogs('app.performance', level='WARNING') as logs:
+            PerformanceMiddleware(view)(RequestFactory().get('/'))
+
+        self.assertIn('possible N+1 queries', logs.output[0])
+
     def test_get_nonexistent_book_by_id(self):
         url = reverse('book_details', args={404})
 
@@ -116,6 +555,88 @@ class BookAPITestCase(APITestCase):
         self.assertEqual(BookDetails.objects.count(), 1)    # Count should be same
         self.assertEqual(response.data['message'], 'Book details updated successfully.')
 
+    def test_patch_book_details(self):
+        url = reverse('book_update', args={self.book.book_id})
+        BookDetails.objects.create(book=self.book, number_of_pages=20, publisher='publisher1', language='en')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(url, {"genre": "Genre updated", "book_details": {"publisher": "Publisher updated"}})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['title'], 'Test Book')
+        self.assertEqual(response.data['data']['book_details'],
+                         {'number_of_pages': 20, 'publisher': 'Publisher updated', 'language': 'en'})
+
+        # only the changed columns are written, book and details in one statement each
+        writes = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(writes), 2)
+        self.assertNotIn('"title"', writes[0] + writes[1])
+
+        self.assertEqual(Book.objects.get(book_id=self.book.book_id).genre, 'Genre updated')
+
+    def test_unchanged_book_details_are_not_written(self):
+        url = reverse('book_update', args={self.book.book_id})
+        BookDetails.objects.create(book=self.book, number_of_pages=20, publisher='publisher1', language='en')
+        # set by the search vector trigger when the details are created
+        updated_at = Book.objects.get(book_id=self.book.book_id).updated_at
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(url, {"title": "Test Book", "book_details": {"language": "en"}})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([query for query in queries.captured_queries if query['sql'].startswith(('UPDATE', 'INSERT'))])
+        self.assertEqual(Book.objects.get(book_id=self.book.book_id).updated_at, updated_at)
+
+    def test_patch_new_book_details_requires_every_field(self):
+        url = reverse('book_update', args={self.book.book_id})
+
+        response = self.client.patch(url, {"book_details": {"publisher": "Publisher"}})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('language', response.data['book_details'])
+        self.assertEqual(BookDetails.objects.count(), 0)
+
+        response = self.client.patch(url, {"book_details": {"number_of_pages": 10, "publisher": "Publisher", "language": "en"}})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(BookDetails.objects.get().publisher, 'Publisher')
+
+    def test_search_books(self):
+        BookDetails.objects.create(book=self.book, number_of_pages=20, publisher='Penguin Classics', language='en')
+        other = Book.objects.create(title='Penguin Biology', isbn='222', published_date=date(2020, 1, 1), genre='Science')
+        Book.objects.create(title='Unrelated', isbn='333', published_date=date(2020, 1, 1), genre='Science')
+
+        url = reverse('search_books')
+        response = self.client.get(url, {'q': 'penguin'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # title matches rank above publisher matches
+        self.assertEqual([book['book_id'] for book in response.data['data']['results']], [other.book_id, self.book.book_id])
+        self.assertEqual(response.data['data']['facets']['genre'], [{'value': 'Fiction', 'count': 1}, {'value': 'Science', 'count': 1}])
+        self.assertEqual(response.data['data']['facets']['language'], [{'value': 'en', 'count': 1}])
+
+    def test_search_books_filters(self):
+        Book.objects.create(title='Old Book', isbn='222', published_date=date(2020, 1, 1), genre='Science')
+
+        url = reverse('search_books')
+
+        response = self.client.get(url, {'year': 2020})
+        self.assertEqual([book['title'] for book in response.data['data']['results']], ['Old Book'])
+        self.assertEqual(response.data['data']['facets']['published_year'], [{'value': 2020, 'count': 1}])
+
+        response = self.client.get(url, {'isbn': '123456789'})
+        self.assertEqual([book['title'] for book in response.data['data']['results']], ['Test Book'])
+
+    def test_search_books_without_criteria_skips_facets(self):
+        url = reverse('search_books')
+
+        # no GROUP BY over the whole table, only the results
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+
+        self.assertEqual([book['title'] for book in response.data['data']['results']], ['Test Book'])
+        self.assertIsNone(response.data['data']['facets'])
+
     def test_update_nonexistent_book(self):
         url = reverse('book_update', args={404})
         response = self.client.put(url)
@@ -201,4 +722,735 @@ class BookAPITestCase(APITestCase):
         response = self.client.get(url)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data['data']), 1)
\ No newline at end of file
+        self.assertEqual(len(response.data['data']), 1)
+        self.assertEqual(response.data['data'][0]['book']['title'], 'Test Book')
+        self.assertEqual(response.data['data'][0]['user']['email'], 'test@gmail.com')
+
+    def test_currently_borrowed_books_query_count_is_constant(self):
+        url = reverse('currently_borrowed_books')
+        BorrowedBooks.objects.create(user=self.user, book=self.book, borrow_date=date.today())
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['data']), 1)
+
+        for i in range(5):
+            book = Book.objects.create(title=f'Book {i}', isbn=f'isbn-{i}', published_date=date.today(), genre='Fiction')
+            BorrowedBooks.objects.create(user=self.user, book=book, borrow_date=date.today())
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['data']), 6)
+
+    def test_get_book_by_id_loads_details_in_the_same_query(self):
+        BookDetails.objects.create(book=self.book, number_of_pages=20, publisher='publisher1', language='en')
+        url = reverse('book_details', args={self.book.book_id})
+
+        # conditional GET version check + book with details
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+
+        self.assertEqual(response.data['book_details']['publisher'], 'publisher1')
+
+    def test_borrow_book_for_nonexistent_user(self):
+        url = reverse('borrow_book', kwargs={'user_id': 404,
+                                             'book_id': self.book.book_id})
+
+        data = {'borrow_date': date.today()}
+        response = self.client.post(url, data)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(BorrowedBooks.objects.count(), 0)
+
+    def test_borrow_book_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            borrow_book(self.user.user_id, self.book.book_id, date.today())
+
+    @mock.patch('app.services.cache_services.cache_is_shared', return_value=True)
+    def test_rejected_borrows_keep_the_cache(self, cache_is_shared):
+        borrow_book(self.user.user_id, self.book.book_id, date.today())
+        url = reverse('list_books')
+        self.client.get(url)
+
+        for book_id in (self.book.book_id, 404):
+            response = self.client.post(reverse('borrow_book', kwargs={'user_id': self.user.user_id, 'book_id': book_id}),
+                                        {'borrow_date': date.today()})
+            self.assertIn(response.status_code, (status.HTTP_400_BAD_REQUEST, status.HTTP_404_NOT_FOUND))
+
+        # still served from the cache
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    def test_borrow_book_again_after_return(self):
+        BorrowedBooks.objects.create(user=self.user, book=self.book, borrow_date=date.today(), return_date=date.today())
+
+        borrow_book(self.user.user_id, self.book.book_id, date.today())
+
+        self.assertEqual(BorrowedBooks.currently_borrowed.count(), 1)
+
+
+    # Bulk borrow / return
+
+    def test_bulk_borrow_books(self):
+        other = Book.objects.create(title='other', isbn='isbn-other', published_date=date.today(), genre='genre')
+        BorrowedBooks.objects.create(user=self.user, book=other, borrow_date=date.today())
+        url = reverse('bulk_borrow_books')
+
+        data = {'user_id': self.user.user_id, 'book_ids': [self.book.book_id, other.book_id, 404], 'borrow_date': date.today()}
+        with self.assertNumQueries(2):
+            response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data'], [
+            {'book_id': self.book.book_id, 'status': 'borrowed'},
+            {'book_id': other.book_id, 'status': 'already_borrowed'},
+            {'book_id': 404, 'status': 'not_found'},
+        ])
+        self.assertEqual(BorrowedBooks.currently_borrowed.count(), 2)
+
+    def test_bulk_borrow_books_is_a_single_query_when_all_are_available(self):
+        books = Book.objects.bulk_create(
+            [Book(title=f'book {i}', isbn=f'isbn-{i}', published_date=date.today(), genre='genre') for i in range(20)]
+        )
+        url = reverse('bulk_borrow_books')
+
+        data = {'user_id': self.user.user_id, 'book_ids': [book.book_id for book in books], 'borrow_date': date.today()}
+        with self.assertNumQueries(1):
+            response = self.client.post(url, data, format='json')
+
+        self.assertEqual({item['status'] for item in response.data['data']}, {'borrowed'})
+        self.assertEqual(BorrowedBooks.currently_borrowed.count(), 20)
+
+    def test_bulk_borrow_books_for_nonexistent_user(self):
+        url = reverse('bulk_borrow_books')
+
+        data = {'user_id': 404, 'book_ids': [self.book.book_id], 'borrow_date': date.today()}
+        response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(BorrowedBooks.objects.count(), 0)
+
+    def test_bulk_borrow_books_rejects_empty_cart(self):
+        url = reverse('bulk_borrow_books')
+
+        data = {'user_id': self.user.user_id, 'book_ids': [], 'borrow_date': date.today()}
+        response = self.client.post(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_return_books(self):
+        BorrowedBooks.objects.create(user=self.user, book=self.book, borrow_date=date.today())
+        url = reverse('bulk_return_books')
+
+        data = {'book_ids': [self.book.book_id, 404], 'return_date': date.today()}
+        # savepoint + locking select + update + hold handover + release
+        with self.assertNumQueries(5):
+            response = self.client.put(url, data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data'], [
+            {'book_id': self.book.book_id, 'status': 'returned'},
+            {'book_id': 404, 'status': 'not_found'},
+        ])
+        self.assertEqual(BorrowedBooks.currently_borrowed.count(), 0)
+
+
+    # Loan history
+
+    def test_book_loans(self):
+        for day in range(1, 4):
+            BorrowedBooks.objects.create(user=self.user, book=self.book, borrow_date=date(2024, 1, day), return_date=date(2024, 1, day))
+        url = reverse('book_loans', args={self.book.book_id})
+
+        # one query for the page, loans and users together
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'borrowed_after': '2024-01-02'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([loan['borrow_date'] for loan in response.data['results']], ['2024-01-03', '2024-01-02'])
+        self.assertEqual(response.data['results'][0]['user']['email'], 'test@gmail.com')
+
+    def test_book_loans_invalid_date_range(self):
+        url = reverse('book_loans', args={self.book.book_id})
+
+        response = self.client.get(url, {'borrowed_after': '2024-02-01', 'borrowed_before': '2024-01-01'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_loans_of_nonexistent_book(self):
+        response = self.client.get(reverse('book_loans', args={404}))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+    # Availability
+
+    def test_book_availability_follows_borrow_and_return(self):
+        url = reverse('book_details', args={self.book.book_id})
+        self.assertTrue(self.client.get(url).data['is_available'])
+
+        borrow_book(self.user.user_id, self.book.book_id, date.today())
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.current_loan, BorrowedBooks.currently_borrowed.get())
+        self.assertFalse(self.client.get(url).data['is_available'])
+
+        self.client.put(reverse('return_book', args={self.book.book_id}), {'return_date': date.today()})
+        self.assertTrue(self.client.get(url).data['is_available'])
+
+    def test_list_books_filtered_by_availability(self):
+        other = Book.objects.create(title='Other Book', isbn='isbn-other', published_date=date.today(), genre='Fiction')
+        BorrowedBooks.objects.create(user=self.user, book=other, borrow_date=date.today())
+        url = reverse('list_books')
+
+        response = self.client.get(url, {'available': 'true'})
+        self.assertEqual([(book['title'], book['is_available']) for book in response.data], [('Test Book', True)])
+
+        response = self.client.get(url, {'available': 'false', 'page_size': 10})
+        self.assertEqual([(book['title'], book['is_available']) for book in response.data['results']], [('Other Book', False)])
+
+    def test_deleting_a_loan_makes_the_book_available(self):
+        loan = BorrowedBooks.objects.create(user=self.user, book=self.book, borrow_date=date.today())
+
+        loan.delete()
+
+        self.book.refresh_from_db()
+        self.assertTrue(self.book.is_available)
+
+    def test_saving_a_book_keeps_its_availability(self):
+        # loaded before the loan, the book still holds current_loan = None
+        book = Book.objects.get(book_id=self.book.book_id)
+        borrow_book(self.user.user_id, self.book.book_id, date.today())
+
+        book.title = 'Renamed'
+        book.save()
+
+        book.refresh_from_db()
+        self.assertEqual((book.title, book.current_loan), ('Renamed', BorrowedBooks.currently_borrowed.get()))
+
+    def test_reconcile_availability_command(self):
+        loan = BorrowedBooks.objects.create(user=self.user, book=self.book, borrow_date=date.today())
+        Book.objects.filter(book_id=self.book.book_id).update(current_loan=None)
+
+        stdout = StringIO()
+        call_command('reconcile_availability', stdout=stdout)
+
+        self.assertIn('Fixed the availability of 1 books.', stdout.getvalue())
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.current_loan, loan)
+
+    @override_settings(LOAN_PERIOD_DAYS=21)
+    def test_loans_are_due_after_the_loan_period(self):
+        borrow_book(self.user.user_id, self.book.book_id, date(2024, 1, 30))
+        self.assertEqual(BorrowedBooks.objects.get().due_date, date(2024, 2, 20))
+
+        other = Book.objects.create(title='Other', isbn='987654321', published_date=date.today(), genre='Fiction')
+        loan = BorrowedBooks.objects.create(user=self.user, book=other, borrow_date=date(2024, 1, 1))
+        self.assertEqual(loan.due_date, date(2024, 1, 22))
+
+    def test_sweep_overdue_loans_command(self):
+        today = date.today()
+        books = [Book.objects.create(title=f'Book {i}', isbn=f'isbn-{i}', published_date=today, genre='Fiction')
+                 for i in range(5)]
+        overdue = [
+            BorrowedBooks.objects.create(user=self.user, book=books[0], borrow_date=today, due_date=today - timedelta(days=1)),
+            BorrowedBooks.objects.create(user=self.user, book=books[1], borrow_date=today, due_date=today - timedelta(days=30)),
+            BorrowedBooks.objects.create(user=self.user, book=books[2], borrow_date=today, due_date=today - timedelta(days=2)),
+        ]
+        # due today, and returned late
+        BorrowedBooks.objects.create(user=self.user, book=books[3], borrow_date=today, due_date=today)
+        BorrowedBooks.objects.create(user=self.user, book=books[4], borrow_date=today, due_date=today - timedelta(days=5),
+                                     return_date=today)
+
+        stdout = StringIO()
+        call_command('sweep_overdue_loans', batch_size=2, stdout=stdout)
+
+        self.assertIn('Flagged 3 overdue loans.', stdout.getvalue())
+        self.assertEqual(set(BorrowedBooks.objects.filter(overdue=True)), set(overdue))
+        self.assertEqual(set(LoanReminder.objects.filter(kind=LoanReminder.OVERDUE, sent_at__isnull=True)
+                             .values_list('loan_id', flat=True)), {loan.id for loan in overdue})
+
+        # flagged loans are not picked up again
+        stdout = StringIO()
+        call_command('sweep_overdue_loans', stdout=stdout)
+
+        self.assertIn('Flagged 0 overdue loans.', stdout.getvalue())
+        self.assertEqual(LoanReminder.objects.count(), 3)
+
+        # emailed by a background task
+        run_pending_tasks()
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(LoanReminder.objects.filter(sent_at__isnull=True).exists())
+
+
+    # Bulk import
+
+    def _create_users(self, count):
+        return [User.objects.create_user(name=f'holder{i}', email=f'holder{i}@gmail.com',
+                                         membership_date=date.today(), password='testpassword')
+                for i in range(count)]
+
+    def test_place_hold(self):
+        BorrowedBooks.objects.create(user=self.user, book=self.book, borrow_date=date.today())
+        first, second = self._create_users(2)
+
+        for user, position in [(first, 1), (second, 2)]:
+            url = reverse('hold_book', kwargs={'user_id': user.user_id, 'book_id': self.book.book_id})
+            response = self.client.post(url)
+
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(response.data['data'], {'position': position})
+
+        response = self.client.get(reverse('user_holds', args=[second.user_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(hold['book']['book_id'], hold['position']) for hold in response.data['data']],
+                         [(self.book.book_id, 2)])
+
+    def test_hold_not_allowed(self):
+        other, = self._create_users(1)
+        url = reverse('hold_book', kwargs={'user_id': other.user_id, 'book_id': self.book.book_id})
+
+        # available books are borrowed, not held
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'], 'Book is available, borrow it instead.')
+
+        BorrowedBooks.objects.create(user=self.user, book=self.book, borrow_date=date.today())
+        self.client.post(url)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'], 'User is already waiting for this book.')
+
+        response = self.client.post(reverse('hold_book', kwargs={'user_id': self.user.user_id,
+                                                                 'book_id': self.book.book_id}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'], 'User is already borrowing this book.')
+
+        response = self.client.post(reverse('hold_book', kwargs={'user_id': other.user_id, 'book_id': 404}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(LOAN_PERIOD_DAYS=14)
+    def test_returned_book_is_lent_to_the_first_hold(self):
+        BorrowedBooks.objects.create(user=self.user, book=self.book, borrow_date=date.today())
+        first, second = self._create_users(2)
+        place_hold(first.user_id, self.book.book_id)
+        place_hold(second.user_id, self.book.book_id)
+
+        response = self.client.put(reverse('return_book', args=[self.book.book_id]), {'return_date': date.today()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        loan = BorrowedBooks.currently_borrowed.get(book=self.book)
+        self.assertEqual(loan.user, first)
+        self.assertEqual(loan.due_date, date.today() + timedelta(days=14))
+        self.assertEqual(list(Hold.objects.filter(fulfilled_at__isnull=True).values_list('user', flat=True)),
+                         [second.user_id])
+
+        # the next return goes to the next user in line
+        self.client.put(reverse('return_book', args=[self.book.book_id]), {'return_date': date.today()})
+        self.assertEqual(BorrowedBooks.currently_borrowed.get(book=self.book).user, second)
+
+        run_pending_tasks()
+        self.assertEqual([message.to for message in mail.outbox], [[first.email], [second.email]])
+
+    def test_bulk_return_hands_books_over(self):
+        other_book = Book.objects.create(title='Other Book', isbn='987654321', published_date=date.today(), genre='Fiction')
+        borrow_books(self.user.user_id, [self.book.book_id, other_book.book_id], date.today())
+        holder, = self._create_users(1)
+        place_hold(holder.user_id, other_book.book_id)
+
+        return_books([self.book.book_id, other_book.book_id], date.today())
+
+        self.assertFalse(BorrowedBooks.currently_borrowed.filter(book=self.book).exists())
+        self.assertEqual(BorrowedBooks.currently_borrowed.get(book=other_book).user, holder)
+
+    def test_cancel_hold(self):
+        BorrowedBooks.objects.create(user=self.user, book=self.book, borrow_date=date.today())
+        first, second = self._create_users(2)
+        place_hold(first.user_id, self.book.book_id)
+        place_hold(second.user_id, self.book.book_id)
+
+        url = reverse('hold_book', kwargs={'user_id': first.user_id, 'book_id': self.book.book_id})
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # the second user moved up
+        response = self.client.get(reverse('user_holds', args=[second.user_id]))
+        self.assertEqual(response.data['data'][0]['position'], 1)
+
+        self.client.put(reverse('return_book', args=[self.book.book_id]), {'return_date': date.today()})
+        self.assertEqual(BorrowedBooks.currently_borrowed.get(book=self.book).user, second)
+
+    def test_holds_of_nonexistent_user(self):
+        response = self.client.get(reverse('user_holds', args=[404]))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bulk_import_books_csv(self):
+        url = reverse('bulk_import_books')
+
+        content = (
+            "title,isbn,published_date,genre,number_of_pages,publisher,language\n"
+            "Updated Title,123456789,2024-01-30,Fiction,100,publisher1,en\n"
+            "New Book,987654321,2024-01-30,Non-Fiction,,,\n"
+            "Bad Date,111,not-a-date,Fiction,,,\n"
+            "Missing Details,222,2024-01-30,Fiction,100,,\n"
+        )
+        upload = SimpleUploadedFile('books.csv', content.encode('utf-8'), content_type='text/csv')
+
+        response = self.client.post(url, {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['imported'], 2)
+        self.assertEqual([error['row'] for error in response.data['data']['errors']], [4, 5])
+
+        self.assertEqual(Book.objects.count(), 2)   # existing isbn was updated, not duplicated
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, 'Updated Title')
+        self.assertEqual(self.book.book_details.publisher, 'publisher1')
+        self.assertFalse(BookDetails.objects.filter(book__isbn='987654321').exists())
+
+    def test_bulk_import_books_rejects_out_of_range_pages(self):
+        content = (
+            "title,isbn,published_date,genre,number_of_pages,publisher,language\n"
+            "Book A,a-1,2024-01-30,Fiction,99999999999,publisher1,en\n"
+            "Book B,b-1,2024-01-30,Fiction,100,publisher1,en\n"
+        )
+        upload = SimpleUploadedFile('books.csv', content.encode('utf-8'), content_type='text/csv')
+
+        response = self.client.post(reverse('bulk_import_books'), {'file': upload}, format='multipart')
+
+        self.assertEqual(response.data['data']['imported'], 1)
+        self.assertEqual([error['row'] for error in response.data['data']['errors']], [2])
+        self.assertIn('number_of_pages', response.data['data']['errors'][0]['errors'])
+
+    def test_import_books_only_reports_the_rows_the_database_rejects(self):
+        write_batch = import_services._write_batch
+
+        def failing_write_batch(batch):
+            if 'bad' in batch:
+                raise DataError('value out of range')
+            write_batch(batch)
+
+        rows = [(row_number, {'title': f'Book {isbn}', 'isbn': isbn, 'published_date': '2024-01-30', 'genre': 'Fiction'}, None)
+                for row_number, isbn in enumerate(['a-1', 'bad', 'b-1'], start=2)]
+        with mock.patch('app.services.import_services._write_batch', side_effect=failing_write_batch):
+            result = import_services.import_books(rows)
+
+        self.assertEqual(result['imported'], 2)
+        self.assertEqual(result['errors'], [{'row': 3, 'errors': {'non_field_errors': ['value out of range']}}])
+        self.assertEqual(set(Book.objects.values_list('isbn', flat=True)), {'123456789', 'a-1', 'b-1'})
+
+    def test_bulk_import_books_unreadable_file(self):
+        url = reverse('bulk_import_books')
+
+        content = (
+            "title,isbn,published_date,genre\n"
+            "New Book,987654321,2024-01-30,Fiction\n"
+            "Caf\u00e9,111,2024-01-30,Fiction\n"
+        )
+        upload = SimpleUploadedFile('books.csv', content.encode('latin-1'), content_type='text/csv')
+
+        response = self.client.post(url, {'file': upload}, format='multipart')
+
+        # the rows read before the bad one are imported
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['message'], 'Row 3 could not be read, the import stopped there. 1 books were imported.')
+        self.assertEqual([error['row'] for error in response.data['data']['errors']], [3])
+        self.assertTrue(Book.objects.filter(isbn='987654321').exists())
+
+    def test_bulk_import_unsupported_file(self):
+        url = reverse('bulk_import_books')
+        upload = SimpleUploadedFile('books.txt', b'hello', content_type='text/plain')
+
+        response = self.client.post(url, {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_books_command_jsonl(self):
+        lines = [
+            '{"title": "Book A", "isbn": "a-1", "published_date": "2024-01-30", "genre": "Fiction", "number_of_pages": 10, "publisher": "p", "language": "en"}',
+            'not json',
+            '{"title": "Book B", "isbn": "b-1", "published_date": "2024-01-30", "genre": "Fiction"}',
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as f:
+            f.write('\n'.join(lines))
+            f.flush()
+
+            stdout, stderr = StringIO(), StringIO()
+            call_command('import_books', f.name, batch_size=1, stdout=stdout, stderr=stderr)
+
+        self.assertIn('Imported 2 books, 1 rows failed.', stdout.getvalue())
+        self.assertIn('Row 2', stderr.getvalue())
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(BookDetails.objects.count(), 1)
+
+
+    # Export
+
+    def test_export_books_csv(self):
+        BookDetails.objects.create(book=self.book, number_of_pages=20, publisher='publisher1', language='en')
+        self.user.is_staff = True
+        url = reverse('export_data', kwargs={'name': 'books'})
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(lines[0], 'book_id,title,isbn,published_date,genre,number_of_pages,publisher,language,created_at,updated_at')
+        self.assertTrue(lines[1].startswith(f'{self.book.book_id},Test Book,123456789,{date.today().isoformat()},Fiction,20,publisher1,en,'))
+
+    def test_export_loans_jsonl_gzip(self):
+        BorrowedBooks.objects.create(user=self.user, book=self.book, borrow_date=date(2024, 1, 30))
+        self.user.is_staff = True
+        url = reverse('export_data', kwargs={'name': 'loans'})
+
+        response = self.client.get(url, {'output': 'jsonl'}, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        rows = [json.loads(line) for line in gzip.decompress(b''.join(response.streaming_content)).splitlines()]
+        self.assertEqual(rows, [{'id': rows[0]['id'], 'user_id': self.user.user_id, 'book_id': self.book.book_id,
+                                 'borrow_date': '2024-01-30', 'return_date': None}])
+
+    def test_export_requires_admin(self):
+        response = self.client.get(reverse('export_data', kwargs={'name': 'users'}))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_import_books_command_malformed_csv(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write('title,isbn,published_date,genre\n')
+            f.write('"' + 'x' * 200000 + '",a-1,2024-01-30,Fiction\n')
+            f.flush()
+
+            stderr = StringIO()
+            with self.assertRaisesMessage(CommandError, 'Row 2 could not be read, the import stopped there.'):
+                call_command('import_books', f.name, stdout=StringIO(), stderr=stderr)
+
+        self.assertIn('Row 2: ', stderr.getvalue())
+
+    def test_export_data_command_round_trips_through_import(self):
+        BookDetails.objects.create(book=self.book, number_of_pages=20, publisher='publisher1', language='en')
+
+        with tempfile.NamedTemporaryFile(suffix='.csv') as f:
+            call_command('export_data', 'books', output=f.name, gzip=False)
+            Book.objects.all().delete()
+
+            call_command('import_books', f.name, stdout=StringIO())
+
+        book = Book.objects.select_related('book_details').get()
+        self.assertEqual((book.isbn, book.book_details.publisher), ('123456789', 'publisher1'))
+
+
+    # Circulation statistics
+
+    def test_loan_stats_follow_borrow_and_return(self):
+        other = Book.objects.create(title='Other Book', isbn='isbn-other', published_date=date.today(), genre='Fiction')
+        borrow_books(self.user.user_id, [self.book.book_id, other.book_id], date(2024, 1, 30))
+        return_books([self.book.book_id], date(2024, 2, 2))
+
+        self.assertEqual(
+            list(BookMonthlyStats.objects.order_by('month', 'book_id').values_list('book_id', 'month', 'loans', 'returns')),
+            [(self.book.book_id, date(2024, 1, 1), 1, 0), (other.book_id, date(2024, 1, 1), 1, 0),
+             (self.book.book_id, date(2024, 2, 1), 0, 1)],
+        )
+        self.assertEqual(
+            list(GenreDailyStats.objects.order_by('day').values_list('genre', 'day', 'loans', 'returns')),
+            [('Fiction', date(2024, 1, 30), 2, 0), ('Fiction', date(2024, 2, 2), 0, 1)],
+        )
+        self.assertEqual(
+            list(UserMonthlyStats.objects.order_by('month').values_list('month', 'loans', 'returns')),
+            [(date(2024, 1, 1), 2, 0), (date(2024, 2, 1), 0, 1)],
+        )
+
+        # deleting a loan takes it out of the rollups again
+        BorrowedBooks.objects.get(book=other).delete()
+        self.assertEqual(GenreDailyStats.objects.get(day=date(2024, 1, 30)).loans, 1)
+
+        # deleting the book drops its rollups
+        self.book.delete()
+        self.assertFalse(BookMonthlyStats.objects.filter(book_id=self.book.book_id).exists())
+
+    def test_rebuild_loan_stats_command(self):
+        BorrowedBooks.objects.create(user=self.user, book=self.book, borrow_date=date(2024, 1, 30), return_date=date(2024, 2, 2))
+        models = (BookMonthlyStats, GenreDailyStats, UserMonthlyStats)
+        expected = [sorted(model.objects.values_list('loans', 'returns')) for model in models]
+        GenreDailyStats.objects.all().delete()
+        UserMonthlyStats.objects.update(loans=5)
+
+        stdout = StringIO()
+        call_command('rebuild_loan_stats', stdout=stdout)
+
+        self.assertIn('Loan statistics rebuilt.', stdout.getvalue())
+        self.assertEqual([sorted(model.objects.values_list('loans', 'returns')) for model in models], expected)
+
+    def test_reports(self):
+        other = Book.objects.create(title='Other Book', isbn='isbn-other', published_date=date.today(), genre='Poetry')
+        borrow_books(self.user.user_id, [self.book.book_id, other.book_id], date(2024, 1, 30))
+        return_books([other.book_id], date(2024, 1, 31))
+        borrow_book(self.user.user_id, other.book_id, date(2024, 2, 1))
+        self.user.is_staff = True
+        params = {'start': '2024-01-01', 'end': '2024-02-29'}
+
+        response = self.client.get(reverse('report_most_borrowed'), {**params, 'limit': 1})
+        self.assertEqual(response.data['data'], [
+            {'book_id': other.book_id, 'title': 'Other Book', 'isbn': 'isbn-other', 'loans': 2},
+        ])
+
+        response = self.client.get(reverse('report_genres'), params)
+        self.assertEqual([dict(row) for row in response.data['data']], [
+            {'month': '2024-01-01', 'genre': 'Fiction', 'loans': 1, 'returns': 0},
+            {'month': '2024-01-01', 'genre': 'Poetry', 'loans': 1, 'returns': 1},
+            {'month': '2024-02-01', 'genre': 'Poetry', 'loans': 1, 'returns': 0},
+        ])
+
+        response = self.client.get(reverse('report_active_borrowers'), params)
+        self.assertEqual([dict(row) for row in response.data['data']], [
+            {'month': '2024-01-01', 'borrowers': 1, 'loans': 2},
+            {'month': '2024-02-01', 'borrowers': 1, 'loans': 1},
+        ])
+
+    def test_reports_require_admin(self):
+        response = self.client.get(reverse('report_most_borrowed'))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ConcurrentBorrowTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(name='testuser',
+                                             email='test@gmail.com',
+                                             membership_date=date.today(),
+                                             password='testpassword')
+
+        self.book = Book.objects.create(title='Test Book', isbn='123456789', published_date=date.today(), genre='Fiction')
+
+    def test_concurrent_borrows_only_one_succeeds(self):
+        def borrow(_):
+            try:
+                borrow_book(self.user.user_id, self.book.book_id, date.today())
+                return True
+            except BookAlreadyBorrowed:
+                return False
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(borrow, range(16)))
+
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(BorrowedBooks.currently_borrowed.filter(book=self.book).count(), 1)
+
+    def test_concurrent_holds_get_distinct_positions(self):
+        borrow_book(self.user.user_id, self.book.book_id, date.today())
+        users = [User.objects.create_user(name=f'holder{i}', email=f'holder{i}@gmail.com',
+                                          membership_date=date.today(), password='testpassword')
+                 for i in range(16)]
+
+        def hold(user):
+            try:
+                return place_hold(user.user_id, self.book.book_id)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            positions = list(executor.map(hold, users))
+
+        self.assertEqual(sorted(positions), list(range(1, 17)))
+
+    def test_concurrent_bulk_borrows_do_not_deadlock(self):
+        # Carts lock books in book_id order, while their genres come in a different order in every cart
+        books = Book.objects.bulk_create([
+            Book(title=f'Book {i}', isbn=f'isbn-{i}', published_date=date.today(), genre=f'Genre {i * 7 % 10}')
+            for i in range(160)
+        ])
+        users = [User.objects.create_user(name=f'reader{i}', email=f'reader{i}@gmail.com',
+                                          membership_date=date.today(), password='testpassword')
+                 for i in range(4)]
+
+        def borrow_and_return(i):
+            book_ids = [book.book_id for book in books[i::4]]
+            try:
+                for start in range(0, len(book_ids), 10):
+                    borrow_books(users[i].user_id, book_ids[start:start + 10], date.today())
+                    return_books(book_ids[start:start + 10], date.today())
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(borrow_and_return, range(4)))
+
+        self.assertEqual(sum(GenreDailyStats.objects.values_list('loans', flat=True)), 160)
+
+
+class ConnectionPoolTestCase(TransactionTestCase):
+    def pooled_connection(self, **pool):
+        settings_dict = {
+            **connection.settings_dict,
+            'ENGINE': 'app.db.postgresql_pool',
+            'CONN_MAX_AGE': 0,
+            'CONN_HEALTH_CHECKS': True,
+            # a pool of its own, not shared with other tests or the default connection
+            'OPTIONS': {'application_name': self.id()[-60:], 'pool': {'max_size': 2, 'timeout': 0.1, **pool}},
+        }
+        wrapper = PooledDatabaseWrapper(settings_dict)
+        self.addCleanup(lambda: wrapper.pool.close() if hasattr(wrapper, 'pool') else None)
+        return wrapper
+
+    def backend_pid(self, wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            return cursor.fetchone()[0]
+
+    def test_connections_are_reused(self):
+        first = self.pooled_connection()
+        pid = self.backend_pid(first)
+        first.close()
+
+        second = self.pooled_connection()
+        self.assertEqual(self.backend_pid(second), pid)
+        second.close()
+
+        self.assertEqual(second.pool.stats()['opened'], 1)
+        self.assertEqual(second.pool.stats()['idle'], 1)
+
+    def test_open_transactions_are_rolled_back(self):
+        first = self.pooled_connection()
+        first.set_autocommit(False)
+        with first.cursor() as cursor:
+            cursor.execute('CREATE TEMPORARY TABLE pool_leftover (id int)')
+        first.close()
+
+        second = self.pooled_connection()
+        with second.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('pool_leftover')")
+            self.assertIsNone(cursor.fetchone()[0])
+        second.close()
+
+    def test_broken_connections_are_replaced(self):
+        first = self.pooled_connection()
+        pid = self.backend_pid(first)
+        first.close()
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+
+        # the health check discards the dead connection and opens a new one
+        second = self.pooled_connection()
+        self.assertNotEqual(self.backend_pid(second), pid)
+        second.close()
+
+    def test_exhausted_pool_times_out(self):
+        first = self.pooled_connection(max_size=1)
+        first.ensure_connection()
+
+        with self.assertRaises(OperationalError):
+            self.pooled_connection(max_size=1).ensure_connection()
+
+        first.close()
+        second = self.pooled_connection(max_size=1)
+        second.ensure_connection()
+        second.close()
@@ -3,9 +3,34 @@ from django.contrib.auth import get_user_model
 User = get_user_model()
 from django.urls import reverse
 from rest_framework import status
+from django.test import override_settings
+from django.contrib.auth import hashers
+from app.authentication import token_versions
+from app.api.user import TokenObtainPairSerializer
+from app.models.book import Book, BorrowedBooks
+from app.models.task import Task
+from app.services.task_services import enqueue, requeue_stale_tasks, run_pending_tasks, task
+from app.tasks import send_welcome_email
+from django.core import mail
+from django.core.management import call_command
+from django.utils import timezone
+from datetime import date, timedelta
+from asgiref.sync import sync_to_async
+from io import StringIO
+from unittest import mock
+import json
+import threading
+
+
+@task(max_attempts=2)
+def fail_once():
+    # Fails on its first attempt
+    if Task.objects.filter(name=fail_once.task_name).values_list('attempts', flat=True).get() == 1:
+        raise RuntimeError('first attempt')
 
 class UserAPITestCase(APITestCase):
     def setUp(self):
+        token_versions.clear()
         self.user1 = {'name': 'Test User', 'email': 'test@example.com', 'membership_date': '2024-01-31', 'password': 'testpassword', 'password2': 'testpassword'}
     
     def test_user_cannot_register_with_same_email(self):
@@ -29,6 +54,60 @@ class UserAPITestCase(APITestCase):
         self.assertEqual(response.data['data']['email'], 'test@example.com')
         self.assertEqual(User.objects.count(), 1)
 
+    def test_register_user_queues_welcome_email(self):
+        response = self.client.post(reverse('register'), self.user1)
+        user = User.objects.get()
+
+        # sent by a worker, not during the request
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Task.objects.get().status, Task.QUEUED)
+
+        # queued once per user
+        self.assertFalse(enqueue(send_welcome_email, idempotency_key=f'welcome_email:{user.pk}', user_id=user.pk))
+
+        stdout = StringIO()
+        call_command('run_tasks', once=True, stdout=stdout)
+
+        self.assertIn('Ran 1 tasks.', stdout.getvalue())
+        self.assertEqual(mail.outbox[0].to, ['test@example.com'])
+        self.assertEqual(Task.objects.get().status, Task.DONE)
+
+    @override_settings(TASK_RETRY_DELAY=60)
+    def test_failed_tasks_are_retried(self):
+        self.assertTrue(enqueue(fail_once))
+
+        with self.assertLogs('app.tasks', level='WARNING'):
+            self.assertEqual(run_pending_tasks(), 1)
+
+        # retried after TASK_RETRY_DELAY, not right away
+        queued = Task.objects.get()
+        self.assertEqual(queued.status, Task.QUEUED)
+        self.assertIn('first attempt', queued.last_error)
+        self.assertGreater(queued.run_at, timezone.now() + timedelta(seconds=50))
+        self.assertEqual(run_pending_tasks(), 0)
+
+        Task.objects.update(run_at=timezone.now())
+        self.assertEqual(run_pending_tasks(), 1)
+        self.assertEqual(Task.objects.get().status, Task.DONE)
+
+    def test_tasks_fail_after_max_attempts(self):
+        enqueue(fail_once)
+        Task.objects.update(max_attempts=1)
+
+        with self.assertLogs('app.tasks', level='ERROR'):
+            run_pending_tasks()
+
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+
+    def test_stale_tasks_are_requeued(self):
+        enqueue(send_welcome_email, user_id=404)
+        Task.objects.update(status=Task.RUNNING, attempts=1, started_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(requeue_stale_tasks(), 1)
+        self.assertEqual(run_pending_tasks(), 1)
+        self.assertEqual(Task.objects.get().status, Task.DONE)
+
     def test_get_all_users_except_superuser(self):
         url = reverse('users')
         
@@ -46,6 +125,21 @@ class UserAPITestCase(APITestCase):
         self.assertEqual(len(response.data), 1)
         self.assertNotIn(('email', super_user.email), response.data)
 
+    def test_get_all_users_keyset_pagination(self):
+        url = reverse('users')
+
+        users = [User.objects.create_user(name=f'User {i}', email=f'user{i}@example.com', membership_date=self.user1['membership_date'], password=self.user1['password']) for i in range(3)]
+
+        self.client.force_authenticate(user=users[0])
+
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([user['user_id'] for user in response.data['results']], [users[0].user_id, users[1].user_id])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([user['user_id'] for user in response.data['results']], [users[2].user_id])
+        self.assertIsNone(response.data['next'])
+
     def test_get_user_by_id(self):
         user = User.objects.create_user(name=self.user1['name'], email=self.user1['email'], membership_date=self.user1['membership_date'], password=self.user1['password'])
         
@@ -55,4 +149,195 @@ class UserAPITestCase(APITestCase):
 
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data['email'], 'test@example.com')
\ No newline at end of file
+        self.assertEqual(response.data['email'], 'test@example.com')
+
+    def test_get_user_by_id_not_modified(self):
+        user = User.objects.create_user(name=self.user1['name'], email=self.user1['email'], membership_date=self.user1['membership_date'], password=self.user1['password'])
+
+        url = reverse('user_details', args={user.user_id})
+
+        self.client.force_authenticate(user=user)
+
+        response = self.client.get(url)
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        user.name = 'Updated Name'
+        user.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['name'], 'Updated Name')
+
+    def test_fast_serialization_is_identical(self):
+        user = User.objects.create_user(name=self.user1['name'], email=self.user1['email'], membership_date=self.user1['membership_date'], password=self.user1['password'])
+
+        self.client.force_authenticate(user=user)
+
+        for url in [reverse('users'), reverse('users') + '?page_size=1', reverse('user_details', args={user.user_id})]:
+            with override_settings(FAST_SERIALIZATION=False):
+                expected = self.client.get(url)
+
+            with override_settings(FAST_SERIALIZATION=True):
+                response = self.client.get(url)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.content, expected.content)
+
+    # JWT
+
+    def login(self):
+        User.objects.create_user(name=self.user1['name'], email=self.user1['email'], membership_date=self.user1['membership_date'], password=self.user1['password'])
+
+        response = self.client.post(reverse('login'), {'email': self.user1['email'], 'password': self.user1['password']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return response.data
+
+    def test_password_is_rehashed_with_the_preferred_hasher_on_login(self):
+        self.login()
+        self.assertTrue(User.objects.get(email=self.user1['email']).password.startswith('pbkdf2_sha256$'))
+
+        with override_settings(PASSWORD_HASHERS=['app.hashers.ScryptPasswordHasher', 'app.hashers.PBKDF2PasswordHasher']):
+            credentials = {'email': self.user1['email'], 'password': self.user1['password']}
+            for _ in range(2):
+                response = self.client.post(reverse('login'), credentials)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertTrue(User.objects.get(email=self.user1['email']).password.startswith('scrypt$'))
+
+            response = self.client.post(reverse('login'), {**credentials, 'password': 'wrongpassword'})
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_passwords_are_hashed_on_the_hashing_pool(self):
+        threads = []
+        encode = hashers.PBKDF2PasswordHasher.encode
+
+        def record_thread(hasher, *args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return encode(hasher, *args, **kwargs)
+
+        with mock.patch.object(hashers.PBKDF2PasswordHasher, 'encode', record_thread):
+            self.login()
+
+        # once on registration, once more to verify the password on login
+        self.assertEqual(len(threads), 2)
+        self.assertTrue(all(name.startswith('password-hasher') for name in threads))
+
+    def test_jwt_authentication_skips_user_lookup(self):
+        self.login()
+
+        # the first request caches the token version
+        self.client.get(reverse('users'))
+
+        # only the users query itself, no auth query
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('users'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_revoked_tokens_are_rejected(self):
+        tokens = self.login()
+
+        response = self.client.post(reverse('token_revoke'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(reverse('users'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # tokens refreshed from a revoked refresh token are rejected as well
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+        response = self.client.get(reverse('users'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_rejected(self):
+        self.login()
+
+        # saving the user drops its cached token version
+        user = User.objects.get(email=self.user1['email'])
+        user.is_active = False
+        user.save()
+
+        response = self.client.get(reverse('users'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_tokens_with_stale_privileges_are_rejected(self):
+        user = User.objects.create_superuser(name='Admin', email='admin@example.com', membership_date='2024-01-01', password='secret')
+        token = TokenObtainPairSerializer.get_token(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        self.assertEqual(self.client.get(reverse('users')).status_code, status.HTTP_200_OK)
+
+        user.is_staff = False
+        user.is_superuser = False
+        user.save()
+
+        response = self.client.get(reverse('users'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.data['detail'], 'Token has been revoked')
+
+    async def test_async_user_details(self):
+        tokens = await sync_to_async(self.login)()
+        user = await User.objects.aget(email=self.user1['email'])
+
+        expected = await sync_to_async(self.client.get)(reverse('user_details', args={user.user_id}))
+
+        # served end to end on the event loop, through the async middleware chain
+        headers = {'Authorization': f"Bearer {tokens['access']}"}
+        response = await self.async_client.get(reverse('async_user_details', args={user.user_id}), headers=headers)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response['ETag'], expected['ETag'])
+
+        response = await self.async_client.get(reverse('async_user_details', args={404}), headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(json.loads(response.content), {'detail': 'Not found.'})
+
+    def test_async_views_reject_revoked_tokens(self):
+        self.login()
+        user = User.objects.get(email=self.user1['email'])
+        url = reverse('async_user_details', args={user.user_id})
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse('token_revoke'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(json.loads(response.content)['detail'], 'Token has been revoked')
+
+    def test_user_loans(self):
+        user = User.objects.create_user(name=self.user1['name'], email=self.user1['email'], membership_date=self.user1['membership_date'], password=self.user1['password'])
+        self.client.force_authenticate(user=user)
+        for month in (1, 2, 3):
+            book = Book.objects.create(title=f'Book {month}', isbn=f'isbn-{month}', published_date=date.today(), genre='Fiction')
+            BorrowedBooks.objects.create(user=user, book=book, borrow_date=date(2024, month, 1), return_date=date(2024, month, 15))
+
+        url = reverse('user_loans', args={user.user_id})
+
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([loan['book']['title'] for loan in response.data['results']], ['Book 3', 'Book 2'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([loan['book']['title'] for loan in response.data['results']], ['Book 1'])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(url, {'borrowed_after': '2024-02-01', 'borrowed_before': '2024-02-28'})
+        self.assertEqual([loan['borrow_date'] for loan in response.data['results']], ['2024-02-01'])
+
+    def test_loans_of_nonexistent_user(self):
+        user = User.objects.create_user(name=self.user1['name'], email=self.user1['email'], membership_date=self.user1['membership_date'], password=self.user1['password'])
+        self.client.force_authenticate(user=user)
+
+        response = self.client.get(reverse('user_loans', args={404}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # a user without loans gets an empty history
+        response = self.client.get(reverse('user_loans', args={user.user_id}))
+        self.assertEqual(response.data['results'], [])
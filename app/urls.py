@@ -1,25 +1,53 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from app.api import user, book
+from app.api import user, book, stats, export, reports, async_views
 
 urlpatterns = [
     # User
     path('register/', user.RegisterUser.as_view(), name='register'),
     path('users/', user.GetAllUsers.as_view(), name='users'),
     path('users/<int:pk>/', user.GetUserById.as_view(), name='user_details'),
+    path('users/<int:pk>/loans/', book.UserLoans.as_view(), name='user_loans'),
+    path('users/<int:pk>/holds/', book.UserHolds.as_view(), name='user_holds'),
 
     # JWT 
     path('token/', TokenObtainPairView.as_view(), name='login'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/revoke/', user.RevokeTokens.as_view(), name='token_revoke'),
 
     # Book
     path('books/create/', book.CreateBook.as_view(), name='create_book'),
+    path('books/bulk/', book.BulkImportBooks.as_view(), name='bulk_import_books'),
     path('books/list/', book.ListBooks.as_view(), name='list_books'),
+    path('books/search/', book.SearchBooks.as_view(), name='search_books'),
     path('books/details/<int:pk>/', book.GetBookById.as_view(), name='book_details'),
     path('books/update/<int:pk>/', book.UpdateBookDetails.as_view(), name='book_update'),
 
     # Borrow Boook
     path('books/borrow/<int:user_id>/<int:book_id>/', book.BorrowBook.as_view(), name='borrow_book'),
     path('books/return/<int:book_id>/', book.ReturnBook.as_view(), name='return_book'),
+    path('books/borrow/bulk/', book.BulkBorrowBooks.as_view(), name='bulk_borrow_books'),
+    path('books/return/bulk/', book.BulkReturnBooks.as_view(), name='bulk_return_books'),
     path('books/currently_borrowed/', book.CurrentlyBorrowedBooks.as_view(), name='currently_borrowed_books'),
+    path('books/<int:pk>/loans/', book.BookLoans.as_view(), name='book_loans'),
+    path('books/hold/<int:user_id>/<int:book_id>/', book.HoldBook.as_view(), name='hold_book'),
+
+    # Export
+    path('export/<str:name>/', export.ExportData.as_view(), name='export_data'),
+
+    # Reports
+    path('reports/most-borrowed/', reports.MostBorrowedBooks.as_view(), name='report_most_borrowed'),
+    path('reports/genres/', reports.GenreLoans.as_view(), name='report_genres'),
+    path('reports/active-borrowers/', reports.ActiveBorrowers.as_view(), name='report_active_borrowers'),
+
+    # Async (ASGI) versions of the read endpoints
+    path('async/books/list/', async_views.AsyncListBooks.as_view(), name='async_list_books'),
+    path('async/books/details/<int:pk>/', async_views.AsyncGetBookById.as_view(), name='async_book_details'),
+    path('async/books/currently_borrowed/', async_views.AsyncCurrentlyBorrowedBooks.as_view(),
+         name='async_currently_borrowed_books'),
+    path('async/users/<int:pk>/', async_views.AsyncGetUserById.as_view(), name='async_user_details'),
+
+    # Stats
+    path('stats/cache/', stats.CacheStats.as_view(), name='cache_stats'),
+    path('stats/throttling/', stats.ThrottleStats.as_view(), name='throttle_stats'),
 ]
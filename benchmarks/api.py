@@ -0,0 +1,341 @@
+"""
+Latency, throughput and query count benchmark for every route in app/urls.py.
+
+Seeds a throwaway test database with the requested volumes, then calls each
+route in-process through the full Django/DRF stack (real JWT authentication
+included) and writes the results to a JSON file that can be compared
+between commits:
+
+    python -m benchmarks.api --books 10000 --users 1000 --loans 50000 --output before.json
+    python -m benchmarks.api --books 10000 --users 1000 --loans 50000 --output after.json --baseline before.json
+
+Uses the database configured in settings (PostgreSQL). SQLite is not
+supported because the schema relies on PostgreSQL features (tsvector search
+triggers, GIN indexes, partial unique indexes with ON CONFLICT).
+"""
+import argparse
+import json
+import subprocess
+import time
+from datetime import date, timedelta
+
+from benchmarks.utils import setup_django, summarize, test_database
+
+PASSWORD = 'benchmark-password'
+
+
+def seed(books, users, loans):
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+    from app.models.book import Book, BookDetails, BorrowedBooks
+    User = get_user_model()
+
+    # Hash once, every seeded user shares the same password
+    password = make_password(PASSWORD)
+    User.objects.bulk_create(
+        [User(name=f'User {i}', email=f'user{i}@example.com', membership_date=date(2024, 1, 1), password=password)
+         for i in range(users)],
+        batch_size=5000,
+    )
+    Book.objects.bulk_create(
+        [Book(title=f'Book {i}', isbn=f'isbn-{i}', published_date=date(2000 + i % 24, 1 + i % 12, 1), genre=f'genre {i % 50}')
+         for i in range(books)],
+        batch_size=5000,
+    )
+
+    book_ids = list(Book.objects.order_by('book_id').values_list('book_id', flat=True))
+    user_ids = list(User.objects.order_by('user_id').values_list('user_id', flat=True))
+
+    BookDetails.objects.bulk_create(
+        [BookDetails(book_id=book_id, number_of_pages=100 + i % 500, publisher=f'publisher {i % 200}', language=('en', 'de', 'fr')[i % 3])
+         for i, book_id in enumerate(book_ids)],
+        batch_size=5000,
+    )
+
+    # The first `active` loans stay open, each on a different book, the rest
+    # are history. Loans only use the first half of the books, the second
+    # half is kept available for the borrow benchmark.
+    active = min(loans, len(book_ids) // 4)
+    today = date.today()
+    BorrowedBooks.objects.bulk_create(
+        [BorrowedBooks(user_id=user_ids[i % len(user_ids)], book_id=book_ids[i % (len(book_ids) // 2)],
+                       borrow_date=today - timedelta(days=30 + i % 365),
+                       due_date=today - timedelta(days=30 + i % 365 - 14),
+                       return_date=None if i < active else today - timedelta(days=i % 30))
+         for i in range(loans)],
+        batch_size=5000,
+    )
+
+    return book_ids, user_ids
+
+
+class Context:
+    """
+    State shared by the scenarios: seeded ids and authenticated clients.
+    """
+    def __init__(self, client, admin_client, refresh, revoking_user, book_ids, user_ids):
+        self.client = client
+        self.admin_client = admin_client
+        self.refresh = refresh
+        self.revoking_user = revoking_user
+        self.book_ids = book_ids
+        self.user_ids = user_ids
+        self.counter = 0
+        # books in the second half are never borrowed by the seed
+        self.available_books = iter(book_ids[len(book_ids) // 2:])
+        self.borrowed_books = []
+        self.bulk_borrowed_books = []
+        self.holders = []
+
+    def next(self):
+        self.counter += 1
+        return self.counter
+
+    def book_id(self):
+        return self.book_ids[self.next() % len(self.book_ids)]
+
+    def user_id(self):
+        return self.user_ids[self.next() % len(self.user_ids)]
+
+
+def borrow(ctx):
+    book_id = next(ctx.available_books)
+    ctx.borrowed_books.append(book_id)
+    return ctx.client.post(f'/api/books/borrow/{ctx.user_id()}/{book_id}/', {'borrow_date': date.today()})
+
+
+def return_book(ctx):
+    return ctx.client.put(f'/api/books/return/{ctx.borrowed_books.pop()}/', {'return_date': date.today()})
+
+
+def bulk_borrow(ctx):
+    book_ids = [next(ctx.available_books) for _ in range(50)]
+    ctx.bulk_borrowed_books.append(book_ids)
+    return ctx.client.post('/api/books/borrow/bulk/', {
+        'user_id': ctx.user_id(), 'book_ids': book_ids, 'borrow_date': date.today(),
+    }, format='json')
+
+
+def bulk_return(ctx):
+    return ctx.client.put('/api/books/return/bulk/', {
+        'book_ids': ctx.bulk_borrowed_books.pop(), 'return_date': date.today(),
+    }, format='json')
+
+
+def hold(ctx):
+    # Everybody queues for the first book, lent to the first user by the seed
+    user_id = ctx.user_ids[len(ctx.holders) + 1]
+    ctx.holders.append(user_id)
+    return ctx.client.post(f'/api/books/hold/{user_id}/{ctx.book_ids[0]}/')
+
+
+def cancel_hold(ctx):
+    return ctx.client.delete(f'/api/books/hold/{ctx.holders.pop()}/{ctx.book_ids[0]}/')
+
+
+def revoke_tokens(ctx):
+    from rest_framework.test import APIClient
+    from app.api.user import TokenObtainPairSerializer
+
+    # Revoking logs the user out, every run uses a fresh token signed in-process (no login, no query)
+    user = ctx.revoking_user
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {TokenObtainPairSerializer.get_token(user).access_token}')
+    response = client.post('/api/token/revoke/')
+    user.token_version += 1
+    return response
+
+
+def update_book(ctx):
+    i = ctx.next()
+    return ctx.client.put(f'/api/books/update/{ctx.book_id()}/', {
+        'title': f'Updated Book {i}', 'isbn': f'updated-{i}', 'published_date': '2024-01-30', 'genre': 'genre 1',
+        'book_details': {'number_of_pages': 100, 'publisher': 'publisher 1', 'language': 'en'},
+    })
+
+
+def bulk_import(ctx):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    i = ctx.next()
+    content = 'title,isbn,published_date,genre,number_of_pages,publisher,language\n' + ''.join(
+        f'Imported {i}-{j},imported-{i}-{j},2024-01-30,genre 1,100,publisher 1,en\n' for j in range(100)
+    )
+    upload = SimpleUploadedFile('books.csv', content.encode('utf-8'), content_type='text/csv')
+    return ctx.client.post('/api/books/bulk/', {'file': upload}, format='multipart')
+
+
+# route name -> (request, expected status). Order matters: borrow runs before return, hold before cancel.
+SCENARIOS = {
+    'register': (lambda ctx: ctx.client.post('/api/register/', {
+        'name': 'New User', 'email': f'new{ctx.next()}@example.com', 'membership_date': '2024-01-30',
+        'password': PASSWORD, 'password2': PASSWORD,
+    }), 201),
+    'login': (lambda ctx: ctx.client.post('/api/token/', {'email': 'user0@example.com', 'password': PASSWORD}), 200),
+    'token_refresh': (lambda ctx: ctx.client.post('/api/token/refresh/', {'refresh': ctx.refresh}), 200),
+    'token_revoke': (revoke_tokens, 200),
+    'users': (lambda ctx: ctx.client.get('/api/users/', {'page_size': 50}), 200),
+    'users_all': (lambda ctx: ctx.client.get('/api/users/'), 200),
+    'user_details': (lambda ctx: ctx.client.get(f'/api/users/{ctx.user_id()}/'), 200),
+    'create_book': (lambda ctx: ctx.client.post('/api/books/create/', {
+        'title': 'New Book', 'isbn': f'new-{ctx.next()}', 'published_date': '2024-01-30', 'genre': 'genre 1',
+    }), 201),
+    'bulk_import_books': (bulk_import, 200),
+    'list_books': (lambda ctx: ctx.client.get('/api/books/list/', {'page_size': 50}), 200),
+    'list_books_all': (lambda ctx: ctx.client.get('/api/books/list/'), 200),
+    'list_books_available': (lambda ctx: ctx.client.get('/api/books/list/', {'available': 'true', 'page_size': 50}), 200),
+    'search_books': (lambda ctx: ctx.client.get('/api/books/search/', {'q': f'book {ctx.next()}'}), 200),
+    'book_details': (lambda ctx: ctx.client.get(f'/api/books/details/{ctx.book_id()}/'), 200),
+    'book_update': (update_book, 200),
+    'book_update_partial': (lambda ctx: ctx.client.patch(f'/api/books/update/{ctx.book_id()}/', {
+        'genre': f'genre {ctx.next()}', 'book_details': {'publisher': 'publisher 2'},
+    }), 200),
+    'borrow_book': (borrow, 200),
+    'return_book': (return_book, 200),
+    'bulk_borrow_books': (bulk_borrow, 200),
+    'bulk_return_books': (bulk_return, 200),
+    'hold_book': (hold, 201),
+    'user_holds': (lambda ctx: ctx.client.get(f'/api/users/{ctx.holders[-1]}/holds/'), 200),
+    'hold_book_cancel': (cancel_hold, 200),
+    'currently_borrowed_books': (lambda ctx: ctx.client.get('/api/books/currently_borrowed/'), 200),
+    'report_most_borrowed': (lambda ctx: ctx.admin_client.get('/api/reports/most-borrowed/'), 200),
+    'report_genres': (lambda ctx: ctx.admin_client.get('/api/reports/genres/'), 200),
+    'report_active_borrowers': (lambda ctx: ctx.admin_client.get('/api/reports/active-borrowers/'), 200),
+    'user_loans': (lambda ctx: ctx.client.get(f'/api/users/{ctx.user_id()}/loans/', {'borrowed_after': date.today() - timedelta(days=180)}), 200),
+    'book_loans': (lambda ctx: ctx.client.get(f'/api/books/{ctx.book_id()}/loans/'), 200),
+    # Called through the sync test client, see benchmarks.asgi for concurrency under ASGI
+    'async_list_books': (lambda ctx: ctx.client.get('/api/async/books/list/', {'page_size': 50}), 200),
+    'async_book_details': (lambda ctx: ctx.client.get(f'/api/async/books/details/{ctx.book_id()}/'), 200),
+    'async_currently_borrowed_books': (lambda ctx: ctx.client.get('/api/async/books/currently_borrowed/'), 200),
+    'async_user_details': (lambda ctx: ctx.client.get(f'/api/async/users/{ctx.user_id()}/'), 200),
+}
+
+# Routes that are not part of the API benchmark (admin only)
+SKIPPED_ROUTES = {'cache_stats', 'export_data', 'throttle_stats'}
+
+
+def check_coverage():
+    from app.urls import urlpatterns
+
+    missing = {pattern.name for pattern in urlpatterns} - SKIPPED_ROUTES - set(SCENARIOS)
+    if missing:
+        print(f"warning: no benchmark scenario for {', '.join(sorted(missing))}")
+
+
+def run_scenario(ctx, request, expected_status, repeat, cold_cache):
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    durations = []
+    queries = []
+    for _ in range(repeat):
+        if cold_cache:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = request(ctx)
+            durations.append(time.perf_counter() - start)
+        queries.append(len(captured))
+
+        if response.status_code != expected_status:
+            raise AssertionError(f'Expected {expected_status}, got {response.status_code}: {response.content[:200]!r}')
+
+    summary = summarize(durations)
+    summary['throughput_rps'] = len(durations) / sum(durations)
+    summary['queries'] = max(queries)
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    print(f"{'route':<26}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'queries':>9}{'p50 vs baseline':>17}")
+    for name, summary in results['routes'].items():
+        change = ''
+        if baseline and name in baseline['routes']:
+            before = baseline['routes'][name]['p50_ms']
+            change = f"{(summary['p50_ms'] - before) / before * 100:+.1f}%"
+        print(f"{name:<26}{summary['p50_ms']:>9.2f}{summary['p95_ms']:>9.2f}{summary['p99_ms']:>9.2f}"
+              f"{summary['throughput_rps']:>9.1f}{summary['queries']:>9}{change:>17}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--loans', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=50, help='Requests per route.')
+    parser.add_argument('--routes', nargs='*', help='Only benchmark these routes.')
+    parser.add_argument('--cold-cache', action='store_true', help='Clear the cache before every request.')
+    parser.add_argument('--output', default='bench_results.json', help='JSON results file.')
+    parser.add_argument('--baseline', help='Results file of a previous run to compare against.')
+    args = parser.parse_args()
+
+    setup_django()
+    check_coverage()
+
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from rest_framework.test import APIClient
+
+    routes = args.routes or list(SCENARIOS)
+
+    with test_database():
+        started = time.perf_counter()
+        book_ids, user_ids = seed(args.books, args.users, args.loans)
+        seed_seconds = time.perf_counter() - started
+
+        client = APIClient()
+        tokens = client.post('/api/token/', {'email': 'user0@example.com', 'password': PASSWORD}, format='json').json()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+
+        get_user_model().objects.create_superuser('Admin', 'admin@example.com', date.today(), password=PASSWORD)
+        admin_client = APIClient()
+        admin_tokens = admin_client.post('/api/token/', {'email': 'admin@example.com', 'password': PASSWORD}, format='json').json()
+        admin_client.credentials(HTTP_AUTHORIZATION=f"Bearer {admin_tokens['access']}")
+
+        revoking_user = get_user_model().objects.create_user('Revoking', 'revoking@example.com', date.today(), password=PASSWORD)
+
+        ctx = Context(client, admin_client, tokens['refresh'], revoking_user, book_ids, user_ids)
+
+        results = {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'database': connection.vendor,
+                'fast_serialization': settings.FAST_SERIALIZATION,
+                'cold_cache': args.cold_cache,
+                'books': args.books,
+                'users': args.users,
+                'loans': args.loans,
+                'repeat': args.repeat,
+                'seed_seconds': seed_seconds,
+            },
+            'routes': {},
+        }
+
+        for name in routes:
+            request, expected_status = SCENARIOS[name]
+            results['routes'][name] = run_scenario(ctx, request, expected_status, args.repeat, args.cold_cache)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print_results(results, baseline)
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
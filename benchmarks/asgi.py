@@ -0,0 +1,182 @@
+"""
+Concurrency benchmark of the sync (DRF) read endpoints against their async
+(`/api/async/...`) versions, served by the project's ASGI application.
+
+Seeds a throwaway test database like benchmarks.api, then, for every route
+and concurrency level, keeps `concurrency` requests in flight against
+`project.asgi.application` from an asyncio event loop and records latency
+and throughput:
+
+    python -m benchmarks.asgi --concurrency 1 8 32 64 --requests 2000 --output asgi.json
+
+Requests are sent to the ASGI callable in-process, so the numbers measure
+the application (handler, middleware, views, database) without a server or
+network in between. Every in-flight request may hold a database connection,
+keep the highest concurrency below PostgreSQL's `max_connections`.
+"""
+import argparse
+import asyncio
+import json
+import time
+from itertools import count
+
+from benchmarks.api import PASSWORD, git_commit, seed
+from benchmarks.utils import setup_django, summarize, test_database
+
+# route -> (sync path, async path), given a counter to rotate over books and users
+ROUTES = {
+    'list_books': lambda ctx, i: ('/api/books/list/', '/api/async/books/list/', 'page_size=50'),
+    'book_details': lambda ctx, i: (f'/api/books/details/{ctx.book_id(i)}/', f'/api/async/books/details/{ctx.book_id(i)}/', ''),
+    'currently_borrowed_books': lambda ctx, i: ('/api/books/currently_borrowed/', '/api/async/books/currently_borrowed/', ''),
+    'user_details': lambda ctx, i: (f'/api/users/{ctx.user_id(i)}/', f'/api/async/users/{ctx.user_id(i)}/', ''),
+}
+
+
+class Context:
+    def __init__(self, token, book_ids, user_ids):
+        self.token = token
+        self.book_ids = book_ids
+        self.user_ids = user_ids
+
+    def book_id(self, i):
+        return self.book_ids[i % len(self.book_ids)]
+
+    def user_id(self, i):
+        return self.user_ids[i % len(self.user_ids)]
+
+
+async def call(application, token, path, query_string):
+    """
+    Send one GET request to the ASGI application and return its status code.
+    """
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query_string.encode(),
+        'headers': [(b'host', b'testserver'), (b'authorization', f'Bearer {token}'.encode())],
+        'client': ('127.0.0.1', 50000),
+        'server': ('testserver', 80),
+    }
+    disconnected = asyncio.Event()
+    status = None
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body' and not message.get('more_body'):
+            disconnected.set()
+
+    await application(scope, receive, send)
+    return status
+
+
+async def run_level(application, ctx, route, use_async, concurrency, requests):
+    counter = count()
+    durations = []
+
+    async def worker():
+        while (i := next(counter)) < requests:
+            sync_path, async_path, query_string = ROUTES[route](ctx, i)
+            start = time.perf_counter()
+            status = await call(application, ctx.token, async_path if use_async else sync_path, query_string)
+            durations.append(time.perf_counter() - start)
+            if status != 200:
+                raise AssertionError(f'Expected 200, got {status} for {route}')
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    summary = summarize(durations)
+    summary['throughput_rps'] = len(durations) / elapsed
+    return summary
+
+
+def print_results(results):
+    print(f"{'route':<26}{'conc':>6}{'sync req/s':>12}{'async req/s':>13}{'sync p95':>10}{'async p95':>11}{'gain':>9}")
+    for route, levels in results['routes'].items():
+        for concurrency, result in levels.items():
+            sync, asynchronous = result['sync'], result['async']
+            gain = (asynchronous['throughput_rps'] - sync['throughput_rps']) / sync['throughput_rps'] * 100
+            print(f"{route:<26}{concurrency:>6}{sync['throughput_rps']:>12.1f}{asynchronous['throughput_rps']:>13.1f}"
+                  f"{sync['p95_ms']:>10.2f}{asynchronous['p95_ms']:>11.2f}{gain:>+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--loans', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, nargs='*', default=[1, 8, 32, 64], help='Requests in flight.')
+    parser.add_argument('--requests', type=int, default=1000, help='Requests per route, mode and concurrency level.')
+    parser.add_argument('--routes', nargs='*', choices=list(ROUTES), help='Only benchmark these routes.')
+    parser.add_argument('--output', default='asgi_results.json', help='JSON results file.')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from rest_framework.test import APIClient
+    from project.asgi import application
+
+    routes = args.routes or list(ROUTES)
+
+    with test_database():
+        book_ids, user_ids = seed(args.books, args.users, args.loans)
+
+        tokens = APIClient().post('/api/token/', {'email': 'user0@example.com', 'password': PASSWORD}, format='json').json()
+        ctx = Context(tokens['access'], book_ids, user_ids)
+
+        results = {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'conn_max_age': settings.DATABASES['default'].get('CONN_MAX_AGE', 0),
+                'books': args.books,
+                'users': args.users,
+                'loans': args.loans,
+                'requests': args.requests,
+            },
+            'routes': {},
+        }
+
+        async def run():
+            for route in routes:
+                results['routes'][route] = {}
+                for concurrency in args.concurrency:
+                    results['routes'][route][concurrency] = {
+                        mode: await run_level(application, ctx, route, mode == 'async', concurrency, args.requests)
+                        for mode in ('sync', 'async')
+                    }
+
+        asyncio.run(run())
+
+        # Requests served under ASGI close their own connections, make sure the
+        # test database can be dropped
+        from django.db import connections
+        connections.close_all()
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print_results(results)
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
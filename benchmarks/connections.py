@@ -0,0 +1,258 @@
+"""
+Per-request latency with and without database connection reuse.
+
+Seeds a throwaway test database like benchmarks.api, then serves the same
+route through Django's WSGI handler (one thread per in-flight request, like
+a threaded WSGI server) and ASGI handler (asyncio) under three settings:
+
+- none: CONN_MAX_AGE=0, a new connection for every request
+- persistent: CONN_MAX_AGE=60 with health checks, one connection per thread
+- pool: the app.db.postgresql_pool backend, connections shared by all threads
+
+    python -m benchmarks.connections --concurrency 1 8 32 --requests 1000 --output connections.json
+
+Unlike the test client, the WSGI and ASGI handlers send the request
+started/finished signals that close (or return) connections, so the
+numbers include the connection handling of a real deployment. Requests that
+fail, e.g. because PostgreSQL ran out of connections, are counted as errors,
+and sessions still open after a run are reported and terminated.
+"""
+import argparse
+import asyncio
+import gc
+import io
+import json
+import logging
+import sys
+import threading
+import time
+from itertools import count
+
+from benchmarks.api import PASSWORD, git_commit, seed
+from benchmarks.asgi import ROUTES, Context, call
+from benchmarks.utils import setup_django, summarize, test_database
+
+MODES = {
+    'none': {'ENGINE': 'django.db.backends.postgresql', 'CONN_MAX_AGE': 0},
+    'persistent': {'ENGINE': 'django.db.backends.postgresql', 'CONN_MAX_AGE': 60},
+    'pool': {'ENGINE': 'app.db.postgresql_pool', 'CONN_MAX_AGE': 0},
+}
+
+
+def configure(mode, pool_size):
+    """
+    Switch the default database to `mode`, closing every connection of the previous one.
+    """
+    from django.db import connections
+    from app.db.postgresql_pool.base import close_pools
+
+    connections.close_all()
+    close_pools()
+    # Connections dropped by threads that are gone
+    gc.collect()
+
+    settings_dict = connections.settings['default']
+    options = {key: value for key, value in settings_dict['OPTIONS'].items() if key != 'pool'}
+    if mode == 'pool':
+        options['pool'] = {'max_size': pool_size}
+    settings_dict.update(MODES[mode], CONN_HEALTH_CHECKS=True, OPTIONS=options)
+
+    # Rebuilt from the new settings on next use
+    try:
+        del connections['default']
+    except AttributeError:
+        pass
+
+
+def wsgi_call(handler, token, path, query_string):
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': query_string,
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver',
+        'HTTP_AUTHORIZATION': f'Bearer {token}',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    statuses = []
+    response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        b''.join(response)
+    finally:
+        # sends request_finished, which closes or returns the connection
+        response.close()
+    return int(statuses[0].split()[0])
+
+
+def run_wsgi(ctx, route, concurrency, requests):
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connections
+
+    handler = WSGIHandler()
+    counter = count()
+    durations = []
+    statuses = []
+
+    def worker():
+        try:
+            while (i := next(counter)) < requests:
+                path, _, query_string = ROUTES[route](ctx, i)
+                start = time.perf_counter()
+                statuses.append(wsgi_call(handler, ctx.token, path, query_string))
+                durations.append(time.perf_counter() - start)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return durations, statuses, elapsed
+
+
+def run_asgi(ctx, route, concurrency, requests):
+    from project.asgi import application
+
+    counter = count()
+    durations = []
+    statuses = []
+
+    async def worker():
+        while (i := next(counter)) < requests:
+            path, _, query_string = ROUTES[route](ctx, i)
+            start = time.perf_counter()
+            statuses.append(await call(application, ctx.token, path, query_string))
+            durations.append(time.perf_counter() - start)
+
+    async def run():
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(run())
+    return durations, statuses, elapsed
+
+
+def close_leftover_sessions():
+    """
+    Terminate and count the sessions on the benchmark database that are
+    still open, e.g. persistent connections of threads that are gone.
+    """
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT count(pg_terminate_backend(pid)) FROM pg_stat_activity '
+            'WHERE datname = current_database() AND pid <> pg_backend_pid()'
+        )
+        return cursor.fetchone()[0]
+
+
+SERVERS = {
+    'wsgi': run_wsgi,
+    'asgi': run_asgi,
+}
+
+
+def print_results(results):
+    print(f"{'server':<8}{'conc':>6}{'mode':>12}{'p50 ms':>9}{'p95 ms':>9}{'req/s':>9}{'errors':>8}{'connections':>13}{'left open':>11}")
+    for server, levels in results['servers'].items():
+        for concurrency, modes in levels.items():
+            for mode, summary in modes.items():
+                print(f"{server:<8}{concurrency:>6}{mode:>12}{summary['p50_ms']:>9.2f}{summary['p95_ms']:>9.2f}"
+                      f"{summary['throughput_rps']:>9.1f}{summary['errors']:>8}{summary['connections']:>13}{summary['left_open']:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--books', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--loans', type=int, default=5000)
+    parser.add_argument('--route', choices=list(ROUTES), default='user_details')
+    parser.add_argument('--servers', nargs='*', choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument('--modes', nargs='*', choices=list(MODES), default=list(MODES))
+    parser.add_argument('--concurrency', type=int, nargs='*', default=[1, 8, 32], help='Requests in flight.')
+    parser.add_argument('--requests', type=int, default=1000, help='Requests per server, mode and concurrency level.')
+    parser.add_argument('--pool-size', type=int, default=20, help='max_size of the pool mode.')
+    parser.add_argument('--output', default='connections_results.json', help='JSON results file.')
+    args = parser.parse_args()
+
+    setup_django()
+    # get_asgi_application() sets Django up (and configures logging) again
+    import project.asgi  # noqa: F401
+
+    # Failed requests (e.g. too many database connections) are counted, not logged
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+
+    from django.db.backends.signals import connection_created
+    from rest_framework.test import APIClient
+    from app.db.postgresql_pool.base import close_pools, pool_stats
+
+    # Backends send connection_created on every connect, pooled ones even when reusing a connection
+    created = count()
+    connection_created.connect(lambda **kwargs: next(created), weak=False)
+
+    with test_database():
+        book_ids, user_ids = seed(args.books, args.users, args.loans)
+
+        tokens = APIClient().post('/api/token/', {'email': 'user0@example.com', 'password': PASSWORD}, format='json').json()
+        ctx = Context(tokens['access'], book_ids, user_ids)
+
+        results = {
+            'meta': {
+                'commit': git_commit(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'route': args.route,
+                'requests': args.requests,
+                'pool_size': args.pool_size,
+            },
+            'servers': {},
+        }
+
+        for server in args.servers:
+            results['servers'][server] = {}
+            for concurrency in args.concurrency:
+                results['servers'][server][concurrency] = {}
+                for mode in args.modes:
+                    configure(mode, args.pool_size)
+                    before = next(created)
+
+                    durations, statuses, elapsed = SERVERS[server](ctx, args.route, concurrency, args.requests)
+
+                    summary = summarize(durations)
+                    summary['throughput_rps'] = len(durations) / elapsed
+                    summary['errors'] = sum(status != 200 for status in statuses)
+                    if mode == 'pool':
+                        summary['connections'] = sum(stats['opened'] for stats in pool_stats().values())
+                    else:
+                        summary['connections'] = next(created) - before - 1
+
+                    close_pools()
+                    gc.collect()
+                    summary['left_open'] = close_leftover_sessions()
+                    results['servers'][server][concurrency][mode] = summary
+
+        configure('none', args.pool_size)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print_results(results)
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
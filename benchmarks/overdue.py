@@ -0,0 +1,151 @@
+"""
+Throughput, statement latency and memory of the overdue-loan sweep
+(`sweep_overdue_loans`) on a large number of open loans.
+
+Seeds a throwaway test database with `--loans` open loans, each on its own
+book, due between 30 days ago and 29 days from now (about half are overdue),
+then sweeps them once per batch size:
+
+    python -m benchmarks.overdue --loans 1000000 --batch-size 1000 10000 --output overdue.json
+
+Every batch is one statement and one transaction, its duration is how long
+the flagged loans stay locked. Flags and reminders are reset between batch
+sizes. The plan of a batch is printed first, it should be an index scan of
+loan_open_due_date_idx that stops after `batch size` rows.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from datetime import date
+
+from benchmarks.api import git_commit
+from benchmarks.utils import setup_django, summarize, test_database
+
+
+def seed(loans):
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from app.models.book import Book, BorrowedBooks
+    User = get_user_model()
+
+    user = User.objects.create_user(name='Borrower', email='borrower@example.com', membership_date=date(2024, 1, 1),
+                                    password='benchmark-password')
+
+    # Generated server side. The loan triggers (availability, circulation rollups)
+    # play no part in the sweep and would run once per loan, they are disabled
+    # while seeding, the test database is thrown away afterwards.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {Book._meta.db_table} (title, isbn, published_date, genre, created_at, updated_at)
+            SELECT 'Book ' || i, 'overdue-' || i, date '2020-01-01', 'genre ' || i %% 20, now(), now()
+            FROM generate_series(1, %s) i
+            """,
+            [loans],
+        )
+        cursor.execute(f'ALTER TABLE {BorrowedBooks._meta.db_table} DISABLE TRIGGER USER')
+        cursor.execute(
+            f"""
+            INSERT INTO {BorrowedBooks._meta.db_table} (user_id, book_id, borrow_date, due_date, overdue)
+            SELECT %s, book_id, current_date + (book_id %% 60)::int - 44, current_date + (book_id %% 60)::int - 30, false
+            FROM {Book._meta.db_table}
+            """,
+            [user.pk],
+        )
+        cursor.execute(f'ALTER TABLE {BorrowedBooks._meta.db_table} ENABLE TRIGGER USER')
+        cursor.execute(f'ANALYZE {BorrowedBooks._meta.db_table}')
+
+
+def reset():
+    from django.db import connection
+    from app.models.book import BorrowedBooks, LoanReminder
+
+    LoanReminder.objects.all().delete()
+    BorrowedBooks.objects.filter(overdue=True).update(overdue=False)
+    with connection.cursor() as cursor:
+        cursor.execute(f'VACUUM ANALYZE {BorrowedBooks._meta.db_table}')
+
+
+def explain(today, batch_size):
+    from django.db import connection
+    from app.models.book import BorrowedBooks
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            EXPLAIN SELECT id FROM {BorrowedBooks._meta.db_table}
+            WHERE return_date IS NULL AND NOT overdue AND due_date < %s
+            ORDER BY due_date, id LIMIT %s
+            """,
+            [today, batch_size],
+        )
+        return '\n'.join(row[0] for row in cursor.fetchall())
+
+
+def sweep(today, batch_size):
+    """
+    Same loop as `sweep_overdue_loans`, timing every batch.
+    """
+    from django.db import transaction
+    from app.services.book_services import _flag_overdue_batch
+
+    durations = []
+    total = 0
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    while True:
+        start = time.perf_counter()
+        with transaction.atomic():
+            flagged = _flag_overdue_batch(today, batch_size)
+        durations.append(time.perf_counter() - start)
+        total += flagged
+        if flagged < batch_size:
+            break
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    summary = summarize(durations)
+    summary.update(flagged=total, seconds=elapsed, loans_per_second=total / elapsed, peak_memory_kb=peak / 1024)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--loans', type=int, default=200000, help='Open loans to seed.')
+    parser.add_argument('--batch-size', type=int, nargs='*', default=[100, 1000, 10000])
+    parser.add_argument('--output', default='overdue_results.json', help='JSON results file.')
+    args = parser.parse_args()
+
+    setup_django()
+
+    with test_database():
+        started = time.perf_counter()
+        seed(args.loans)
+        print(f'Seeded {args.loans} open loans in {time.perf_counter() - started:.1f}s')
+
+        today = date.today()
+        print(explain(today, args.batch_size[0]))
+
+        results = {
+            'meta': {'commit': git_commit(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'loans': args.loans},
+            'batch_sizes': {},
+        }
+        for batch_size in args.batch_size:
+            reset()
+            results['batch_sizes'][batch_size] = sweep(today, batch_size)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'batch':>8}{'flagged':>10}{'seconds':>9}{'loans/s':>10}{'batches':>9}{'p50 ms':>9}{'p99 ms':>9}{'peak KB':>9}")
+    for batch_size, summary in results['batch_sizes'].items():
+        print(f"{batch_size:>8}{summary['flagged']:>10}{summary['seconds']:>9.2f}{summary['loans_per_second']:>10.0f}"
+              f"{summary['runs']:>9}{summary['p50_ms']:>9.2f}{summary['p99_ms']:>9.2f}{summary['peak_memory_kb']:>9.1f}")
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Login throughput per password hasher: logins per second, and per core,
+through the token endpoint with increasing numbers of concurrent clients.
+
+Runs against a throwaway test database. Each hasher logs in a user whose
+password it hashed itself (Argon2 needs `pip install argon2-cffi`, it is
+skipped otherwise):
+
+    python -m benchmarks.passwords --logins 200 --hashers pbkdf2 scrypt argon2 --concurrency 1 4 8 --output passwords.json
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.api import PASSWORD, git_commit
+from benchmarks.utils import setup_django, test_database
+
+HASHERS = {
+    'pbkdf2': 'app.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'app.hashers.ScryptPasswordHasher',
+    'argon2': 'app.hashers.Argon2PasswordHasher',
+}
+
+
+def run(logins, concurrency, email):
+    from django.db import connections
+    from rest_framework.test import APIClient
+
+    remaining = iter(range(logins))
+    lock = threading.Lock()
+
+    def client():
+        # One client per thread, logging in until all logins are done
+        api_client = APIClient()
+        try:
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                response = api_client.post('/api/token/', {'email': email, 'password': PASSWORD}, format='json')
+                if response.status_code != 200:
+                    raise AssertionError(f'Expected 200, got {response.status_code}: {response.content[:200]!r}')
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        started = time.perf_counter()
+        for future in [executor.submit(client) for _ in range(concurrency)]:
+            future.result()
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=200, help='Logins per run.')
+    parser.add_argument('--hashers', nargs='*', choices=list(HASHERS), default=list(HASHERS))
+    parser.add_argument('--concurrency', type=int, nargs='*', default=[1, 4, 8], help='Concurrent clients.')
+    parser.add_argument('--output', default='passwords_results.json', help='JSON results file.')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.test import override_settings
+
+    cores = os.cpu_count()
+    # Hashes run on at most this many cores at once
+    busy_cores = min(cores, settings.PASSWORD_HASHING_THREADS)
+
+    results = {
+        'meta': {'commit': git_commit(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'logins': args.logins,
+                 'cpu_count': cores, 'hashing_threads': settings.PASSWORD_HASHING_THREADS},
+        'hashers': {},
+    }
+
+    with test_database():
+        for name in args.hashers:
+            preferred = HASHERS[name]
+            with override_settings(PASSWORD_HASHERS=[preferred, *(path for path in HASHERS.values() if path != preferred)]):
+                try:
+                    user = get_user_model().objects.create_user(name, f'{name}@example.com', '2024-01-01', password=PASSWORD)
+                except ValueError as exc:
+                    # e.g. argon2-cffi is not installed
+                    print(f'skipping {name}: {exc}')
+                    continue
+
+                results['hashers'][name] = {}
+                for concurrency in args.concurrency:
+                    elapsed = run(args.logins, concurrency, user.email)
+                    results['hashers'][name][concurrency] = {
+                        'seconds': elapsed,
+                        'logins_per_second': args.logins / elapsed,
+                        'logins_per_second_per_core': args.logins / elapsed / min(concurrency, busy_cores),
+                    }
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'hasher':<8}{'clients':>8}{'logins/s':>10}{'per core':>10}")
+    for name, runs in results['hashers'].items():
+        for concurrency, summary in runs.items():
+            print(f"{name:<8}{concurrency:>8}{summary['logins_per_second']:>10.1f}"
+                  f"{summary['logins_per_second_per_core']:>10.1f}")
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
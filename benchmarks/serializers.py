@@ -0,0 +1,58 @@
+"""
+Compare the ModelSerializer + JSONRenderer path with the `.values()` +
+FastJSONRenderer path (FAST_SERIALIZATION) on a large book list.
+
+    python -m benchmarks.serializers --rows 10000 --repeat 10
+"""
+import argparse
+from datetime import date
+
+from benchmarks.utils import measure, setup_django, summarize, test_database
+
+
+def seed(rows):
+    from app.models.book import Book
+
+    Book.objects.bulk_create(
+        [Book(title=f'Book {i}', isbn=f'isbn-{i}', published_date=date(2000 + i % 24, 1 + i % 12, 1), genre=f'genre {i % 50}')
+         for i in range(rows)],
+        batch_size=5000,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from rest_framework.renderers import JSONRenderer
+    from app.api.book import BookSerializer, ListBooks
+    from app.api.renderers import FastJSONRenderer
+
+    with test_database():
+        seed(args.rows)
+        queryset = ListBooks.queryset
+        values_serializer = ListBooks.values_serializer
+
+        def drf():
+            return JSONRenderer().render(BookSerializer(queryset.all(), many=True).data)
+
+        def fast():
+            rows = queryset.all().values(*values_serializer.paths)
+            return FastJSONRenderer().render([values_serializer.to_representation(row) for row in rows])
+
+        assert drf() == fast(), 'Both paths must render identical JSON'
+
+        results = {'drf': summarize(measure(drf, args.repeat)), 'fast': summarize(measure(fast, args.repeat))}
+
+    print(f'{args.rows} books, {args.repeat} runs each')
+    for name, summary in results.items():
+        print(f"{name:>5}: mean {summary['mean_ms']:.1f} ms, p50 {summary['p50_ms']:.1f} ms, p95 {summary['p95_ms']:.1f} ms")
+    print(f"speedup: {results['drf']['mean_ms'] / results['fast']['mean_ms']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
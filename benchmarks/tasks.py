@@ -0,0 +1,73 @@
+"""
+Background task queue benchmark: the cost of `enqueue()` in the request
+path, and how fast `run_tasks` worker threads drain the queue.
+
+Runs against a throwaway test database. Every task sleeps `--task-ms`
+milliseconds, standing in for I/O such as talking to a mail server, so the
+drain rate shows how well threads overlap slow side effects:
+
+    python -m benchmarks.tasks --tasks 2000 --task-ms 20 --threads 1 4 8 16 --output tasks.json
+"""
+import argparse
+import json
+import time
+
+from benchmarks.api import git_commit
+from benchmarks.utils import measure, setup_django, summarize, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=2000, help='Tasks queued per run.')
+    parser.add_argument('--task-ms', type=float, default=20, help='Duration of every task.')
+    parser.add_argument('--threads', type=int, nargs='*', default=[1, 4, 8, 16], help='Worker threads.')
+    parser.add_argument('--output', default='tasks_results.json', help='JSON results file.')
+    args = parser.parse_args()
+
+    setup_django()
+
+    from app.models.task import Task
+    from app.services.task_services import enqueue, start_workers, task
+
+    @task
+    def sleep(seconds):
+        time.sleep(seconds)
+
+    with test_database():
+        results = {
+            'meta': {'commit': git_commit(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                     'tasks': args.tasks, 'task_ms': args.task_ms},
+            'enqueue': summarize(measure(lambda: enqueue(sleep, seconds=0), args.tasks)),
+            'threads': {},
+        }
+        Task.objects.all().delete()
+
+        for threads in args.threads:
+            for _ in range(args.tasks):
+                enqueue(sleep, seconds=args.task_ms / 1000)
+
+            started = time.perf_counter()
+            stop, workers = start_workers(threads, poll_interval=0.01)
+            while Task.objects.exclude(status=Task.DONE).exists():
+                time.sleep(0.01)
+            elapsed = time.perf_counter() - started
+            stop.set()
+            for worker in workers:
+                worker.join()
+
+            results['threads'][threads] = {'seconds': elapsed, 'tasks_per_second': args.tasks / elapsed}
+            Task.objects.all().delete()
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    enqueue_summary = results['enqueue']
+    print(f"enqueue: p50 {enqueue_summary['p50_ms']:.2f} ms, p99 {enqueue_summary['p99_ms']:.2f} ms")
+    print(f"{'threads':>8}{'seconds':>9}{'tasks/s':>9}")
+    for threads, summary in results['threads'].items():
+        print(f"{threads:>8}{summary['seconds']:>9.2f}{summary['tasks_per_second']:>9.1f}")
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -10,9 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 from environs import Env
+from marshmallow.validate import OneOf
 
 env = Env()
 env.read_env()
@@ -42,12 +44,15 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'app',
     'rest_framework',
 ]
 
 MIDDLEWARE = [
+    'app.middleware.PerformanceMiddleware',
+    'app.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,14 +86,66 @@ WSGI_APPLICATION = 'project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Connections are kept open for POSTGRES_CONN_MAX_AGE seconds and checked
+# before reuse. With POSTGRES_POOL they go back to a per-process pool at the
+# end of every request instead, use it under ASGI where every request runs
+# in a new thread.
+
+POSTGRES_POOL = env.bool('POSTGRES_POOL', False)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'app.db.postgresql_pool' if POSTGRES_POOL else 'django.db.backends.postgresql',
         'NAME': env('POSTGRES_NAME'),
         'USER':  env('POSTGRES_USER'),
         'PASSWORD': env('POSTGRES_PASSWORD'),
         'HOST': env('POSTGRES_HOST'),
         'PORT': env('POSTGRES_PORT'),
+        'CONN_MAX_AGE': 0 if POSTGRES_POOL else env.int('POSTGRES_CONN_MAX_AGE', 60),
+        'CONN_HEALTH_CHECKS': env.bool('POSTGRES_CONN_HEALTH_CHECKS', True),
+        'OPTIONS': {
+            'pool': {
+                'max_size': env.int('POSTGRES_POOL_MAX_SIZE', 20),
+                'timeout': env.float('POSTGRES_POOL_TIMEOUT', 10.0),
+                'max_idle': env.float('POSTGRES_POOL_MAX_IDLE', 300.0),
+            },
+        } if POSTGRES_POOL else {},
+    }
+}
+
+# Read replicas, one alias per host in POSTGRES_REPLICA_HOSTS. The other
+# settings default to the primary's. Read endpoints send their queries to a
+# random replica, except for users who wrote in the last
+# POSTGRES_REPLICA_STICKY_SECONDS, everything else goes to the primary.
+
+for i, host in enumerate(env.list('POSTGRES_REPLICA_HOSTS', []), start=1):
+    DATABASES[f'replica_{i}'] = {
+        **DATABASES['default'],
+        'NAME': env('POSTGRES_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': env('POSTGRES_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': env('POSTGRES_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': host,
+        'PORT': env('POSTGRES_REPLICA_PORT', DATABASES['default']['PORT']),
+        # Tests read the primary's test database through the replica aliases
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['app.db.routers.ReplicaRouter']
+POSTGRES_REPLICA_STICKY_SECONDS = env.int('POSTGRES_REPLICA_STICKY_SECONDS', 10)
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Local-memory (LRU) by default, point CACHE_BACKEND/CACHE_LOCATION to a
+# shared cache (e.g. django.core.cache.backends.redis.RedisCache) in production.
+
+CACHES = {
+    'default': {
+        'BACKEND': env('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env('CACHE_LOCATION', 'library-management-system'),
+        'TIMEOUT': env.int('CACHE_TIMEOUT', 300),
+        'OPTIONS': env.json('CACHE_OPTIONS', {'MAX_ENTRIES': 10000}),
     }
 }
 
@@ -112,6 +169,22 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Hasher of new passwords: pbkdf2 (Django's default), scrypt, or argon2 (needs
+# `pip install argon2-cffi`). Passwords hashed by the others still work and
+# are rehashed with the chosen one when their user logs in.
+_PASSWORD_HASHERS = {
+    'pbkdf2': 'app.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'app.hashers.ScryptPasswordHasher',
+    'argon2': 'app.hashers.Argon2PasswordHasher',
+}
+PASSWORD_HASHER = env('PASSWORD_HASHER', 'pbkdf2', validate=OneOf(list(_PASSWORD_HASHERS)))
+# The first one hashes new passwords
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER],
+                    *(path for name, path in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER)]
+# Hashes computed at once by each process, others wait for a thread (see app.hashers)
+PASSWORD_HASHING_THREADS = env.int('PASSWORD_HASHING_THREADS', os.cpu_count())
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -138,12 +211,97 @@ AUTH_USER_MODEL = 'app.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'app.authentication.StatelessJWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Token buckets in the default cache, see app.api.throttling. Use a shared
+    # cache (CACHE_BACKEND) for the limits to hold across processes.
+    'DEFAULT_THROTTLE_CLASSES': (
+        'app.api.throttling.UserTokenBucketThrottle',
+        'app.api.throttling.EndpointTokenBucketThrottle',
+    ) if env.bool('THROTTLE_ENABLED', True) else (),
+    'DEFAULT_THROTTLE_RATES': {
+        # Every request of a user (or IP address, when anonymous)
+        'user': env('THROTTLE_RATE_USER', '600/min'),
+        # Views with a `throttle_scope`
+        'books_list': env('THROTTLE_RATE_BOOKS_LIST', '300/min'),
+        'currently_borrowed': env('THROTTLE_RATE_CURRENTLY_BORROWED', '300/min'),
+        'books_search': env('THROTTLE_RATE_BOOKS_SEARCH', '120/min'),
+    },
     'TEST_REQUEST_DEFAULT_FORMAT': 'json'
 }
 
+# Tokens taken by requests reading a whole table (unpaginated book list, currently borrowed books)
+THROTTLE_FULL_TABLE_COST = env.int('THROTTLE_FULL_TABLE_COST', 10)
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "USER_ID_FIELD": "user_id",
-}
\ No newline at end of file
+    "TOKEN_OBTAIN_SERIALIZER": "app.api.user.TokenObtainPairSerializer",
+}
+
+# How long each process trusts its cached copy of a user's token_version / is_active
+AUTH_TOKEN_VERSION_TTL = env.int('AUTH_TOKEN_VERSION_TTL', 60)
+AUTH_TOKEN_VERSION_CACHE_SIZE = env.int('AUTH_TOKEN_VERSION_CACHE_SIZE', 10000)
+
+# Loans are due this many days after their borrow date, `sweep_overdue_loans`
+# flags the open loans past due and queues a reminder for each
+LOAN_PERIOD_DAYS = env.int('LOAN_PERIOD_DAYS', 14)
+OVERDUE_SWEEP_BATCH_SIZE = env.int('OVERDUE_SWEEP_BATCH_SIZE', 1000)
+
+# Background tasks (app.services.task_services), queued in the database and
+# run by `python manage.py run_tasks`
+TASK_WORKER_THREADS = env.int('TASK_WORKER_THREADS', 4)
+TASK_POLL_INTERVAL = env.float('TASK_POLL_INTERVAL', 1.0)
+TASK_MAX_ATTEMPTS = env.int('TASK_MAX_ATTEMPTS', 5)
+# Seconds before the first retry, doubled after every failed attempt
+TASK_RETRY_DELAY = env.float('TASK_RETRY_DELAY', 10.0)
+# Running tasks not finished after this many seconds are assumed lost and requeued
+TASK_TIMEOUT = env.int('TASK_TIMEOUT', 600)
+TASK_RETENTION_DAYS = env.int('TASK_RETENTION_DAYS', 7)
+
+# Email, sent by background tasks. Printed to the console unless a backend is configured.
+EMAIL_BACKEND = env('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = env('EMAIL_HOST', 'localhost')
+EMAIL_PORT = env.int('EMAIL_PORT', 25)
+EMAIL_HOST_USER = env('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = env.bool('EMAIL_USE_TLS', False)
+DEFAULT_FROM_EMAIL = env('DEFAULT_FROM_EMAIL', 'library@localhost')
+
+# Build book and user list/detail responses from .values() rows instead of
+# ModelSerializers, and render them with orjson (same output, much less CPU on large lists)
+FAST_SERIALIZATION = env.bool('FAST_SERIALIZATION', False)
+
+
+# Performance instrumentation (app.middleware.PerformanceMiddleware)
+# Per-request metrics are logged at INFO on the `app.performance` logger,
+# possible N+1 query patterns at WARNING.
+
+PERFORMANCE_SERVER_TIMING = env.bool('PERFORMANCE_SERVER_TIMING', DEBUG)
+PERFORMANCE_N_PLUS_ONE_THRESHOLD = env.int('PERFORMANCE_N_PLUS_ONE_THRESHOLD', 10)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'app.performance': {
+            'handlers': ['console'],
+            'level': env('PERFORMANCE_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+        'app.tasks': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}